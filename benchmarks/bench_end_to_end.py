@@ -0,0 +1,243 @@
+"""
+End to end benchmark of a guessing run on a synthetic repository, against a local stub of Pypi
+
+    python benchmarks/bench_end_to_end.py --commits 5000 --files 1000 --modules 80 --latency 50 --output results.json
+    python benchmarks/bench_end_to_end.py --histories {recorded.json} --compare baseline.json
+
+The repository is generated with synthetic.py (--commits, --files, --imports_per_file, --requirements_churn, --modules)
+and the release histories are served by stub_pypi.py (Recorded with --histories or generated) with --latency ms per request
+
+Both entry points are measured : Guesser (Library use) and cli.run (Includes the state file and the requirements output)
+Each run is made in a fresh interpreter with an empty release cache (Unless --warm_cache), the per phase timings come from
+the tracer (See instrumentation.py) and the peak memory is the peak RSS of the interpreter
+
+--output writes the results as JSON, --compare prints the ratio of the median timings against a previous output
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic import generate_synthetic_repository, generate_release_histories, get_modules, get_package_name
+from stub_pypi import StubPypiServer
+
+
+ENTRYPOINTS = ['guesser', 'cli']
+RESULTS_FORMAT = 1
+
+
+def measure(entrypoint, repo_path, index_url, pypi_concurrency):
+    """
+    Run in a child process (PY_REQS_GUESSER_CACHE_ROOT is set by the parent), print the measures as JSON
+    """
+    from py_requirements_guesser import cli
+    from py_requirements_guesser.guesser import Guesser
+    from py_requirements_guesser.cache import ReleaseCache
+    from py_requirements_guesser.backends import create_backend
+    from py_requirements_guesser.utils import get_mapping_files_from_pipreqs
+    from py_requirements_guesser.instrumentation import tracer
+
+    if entrypoint == 'warmup':
+        # Compile the mapping index once, it isn't what we measure
+        get_mapping_files_from_pipreqs()
+        return
+
+    tracer.start_recording()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    error = None
+    nb_packages = None
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        try:
+            if entrypoint == 'guesser':
+                release_cache = ReleaseCache()
+                backend = create_backend(index_url, 'json', None, release_cache, False, pypi_concurrency)
+                guesser = Guesser(None, False, None, release_cache, False, None, repo_path=repo_path, strategy='first_import',
+                                  pypi_backend=backend)
+                nb_packages = len(guesser.guess_package_versions())
+            else:
+                os.chdir(repo_path)
+                sys.argv = ['py-requirements-guesser', '--strategy', 'first_import', '--index_url', index_url,
+                            '--pypi_concurrency', str(pypi_concurrency), '--reset_state', '--timings']
+                cli.run()
+        except SystemExit as e:
+            if e.code:
+                error = f"exit code {e.code}"
+    seconds = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'entrypoint': entrypoint,
+        'seconds': seconds,
+        # ru_maxrss is in KB on linux
+        'peak_rss_mb': peak_rss / 1024,
+        'run_rss_mb': (peak_rss - baseline_rss) / 1024,
+        'packages': nb_packages,
+        'error': error,
+        'phases': tracer.summary()
+    }))
+
+
+def run_measure(entrypoint, repo_path, stub, pypi_concurrency, cache_root):
+    env = dict(os.environ, PY_REQS_GUESSER_CACHE_ROOT=cache_root)
+    output = subprocess.check_output([sys.executable, __file__, '--measure', entrypoint, repo_path, stub.url, str(pypi_concurrency)],
+                                     env=env)
+
+    return json.loads(output) if output else None
+
+
+def get_package_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def aggregate(results):
+    """
+    Median of the runs of each entry point : {entrypoint: {'seconds', 'peak_rss_mb', 'phases': {phase: seconds}}}
+    """
+    aggregated = {}
+    for entrypoint in ENTRYPOINTS:
+        runs = [r for r in results if r['entrypoint'] == entrypoint]
+        if len(runs) == 0:
+            continue
+
+        phase_names = {name for r in runs for name in r['phases']}
+        aggregated[entrypoint] = {
+            'seconds': statistics.median(r['seconds'] for r in runs),
+            'peak_rss_mb': statistics.median(r['peak_rss_mb'] for r in runs),
+            'phases': {name: statistics.median(r['phases'].get(name, {}).get('seconds', 0) for r in runs) for name in sorted(phase_names)}
+        }
+
+    return aggregated
+
+
+def print_comparison(baseline, current):
+    print(f"\n{'entry point'.ljust(12)} {'measure'.ljust(22)} {'baseline'.rjust(10)} {'current'.rjust(10)} {'ratio'.rjust(7)}")
+
+    for entrypoint, measures in current.items():
+        if entrypoint not in baseline:
+            continue
+
+        rows = [('total seconds', baseline[entrypoint]['seconds'], measures['seconds']),
+                ('peak RSS MB', baseline[entrypoint]['peak_rss_mb'], measures['peak_rss_mb'])]
+        rows += [(f"{name} seconds", baseline[entrypoint]['phases'].get(name), seconds) for name, seconds in measures['phases'].items()]
+
+        for name, before, after in rows:
+            if before is None:
+                continue
+
+            ratio = f"{after / before:7.2f}" if before > 0 else ' '*7
+            print(f"{entrypoint.ljust(12)} {name[:22].ljust(22)} {before:10.3f} {after:10.3f} {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser("End to end benchmark")
+    parser.add_argument('--commits', type=int, default=2000)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--imports_per_file', type=int, default=3)
+    parser.add_argument('--requirements_churn', type=float, default=0.05, help="Probability that a commit changes requirements.txt")
+    parser.add_argument('--modules', type=int, default=40, help="Number of distinct third party modules imported")
+    parser.add_argument('--histories', type=str, default=None, help="Recorded release histories (See stub_pypi.py --record)")
+    parser.add_argument('--latency', type=float, default=50, help="Latency of the stub Pypi in ms")
+    parser.add_argument('--pypi_concurrency', type=int, default=8)
+    parser.add_argument('--entrypoints', type=str, nargs='+', default=ENTRYPOINTS, choices=ENTRYPOINTS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warm_cache', action='store_true', help="Keep the release cache between runs")
+    parser.add_argument('--output', type=str, default=None)
+    parser.add_argument('--compare', type=str, default=None, help="Results of a previous --output")
+    parser.add_argument('--measure', nargs=4, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        entrypoint, repo_path, index_url, pypi_concurrency = args.measure
+        measure(entrypoint, repo_path, index_url, int(pypi_concurrency))
+        return
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    repo_path = os.path.join(tmp_dir.name, 'synthetic')
+    cache_root = os.path.join(tmp_dir.name, 'cache')
+
+    modules = get_modules(args.modules)
+    generate_synthetic_repository(repo_path, args.commits, args.files, args.imports_per_file, args.requirements_churn, modules=modules)
+
+    if args.histories:
+        with open(args.histories, 'r') as f:
+            histories = json.load(f)
+    else:
+        histories = generate_release_histories([get_package_name(m) for m in modules])
+
+    stub = StubPypiServer(histories, latency=args.latency / 1000).start()
+
+    run_measure('warmup', repo_path, stub, args.pypi_concurrency, cache_root)
+
+    results = []
+    print(f"{'entry point'.ljust(12)} {'run'.rjust(4)} {'seconds'.rjust(8)} {'peak RSS MB'.rjust(11)} {'packages'.rjust(8)}  phases")
+    for run in range(args.repeat):
+        for entrypoint in args.entrypoints:
+            if not args.warm_cache:
+                for directory in ['pypi', 'state']:
+                    shutil.rmtree(os.path.join(cache_root, directory), ignore_errors=True)
+
+            result = run_measure(entrypoint, repo_path, stub, args.pypi_concurrency, cache_root)
+            result['run'] = run
+            results.append(result)
+
+            phases = ' '.join(f"{name}={phase['seconds']:.3f}" for name, phase in result['phases'].items() if phase['count'] > 0)
+            packages = str(result['packages']) if result['packages'] is not None else '-'
+            print(f"{entrypoint.ljust(12)} {run:4d} {result['seconds']:8.3f} {result['peak_rss_mb']:11.1f} {packages.rjust(8)}  {phases}")
+
+            if result['error']:
+                print(f"[WARNING] {entrypoint} run failed ({result['error']})")
+
+    stub.stop()
+    tmp_dir.cleanup()
+
+    aggregated = aggregate(results)
+
+    if args.output:
+        config = {k: v for k, v in vars(args).items() if k not in ('measure', 'output', 'compare')}
+        with open(args.output, 'w') as f:
+            json.dump({
+                'format': RESULTS_FORMAT,
+                'commit': get_package_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'config': config,
+                'stub_requests': stub.nb_requests,
+                'median': aggregated,
+                'runs': results
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+        if baseline.get('format') != RESULTS_FORMAT:
+            print(f"[ERROR] '{args.compare}' is not a result file of this benchmark")
+            exit(1)
+
+        if baseline['config'] != {k: v for k, v in vars(args).items() if k not in ('measure', 'output', 'compare')}:
+            print("[WARNING] The baseline was measured with a different configuration")
+
+        print_comparison(baseline['median'], aggregated)
+
+
+if __name__ == "__main__":
+    main()
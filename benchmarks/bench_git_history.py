@@ -0,0 +1,69 @@
+"""
+Compare the in process git object reader against git log -p on the history index
+
+    python benchmarks/bench_git_history.py {repo_path} ...
+    python benchmarks/bench_git_history.py --synthetic 5000 --gc
+
+The synthetic repository is generated with git fast-import (Python files and requirements evolving over
+{commits} commits, with side branches merged back), --gc packs it so that deltas are exercised
+Both backends must produce the same index
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from py_requirements_guesser.history import GitHistoryIndex, HISTORY_BACKENDS
+from py_requirements_guesser.instrumentation import tracer
+
+from synthetic import generate_synthetic_repository
+
+
+def run_backend(repo_path, backend):
+    tracer.reset()
+    with tracer.phase('git_history', shared=True) as phase:
+        start = time.perf_counter()
+        index = GitHistoryIndex(repo_path=repo_path, backend=backend).build()
+        seconds = time.perf_counter() - start
+
+    return index, seconds, phase['subprocesses']
+
+
+def main():
+    parser = argparse.ArgumentParser("Git history benchmark")
+    parser.add_argument('repositories', nargs='*', help="Local git repositories")
+    parser.add_argument('--synthetic', type=int, default=None, help="Generate a synthetic repository with this many commits")
+    parser.add_argument('--gc', action='store_true', help="Pack the synthetic repository (git gc) before measuring")
+    args = parser.parse_args()
+
+    repositories = list(args.repositories)
+    tmp_dir = tempfile.TemporaryDirectory()
+    if args.synthetic or len(repositories) == 0:
+        synthetic_path = os.path.join(tmp_dir.name, 'synthetic')
+        generate_synthetic_repository(synthetic_path, args.synthetic or 2000)
+        if args.gc:
+            subprocess.check_call(['git', 'gc', '-q', '--aggressive'], cwd=synthetic_path)
+        repositories.append(synthetic_path)
+
+    print(f"{'repository'.ljust(30)} {'query'.ljust(22)} {'backend'.ljust(10)} {'seconds'.rjust(8)} {'subprocesses'.rjust(12)}")
+    for repo_path in repositories:
+        name = os.path.basename(os.path.abspath(repo_path))[:30].ljust(30)
+
+        indexes = {}
+        for backend in HISTORY_BACKENDS:
+            index, seconds, nb_subprocesses = run_backend(repo_path, backend)
+            indexes[backend] = index.to_dict()
+            print(f"{name} {'history index'.ljust(22)} {backend.ljust(10)} {seconds:8.3f} {nb_subprocesses:12d}")
+
+        if indexes['objects'] != indexes['subprocess']:
+            print(f"[WARNING] The backends disagree on {repo_path}")
+
+    tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the native import scanner against the previous grep pipeline on a large source tree
+
+    python benchmarks/bench_imports.py {project_path} ...
+    python benchmarks/bench_imports.py --synthetic 20000
+
+The synthetic tree has {--lines} lines per file, {--fallback_ratio} of the files need the ast parser (See synthetic.py)
+The grep pipeline only sees unindented imports, the modules it misses are reported
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from py_requirements_guesser.imports import iter_python_files, scan_imports, scan_files_imports, find_imported_modules
+
+from synthetic import MODULES, generate_source_tree
+
+
+def grep_imports(root):
+    """
+    Previous implementation : grep the unindented import statements
+    """
+    cmd = 'grep -PRoh --include="*.py" "(?<=^import )\\w*|(?<=^from )\\w*" . | sort | uniq'
+    output = subprocess.run(cmd, shell=True, cwd=root, stdout=subprocess.PIPE).stdout.decode().strip()
+
+    return set(output.split('\n')) if output else set()
+
+
+def sequential_scan(root):
+    modules, _ = scan_files_imports([os.path.join(root, path) for path in iter_python_files(root)])
+
+    return modules
+
+
+SCANNERS = {
+    'grep': grep_imports,
+    'native (1 process)': sequential_scan,
+    'native': scan_imports,
+    'find 3 modules': lambda root: find_imported_modules(MODULES[:3], root)
+}
+
+
+def main():
+    parser = argparse.ArgumentParser("Import scanning benchmark")
+    parser.add_argument('projects', nargs='*', help="Local project directories")
+    parser.add_argument('--synthetic', type=int, default=None, help="Generate a synthetic tree with this many python files")
+    parser.add_argument('--lines', type=int, default=200, help="Lines per file of the synthetic tree")
+    parser.add_argument('--fallback_ratio', type=float, default=0.05, help="Ratio of synthetic files parsed with ast")
+    parser.add_argument('--repeat', type=int, default=3, help="Best of {repeat} runs (The first one warms the page cache)")
+    args = parser.parse_args()
+
+    projects = list(args.projects)
+    tmp_dir = tempfile.TemporaryDirectory()
+    if args.synthetic or len(projects) == 0:
+        synthetic_path = os.path.join(tmp_dir.name, 'synthetic')
+        generate_source_tree(synthetic_path, args.synthetic or 20000, args.lines, args.fallback_ratio)
+        projects.append(synthetic_path)
+
+    print(f"{'project'.ljust(30)} {'files'.rjust(8)} {'scanner'.ljust(20)} {'seconds'.rjust(8)} {'modules'.rjust(8)}")
+    for root in projects:
+        name = os.path.basename(os.path.abspath(root))[:30].ljust(30)
+        nb_files = sum(1 for _ in iter_python_files(root))
+
+        results = {}
+        for scanner_name, scanner in SCANNERS.items():
+            seconds = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results[scanner_name] = scanner(root)
+                seconds = min(seconds, time.perf_counter() - start)
+
+            print(f"{name} {nb_files:8d} {scanner_name.ljust(20)} {seconds:8.3f} {len(results[scanner_name]):8d}")
+
+        if results['native'] != results['native (1 process)']:
+            print(f"[WARNING] The process pool and the sequential scan disagree on {root}")
+
+        missed = results['native'] - results['grep']
+        if missed:
+            print(f"{name} modules missed by grep : {', '.join(sorted(missed))}")
+
+    tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compare peak memory and wall time of the streaming Pypi release parser against json.loads on the full document
+
+    python benchmarks/bench_release_parsing.py {recorded_pypi_json} ...
+    python benchmarks/bench_release_parsing.py --synthetic 5000
+
+Each measure runs in a fresh interpreter so that peak RSS isn't polluted by the previous run
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from py_requirements_guesser.pypi import parse_pypi_releases
+
+
+def parse_full_document(stream):
+    """
+    Previous implementation : decode the whole document then keep the upload date of the first file
+    """
+    resp = json.loads(stream.read())
+
+    return [(version, files[0]['upload_time'].split("T")[0]) for version, files in resp['releases'].items() if len(files) > 0]
+
+
+PARSERS = {
+    'json.loads': parse_full_document,
+    'streaming': parse_pypi_releases
+}
+
+
+def generate_synthetic_document(filepath, nb_releases, files_per_release=40):
+    """
+    Mimic the layout of a large Pypi document (Long description, many wheels per release)
+    """
+    with open(filepath, 'w') as f:
+        f.write('{"info": {"name": "synthetic", "description": %s}, "releases": {' % json.dumps("x" * 500000))
+
+        for i in range(nb_releases):
+            files = [{
+                "filename": f"synthetic-{i}.0-cp3{j % 10}-cp3{j % 10}-manylinux_2_17_x86_64.whl",
+                "digests": {"md5": "0" * 32, "sha256": "0" * 64},
+                "requires_python": ">=3.6",
+                "size": 1000000 + j,
+                "upload_time": "2020-01-01T00:00:00",
+                "upload_time_iso_8601": "2020-01-01T00:00:00.000000Z",
+                "url": f"https://files.pythonhosted.org/packages/00/00/synthetic-{i}.0-{j}.whl",
+                "yanked": False
+            } for j in range(files_per_release)]
+
+            f.write(('' if i == 0 else ',') + json.dumps(f"{i}.0") + ':' + json.dumps(files))
+
+        f.write('}, "urls": [], "vulnerabilities": []}')
+
+
+def measure(parser_name, filepath):
+    """
+    Run in a child process, print the measures as JSON
+    """
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    with open(filepath, 'rb') as f:
+        nb_releases = len(PARSERS[parser_name](f))
+    elapsed = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'parser': parser_name,
+        'releases': nb_releases,
+        'seconds': elapsed,
+        # ru_maxrss is in KB on linux
+        'peak_rss_mb': peak_rss / 1024,
+        'parsing_rss_mb': (peak_rss - baseline_rss) / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser("Pypi release parsing benchmark")
+    parser.add_argument('fixtures', nargs='*', help="Recorded Pypi JSON documents")
+    parser.add_argument('--synthetic', type=int, default=None, help="Generate a synthetic document with this many releases")
+    parser.add_argument('--measure', nargs=2, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    fixtures = list(args.fixtures)
+    tmp_dir = tempfile.TemporaryDirectory()
+    if args.synthetic or len(fixtures) == 0:
+        synthetic_filepath = os.path.join(tmp_dir.name, 'synthetic.json')
+        generate_synthetic_document(synthetic_filepath, args.synthetic or 2000)
+        fixtures.append(synthetic_filepath)
+
+    print(f"{'fixture'.ljust(30)} {'size MB'.rjust(8)} {'parser'.ljust(12)} {'releases'.rjust(8)} {'seconds'.rjust(8)} {'parse RSS MB'.rjust(12)}")
+    for fixture in fixtures:
+        size = os.path.getsize(fixture) / (1024 * 1024)
+
+        for parser_name in PARSERS:
+            output = subprocess.check_output([sys.executable, __file__, '--measure', parser_name, fixture])
+            result = json.loads(output)
+
+            print(f"{os.path.basename(fixture)[:30].ljust(30)} {size:8.1f} {parser_name.ljust(12)} {result['releases']:8d} "
+                  f"{result['seconds']:8.3f} {result['parsing_rss_mb']:12.1f}")
+
+    tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Local stub of the Pypi JSON api serving recorded release histories with a configurable latency
+
+    python benchmarks/stub_pypi.py --histories {recorded.json} --port 8765 --latency 50
+    python benchmarks/stub_pypi.py --record {recorded.json}
+
+The recorded histories are {package: {version: upload date}}, --record writes them from the local release cache
+Answers {base}/{package}/json (404 for unknown packages, ETag / If-None-Match supported) and
+{base}/{package}/{version}/json (Without requirements)
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import datetime
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from py_requirements_guesser.cache import ReleaseCache, normalize_package_name
+
+
+def record_histories(filepath, cache=None):
+    """
+    Write the histories of the release cache to {filepath}, return the number of packages
+    """
+    cache = cache or ReleaseCache()
+    histories = {}
+    for package_name, version, entry in cache.iter_entries():
+        if version is None and entry['releases'] is not None:
+            histories[package_name] = {v: datetime.date.fromordinal(ordinal).isoformat() for v, ordinal, *_ in entry['releases']}
+
+    with open(filepath, 'w') as f:
+        json.dump(histories, f)
+
+    return len(histories)
+
+
+class StubPypiServer:
+    """
+    Serve {histories} on 127.0.0.1:{port} (0 picks a free port) from a background thread
+    Every response is delayed by {latency} seconds
+    """
+
+    def __init__(self, histories, port=0, latency=0, base_path='/pypi'):
+        self.latency = latency
+        self.base_path = base_path.rstrip('/')
+        self.nb_requests = 0
+
+        # Pypi JSON documents are rendered once, lookups use the normalized name
+        self.documents = {}
+        for package_name, releases in histories.items():
+            body = json.dumps({
+                'info': {'name': package_name, 'requires_dist': None},
+                'releases': {version: [{'filename': f"{package_name}-{version}{suffix}", 'upload_time': f"{date}T00:00:00",
+                                        'requires_python': None, 'yanked': False}
+                                       for suffix in ('.tar.gz', '-py3-none-any.whl')]
+                             for version, date in releases.items()}
+            }).encode()
+            self.documents[normalize_package_name(package_name)] = (body, f'"{zlib.crc32(body):08x}"')
+
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._create_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{self.base_path}"
+
+    def _create_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes, Nagle's algorithm would add the delayed ACK to every response
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.nb_requests += 1
+
+                if stub.latency > 0:
+                    time.sleep(stub.latency)
+
+                status, headers, body = stub.respond(self.path, self.headers.get('If-None-Match'))
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def respond(self, path, if_none_match=None):
+        parts = path[len(self.base_path):].strip('/').split('/') if path.startswith(self.base_path) else []
+        document = self.documents.get(normalize_package_name(parts[0])) if len(parts) in (2, 3) and parts[-1] == 'json' else None
+
+        if document is None:
+            return 404, {}, b''
+
+        body, etag = document
+        if len(parts) == 3:
+            return 200, {'Content-Type': 'application/json'}, json.dumps({'info': {'name': parts[0], 'requires_dist': None}}).encode()
+        elif if_none_match == etag:
+            return 304, {'ETag': etag}, b''
+
+        return 200, {'Content-Type': 'application/json', 'ETag': etag}, body
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser("Stub Pypi server")
+    parser.add_argument('--histories', type=str, default=None, help="Recorded histories to serve")
+    parser.add_argument('--record', type=str, default=None, help="Record the histories of the release cache to this file")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help="Delay of each response in ms")
+    args = parser.parse_args()
+
+    if args.record:
+        print(f"Recorded {record_histories(args.record)} packages to {args.record}")
+        return
+
+    if not args.histories:
+        print("[ERROR] --histories or --record is required")
+        exit(1)
+
+    with open(args.histories, 'r') as f:
+        histories = json.load(f)
+
+    stub = StubPypiServer(histories, args.port, args.latency / 1000)
+    print(f"Serving {len(histories)} packages on {stub.url}")
+    stub.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Synthetic inputs shared by the benchmarks : git repositories and Pypi release histories
+"""
+import os
+import random
+import datetime
+import subprocess
+
+
+MODULES = ['numpy', 'pandas', 'requests', 'yaml', 'flask', 'django', 'scipy', 'torch', 'sklearn', 'click', 'tqdm', 'six']
+# Pypi name of the modules whose import name differs
+MODULE_PACKAGES = {'yaml': 'PyYAML', 'sklearn': 'scikit-learn'}
+
+
+def get_modules(nb_modules):
+    """
+    Return {nb_modules} importable module names, real ones first then generated ones
+    """
+    return MODULES[:nb_modules] + [f"benchmod{i}" for i in range(max(0, nb_modules - len(MODULES)))]
+
+
+def get_package_name(module):
+    return MODULE_PACKAGES.get(module, module)
+
+
+def generate_synthetic_repository(repo_path, nb_commits, nb_files=200, imports_per_file=1, requirements_churn=0.05,
+                                  merge_every=50, modules=MODULES, seed=0):
+    """
+    Create a git repository (With git fast-import) of {nb_commits} commits on {nb_files} python files
+    Each file starts with {imports_per_file} imports, every commit edits 3 files (Adding an import 30% of the time)
+    {requirements_churn} is the probability that a commit adds or removes a line of requirements.txt (Unpinned, so that it is guessed)
+    Every {merge_every} commits, the changes are made on a side branch that is merged back
+    """
+    rng = random.Random(seed)
+    subprocess.check_call(['git', 'init', '-q', repo_path])
+
+    files = {f"pkg{i % 20}/module_{i}.py": [f"import {m}\n" for m in rng.sample(modules, min(imports_per_file, len(modules)))] + ["x = 1\n"] * 30
+             for i in range(nb_files)}
+    requirements = []
+
+    process = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=repo_path, stdin=subprocess.PIPE)
+
+    def write(data):
+        process.stdin.write(data.encode() if isinstance(data, str) else data)
+
+    def write_file(path, content):
+        content = content.encode()
+        write(f"M 100644 inline {path}\ndata {len(content)}\n")
+        write(content + b'\n')
+
+    def write_commit(branch, mark, timestamp, parents, paths):
+        message = f"commit {mark}".encode()
+        write(f"commit refs/heads/{branch}\nmark :{mark}\n")
+        write(f"author Bench <bench@example.com> {timestamp} +0000\ncommitter Bench <bench@example.com> {timestamp} +0000\n")
+        write(f"data {len(message)}\n")
+        write(message + b'\n')
+        if parents:
+            write(f"from :{parents[0]}\n")
+            for parent in parents[1:]:
+                write(f"merge :{parent}\n")
+
+        for path in paths:
+            if path == 'requirements.txt':
+                write_file(path, ''.join(f"{get_package_name(m)}\n" for m in requirements))
+            else:
+                write_file(path, ''.join(files[path]))
+
+        write('\n')
+
+    timestamp = 1500000000
+    write_commit('master', 1, timestamp, [], list(files) + ['requirements.txt'])
+    master_mark = 1
+
+    for mark in range(2, nb_commits + 1):
+        timestamp += 3600
+        paths = rng.sample(list(files), min(3, len(files)))
+        for path in paths:
+            line = rng.randrange(len(files[path]))
+            files[path].insert(line, f"import {rng.choice(modules)}\n" if rng.random() < 0.3 else f"y = {mark}\n")
+
+        if rng.random() < requirements_churn:
+            module = rng.choice(modules)
+            if module in requirements:
+                requirements.remove(module)
+            else:
+                requirements.append(module)
+            paths.append('requirements.txt')
+
+        if mark % merge_every == 0:
+            # Side branch then merge it back
+            write_commit('side', mark, timestamp, [master_mark], paths)
+            write_commit('master', nb_commits + mark, timestamp + 1, [master_mark, mark], paths)
+            master_mark = nb_commits + mark
+        else:
+            write_commit('master', mark, timestamp, [master_mark], paths)
+            master_mark = mark
+
+    process.stdin.close()
+    process.wait()
+
+    subprocess.check_call(['git', 'checkout', '-q', 'master'], cwd=repo_path)
+
+
+def generate_source_tree(root, nb_files, nb_lines=200, fallback_ratio=0.05, modules=MODULES, seed=0):
+    """
+    Write {nb_files} python files of about {nb_lines} lines under {root}, in nested packages
+    Besides plain import statements, files have imports indented in functions and relative imports
+    A {fallback_ratio} of the files have a one line 'try: import x' block or a docstring line starting with 'import',
+    which are parsed with ast instead of the regexes
+    """
+    rng = random.Random(seed)
+    body = ["def f{i}(x):\n", "    y = x * {i}\n", "    return y\n", "\n"]
+    for i in range(nb_files):
+        directory = os.path.join(root, f"pkg{i % 50}", f"sub{i % 7}")
+        os.makedirs(directory, exist_ok=True)
+
+        lines = [f"import {m}\n" for m in rng.sample(modules, min(3, len(modules)))]
+        lines.append(f"from {rng.choice(modules)}.sub import name\n")
+        lines.append("from . import sibling\n")
+
+        kind = rng.random()
+        if kind < fallback_ratio / 2:
+            lines.append(f"try: import {rng.choice(modules)}\nexcept ImportError: pass\n")
+        elif kind < fallback_ratio:
+            lines.append('"""\nimport this is a docstring, not a statement\n"""\n')
+
+        for j in range((nb_lines - len(lines)) // len(body)):
+            lines.extend(line.format(i=j) for line in body)
+            if j == 5:
+                lines.append(f"    import {rng.choice(modules)}\n")
+
+        with open(os.path.join(directory, f"module_{i}.py"), 'w') as f:
+            f.writelines(lines)
+
+
+def generate_release_histories(package_names, nb_releases=60, start_date=datetime.date(2014, 1, 1), seed=0):
+    """
+    Return {package_name: {version: upload date}}, about one release a month from {start_date}
+    """
+    rng = random.Random(seed)
+    histories = {}
+    for package_name in package_names:
+        date = start_date + datetime.timedelta(days=rng.randrange(60))
+        releases = {}
+        for i in range(nb_releases):
+            releases[f"{i // 10}.{i % 10}.0"] = date.isoformat()
+            date += datetime.timedelta(days=rng.randrange(10, 50))
+
+        histories[package_name] = releases
+
+    return histories
@@ -0,0 +1,6 @@
+from .api import RequirementsGuesser
+from .compatibility import Target
+from .monorepo import Subproject, find_subprojects
+from .results import GuessResult, PackageResult, Candidate, REASONS
+from .errors import GuesserError, NotAGitRepositoryError, NoImportsError, GitHistoryError
+from .pypi import PypiUnreachableError
@@ -0,0 +1,66 @@
+import os
+
+from .guesser import Guesser
+from .cache import ReleaseCache
+from .backends import create_backend
+from .errors import NotAGitRepositoryError
+from .instrumentation import Tracer, get_tracer, use_tracer
+from .results import GuessResult
+from .utils import validate_cwd_is_git_repo, get_mapping_files_from_pipreqs
+
+
+class RequirementsGuesser:
+    """
+    Reusable entry point to guess the requirements of many repositories from a long running process
+
+    Nothing is printed and nothing is prompted, errors are raised (See errors.py, all inherit from GuesserError)
+    The release cache, the Pypi connections and the mapping tables are shared by every call
+    guess() is thread safe, concurrent calls analyse their repository independently
+
+        guesser = RequirementsGuesser()
+        result = guesser.guess('path/to/repo', policy='earliest')
+        for package in result.packages:
+            print(package.package_name, package.version, package.reason, package.candidates)
+    """
+
+    def __init__(self, index_url=None, index_type='json', snapshot=None, offline=False, pypi_concurrency=8,
+                 cache_ttl=24*60*60, cache_max_size=100*1024*1024, release_cache=None, pypi_backend=None):
+        self.release_cache = release_cache if release_cache is not None else ReleaseCache(ttl=cache_ttl, max_size=cache_max_size)
+        self.pypi_backend = pypi_backend if pypi_backend is not None else \
+            create_backend(index_url, index_type, snapshot, self.release_cache, offline, pypi_concurrency)
+
+        # Compile the mapping index before the first call, it is then shared by every Guesser of the process
+        get_mapping_files_from_pipreqs()
+
+    def guess(self, repo_path, policy='first_import', force_guess=None, keep_unused_packages=False, pin_dependencies=False,
+              state=None, log=None, target=None, only=None, subproject=None, tracer=None):
+        """
+        Guess the versions of the packages used in {repo_path}, return a GuessResult
+
+        policy: Choice between the first import and requirements.txt candidates when they disagree
+                One of STRATEGIES (See guesser.py) or a callable(package_name, candidates) returning one of the candidates
+        force_guess: Local modules to guess anyways (List of names)
+        state: State of a previous analysis (GuessResult.state), only the commits made since then are analysed
+        log: Called with each progress message
+        target: Only guess versions installable on this python version / platform (compatibility.Target)
+        only: Only guess these packages (List of package or import names), the returned state is then None
+        subproject: Only analyse this sub-project of a monorepo (See monorepo.find_subprojects()), its state is kept separately
+        tracer: Timings of this call (instrumentation.Tracer), by default a new tracer emitting its events to the current one
+        """
+        if policy is None:
+            raise ValueError("A decision policy is required, the library never prompts")
+
+        if not validate_cwd_is_git_repo(repo_path):
+            raise NotAGitRepositoryError(f"'{repo_path}' is not a git repository")
+
+        # Concurrent calls must not count each other's work
+        with use_tracer(tracer if tracer is not None else Tracer(parent=get_tracer())):
+            guesser = Guesser(force_guess=force_guess, keep_unused_packages=keep_unused_packages, state=state, repo_path=repo_path,
+                              strategy=policy, pypi_backend=self.pypi_backend, log=log, target=target, only=only,
+                              subproject=subproject)
+
+            packages = guesser.guess_package_versions()
+            dependencies = guesser.pin_dependencies(packages) if pin_dependencies else []
+
+        return GuessResult(os.path.abspath(repo_path), guesser.history.head, list(guesser.results.values()), dependencies,
+                           dict(guesser.skipped), guesser.get_state(), subproject.path if subproject is not None else None)
@@ -0,0 +1,150 @@
+import threading
+
+from .pypi import PypiClient, PYPI_JSON_API_URL, fetch_package_releases, fetch_cached_releases, fetch_requires_dist
+from .simple_index import SimpleIndexClient
+from .snapshot import ReleaseSnapshot
+from .cache import normalize_package_name, MemoryCache
+
+
+INDEX_TYPES = ['json', 'simple']
+
+
+class JsonApiBackend:
+    """
+    Release histories from a Pypi JSON api (pypi.org or a mirror exposing {base_url}/{package}/json)
+    """
+
+    def __init__(self, client=None, cache=None, offline=False):
+        self.client = client if client is not None else PypiClient()
+        self.cache = cache
+        self.offline = offline
+        self.max_workers = self.client.max_workers
+
+    def get_releases(self, package_name):
+        return fetch_package_releases(package_name, self.client, self.cache, self.offline)
+
+    def get_requires_dist(self, package_name, version):
+        return fetch_requires_dist(package_name, version, self.client, self.cache, self.offline)
+
+
+class SimpleIndexBackend:
+    """
+    Release histories from a PEP 691 simple repository, upload dates come from the PEP 700 'upload-time' of the files
+    Requirements are read from the core metadata files (PEP 658) when the repository serves them
+    """
+
+    def __init__(self, index_client, cache=None, offline=False):
+        self.index_client = index_client
+        self.cache = cache
+        self.offline = offline
+        self.max_workers = index_client.max_workers
+
+        # Core metadata url of each release, from the project pages retrieved during this run
+        self._metadata_urls = {}
+        self._lock = threading.Lock()
+
+    def _request_project_page(self, package_name, headers=None):
+        status, resp_headers, body = self.index_client.get_project_page(package_name, headers)
+
+        if status == 200:
+            releases, metadata_urls = body
+            with self._lock:
+                self._metadata_urls[normalize_package_name(package_name)] = metadata_urls
+
+            body = releases
+
+        return status, resp_headers, body
+
+    def get_releases(self, package_name):
+        def request(headers):
+            return self._request_project_page(package_name, headers)
+
+        return fetch_cached_releases(package_name, request, self.index_client.host, self.cache, self.offline)
+
+    def get_requires_dist(self, package_name, version):
+        entry = self.cache.get_requires_dist(package_name, version) if self.cache is not None else None
+
+        if entry is not None:
+            return entry['requires_dist']
+        elif self.offline:
+            return None
+
+        key = normalize_package_name(package_name)
+        if key not in self._metadata_urls:
+            # Releases came from the cache, we never saw the project page
+            self._request_project_page(package_name)
+
+        metadata_url = self._metadata_urls.get(key, {}).get(version)
+        requires_dist = self.index_client.get_requires_dist(metadata_url) if metadata_url is not None else None
+
+        if self.cache is not None:
+            self.cache.put_requires_dist(package_name, version, requires_dist)
+
+        return requires_dist
+
+
+class SnapshotBackend:
+    """
+    Release histories from a snapshot file (See snapshot.py), no HTTP request is ever made
+    """
+
+    # Lookups are a few microseconds, threads would only add overhead
+    max_workers = 1
+
+    def __init__(self, filepath):
+        self.snapshot = ReleaseSnapshot(filepath)
+
+    def get_releases(self, package_name):
+        return self.snapshot.get_releases(package_name)
+
+    def get_requires_dist(self, package_name, version):
+        return self.snapshot.get_requires_dist(package_name, version)
+
+
+class MemoryCachedBackend:
+    """
+    Keep the release histories and requirements returned by {backend} in memory, for long running processes (See service.py)
+    Histories expire after {ttl} seconds so that new releases are seen, the requirements of a release never change
+    """
+
+    def __init__(self, backend, max_entries=20000, ttl=24*60*60):
+        self.backend = backend
+        self.max_workers = backend.max_workers
+        self.offline = getattr(backend, 'offline', False)
+
+        self.releases = MemoryCache(max_entries, ttl)
+        self.requires = MemoryCache(max_entries)
+
+    def get_releases(self, package_name):
+        key = normalize_package_name(package_name)
+        found, releases = self.releases.get(key)
+
+        if not found:
+            releases = self.backend.get_releases(package_name)
+            self.releases.put(key, releases)
+
+        return releases
+
+    def get_requires_dist(self, package_name, version):
+        key = (normalize_package_name(package_name), version)
+        found, requires_dist = self.requires.get(key)
+
+        if not found:
+            requires_dist = self.backend.get_requires_dist(package_name, version)
+            self.requires.put(key, requires_dist)
+
+        return requires_dist
+
+
+def create_backend(index_url=None, index_type='json', snapshot=None, cache=None, offline=False, max_workers=8):
+    """
+    Backend for the --index_url, --index_type and --snapshot arguments
+    """
+    if snapshot is not None:
+        return SnapshotBackend(snapshot)
+    elif index_type == 'simple':
+        return SimpleIndexBackend(SimpleIndexClient(index_url or "https://pypi.org/simple", max_workers=max_workers), cache, offline)
+    elif index_type == 'json':
+        return JsonApiBackend(PypiClient(index_url or PYPI_JSON_API_URL, max_workers=max_workers), cache, offline)
+
+    raise ValueError(f"Unknown index type '{index_type}', should be one of {INDEX_TYPES}")
@@ -0,0 +1,152 @@
+import os
+import json
+import hashlib
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .guesser import Guesser
+from .cache import ReleaseCache, normalize_package_name
+from .backends import create_backend
+from .instrumentation import Tracer, use_tracer
+from .errors import NotAGitRepositoryError
+from .state import get_state_filepath, load_state, save_state
+from .releases import to_ordinal
+from .utils import validate_cwd_is_git_repo, get_mapping_files_from_pipreqs, get_requirements_txt_lines
+from .utils import get_date_last_modified_python_file
+
+
+def get_report_filepath(report_dir, repo_path):
+    repo_path = os.path.abspath(repo_path)
+    repo_hash = hashlib.sha1(repo_path.encode()).hexdigest()[:8]
+
+    return os.path.join(report_dir, f"{os.path.basename(repo_path)}-{repo_hash}.json")
+
+
+def get_release_drift(releases, result, last_change):
+    """
+    Version of a guessed package current at the {last_change} of the code and the releases published since the chosen date
+    Packages pinned by a manifest have no chosen date, only the version at the last change is reported
+    """
+    if releases is None or len(releases) == 0 or last_change is None:
+        return {'version_at_last_change': None, 'releases_since': []}
+
+    if result.date is None:
+        return {'version_at_last_change': releases.version_at(last_change), 'releases_since': []}
+
+    _, version_at_last_change = releases.versions_at([result.date, last_change])
+    releases_since = releases.releases_between(to_ordinal(result.date) + 1, last_change)
+
+    return {
+        'version_at_last_change': version_at_last_change,
+        'releases_since': [version for version, _ in releases_since]
+    }
+
+
+def guess_repository(repo_path, report_dir, strategy, force_guess=None, keep_unused_packages=False, pypi_concurrency=8,
+                     offline=False, cache_ttl=24*60*60, cache_max_size=100*1024*1024, reset_state=False, pin_dependencies=False,
+                     index_url=None, index_type='json', snapshot=None, target=None):
+    """
+    Guess the package versions of {repo_path} without prompting, write its report in {report_dir}
+    The console output of the guesser is written to a .log file next to the report
+    """
+    report_filepath = get_report_filepath(report_dir, repo_path)
+    report = {
+        'repo_path': os.path.abspath(repo_path),
+        'commit': None,
+        'strategy': strategy,
+        'target': str(target) if target is not None else None,
+        'packages': [],
+        'dependencies': [],
+        'skipped': {},
+        'requirements': None,
+        'last_change': None,
+        'error': None,
+        'timings': None
+    }
+
+    # Worker processes handle many repositories, only keep the events of this one
+    run_tracer = Tracer()
+    run_tracer.start_recording()
+
+    with use_tracer(run_tracer), open(report_filepath[:-5] + ".log", 'w') as log_file, redirect_stdout(log_file):
+        try:
+            if not validate_cwd_is_git_repo(repo_path):
+                raise NotAGitRepositoryError(f"'{repo_path}' is not a git repository")
+
+            state_filepath = get_state_filepath(repo_path)
+            state = None if reset_state else load_state(state_filepath)
+
+            # All the jobs of the batch share the on disk Pypi release cache
+            release_cache = ReleaseCache(ttl=cache_ttl, max_size=cache_max_size)
+            backend = create_backend(index_url, index_type, snapshot, release_cache, offline, pypi_concurrency)
+            guesser = Guesser(force_guess=force_guess, keep_unused_packages=keep_unused_packages, state=state, repo_path=repo_path,
+                              strategy=strategy, pypi_backend=backend, target=target)
+
+            packages = guesser.guess_package_versions()
+            dependencies = guesser.pin_dependencies(packages) if pin_dependencies else []
+            save_state(state_filepath, guesser.get_state())
+
+            report['commit'] = guesser.history.head
+            report['skipped'] = guesser.skipped
+            report['requirements'] = get_requirements_txt_lines(packages + dependencies)
+            report['dependencies'] = [{'package_name': package_name, 'version': version} for package_name, version in dependencies]
+
+            # How far behind the guessed versions are at the last change of the code
+            last_change = get_date_last_modified_python_file(repo_path)
+            report['last_change'] = last_change.strftime("%Y-%m-%d") if last_change is not None else None
+
+            for package_name, version in packages:
+                result = guesser.results[normalize_package_name(package_name)]
+                report['packages'].append(dict({
+                    'package_name': package_name,
+                    'version': version,
+                    'date': result.date,
+                    'source': result.source or 'requirements.txt'
+                }, **get_release_drift(guesser.release_indexes.get(normalize_package_name(package_name)), result, last_change)))
+
+        except Exception as e:
+            # Keep going with the other repositories
+            report['error'] = f"{type(e).__name__}: {e}"
+
+    report['timings'] = run_tracer.summary()
+
+    with open(report_filepath, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    return report
+
+
+def run_batch(repo_paths, report_dir, strategy, max_workers=None, **options):
+    """
+    Guess the package versions of many repositories concurrently in a process pool
+    """
+    os.makedirs(report_dir, exist_ok=True)
+
+    # Compile the pipreqs mapping index once before starting the jobs
+    get_mapping_files_from_pipreqs()
+
+    print(f"Guessing package versions for {len(repo_paths)} repositories using the '{strategy}' strategy")
+
+    nb_errors = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(guess_repository, repo_path, report_dir, strategy, **options): repo_path for repo_path in repo_paths}
+
+        for i, future in enumerate(as_completed(futures)):
+            repo_path = futures[future]
+
+            try:
+                report = future.result()
+            except Exception as e:
+                report = {'error': f"{type(e).__name__}: {e}", 'packages': []}
+
+            if report['error']:
+                nb_errors += 1
+                status = f"[ERROR] {report['error']}"
+            else:
+                status = f"{len(report['packages'])} packages"
+
+            print(f"[{i+1}/{len(repo_paths)}] {repo_path} : {status}")
+
+    print(f"Reports written to '{report_dir}' ({nb_errors} errors)")
+
+    return nb_errors
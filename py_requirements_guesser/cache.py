@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .releases import pack_compatibility, unpack_compatibility
+
+
+# Release cache, mapping index and states (PY_REQS_GUESSER_CACHE_ROOT can point elsewhere, benchmarks use it)
+CACHE_ROOT = os.environ.get("PY_REQS_GUESSER_CACHE_ROOT", "/tmp/.py-reqs-guesser")
+# Bumped whenever the format of the cached releases change
+CACHE_FORMAT_VERSION = 3
+NORMALIZE_NAME_REGEX = re.compile(r'[-_.]+')
+# Entries start with their fetch time (Whole seconds, fixed width) so that a revalidation only rewrites it (See refresh())
+ENTRY_PREFIX = b'{"fetched_at":'
+
+
+def normalize_package_name(package_name):
+    """
+    PEP 503 normalization so that 'Zope.Interface', 'zope-interface' and 'zope_interface' share the same cache entry
+    """
+    return NORMALIZE_NAME_REGEX.sub('-', package_name).lower()
+
+
+class ReleaseCache:
+    """
+    On disk cache of the parsed Pypi release history (version, upload date, compatibility summary) of each package
+    One small JSON file per package, the raw Pypi documents are never stored (The summaries are packed, see compatibility.py)
+    The requirements (requires_dist) of a release never change, they are cached without expiration
+
+    Entries older than {ttl} seconds must be revalidated (Using the stored ETag), a 304 response only updates their timestamp
+    When the cache grows over {max_size} bytes, the least recently used entries are evicted down to {low_water_ratio} of it
+    The total size is scanned once then tracked on writes so that the directory is only listed again when evicting
+    Files are written to a temporary file then atomically renamed so parallel jobs can share the cache
+    """
+
+    def __init__(self, path=f"{CACHE_ROOT}/pypi", ttl=24*60*60, max_size=100*1024*1024, low_water_ratio=0.8):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.low_water_ratio = low_water_ratio
+
+        # Size of the entries, None until the first write. Writes of other processes are only seen by the next eviction
+        self._size = None
+        self._size_lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry_path(self, package_name, version=None):
+        if version is not None:
+            return f"{self.path}/{normalize_package_name(package_name)}=={version}.json"
+
+        return f"{self.path}/{normalize_package_name(package_name)}.json"
+
+    def get(self, package_name):
+        """
+        Return the cached entry {'fetched_at', 'etag', 'releases'} or None
+        'releases' is None for packages that doesn't exist on Pypi
+        """
+        return self._unpack_releases(self._read_entry(self._entry_path(package_name)))
+
+    def get_requires_dist(self, package_name, version):
+        """
+        Return the cached entry {'fetched_at', 'requires_dist'} of a release or None
+        """
+        return self._read_entry(self._entry_path(package_name, version))
+
+    def _read_entry(self, entry_path, touch=True):
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+
+            # Modification time is used as last access time for the LRU eviction
+            if touch:
+                os.utime(entry_path)
+        except (OSError, ValueError):
+            # Missing, evicted by another process or corrupted entry
+            return None
+
+        if entry.get('format') != CACHE_FORMAT_VERSION:
+            return None
+
+        return entry
+
+    @staticmethod
+    def _unpack_releases(entry):
+        if entry is not None and entry['releases'] is not None:
+            entry['releases'] = unpack_compatibility(entry['releases'], entry.pop('compatibility', None))
+
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def refresh(self, package_name):
+        """
+        Mark the entry of {package_name} as fetched now (Not modified on Pypi), the timestamp is overwritten in place
+        Return False when the entry can't be refreshed (Missing or written by a previous version)
+        """
+        entry_path = self._entry_path(package_name)
+        fetched_at = str(int(time.time())).encode()
+
+        try:
+            with open(entry_path, 'r+b') as f:
+                header = f.read(len(ENTRY_PREFIX) + len(fetched_at) + 1)
+                if not header.startswith(ENTRY_PREFIX) or not header.endswith(b','):
+                    return False
+
+                f.seek(len(ENTRY_PREFIX))
+                f.write(fetched_at)
+
+            os.utime(entry_path)
+        except OSError:
+            return False
+
+        return True
+
+    def put(self, package_name, releases, etag=None):
+        entry = {
+            'fetched_at': int(time.time()),
+            'format': CACHE_FORMAT_VERSION,
+            'etag': etag,
+            'releases': [release[:2] for release in releases] if releases is not None else None,
+            'compatibility': pack_compatibility(releases) if releases is not None else None
+        }
+        self._write_entry(self._entry_path(package_name), entry)
+
+        return self._unpack_releases(entry)
+
+    def put_requires_dist(self, package_name, version, requires_dist):
+        entry = {
+            'fetched_at': int(time.time()),
+            'format': CACHE_FORMAT_VERSION,
+            'requires_dist': requires_dist
+        }
+
+        return self._write_entry(self._entry_path(package_name, version), entry)
+
+    def _write_entry(self, entry_path, entry):
+        fd, tmp_filepath = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f, separators=(',', ':'))
+                size = f.tell()
+
+            try:
+                previous_size = os.stat(entry_path).st_size
+            except OSError:
+                previous_size = 0
+
+            os.replace(tmp_filepath, entry_path)
+        except OSError:
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            raise
+
+        with self._size_lock:
+            if self._size is not None:
+                self._size += size - previous_size
+            should_evict = self._size is None or self._size > self.max_size
+
+        if should_evict:
+            self.evict()
+
+        return entry
+
+    def iter_entries(self):
+        """
+        Yield (normalized package name, version, entry) for every valid entry of the cache
+        version is None for release histories and set for the requirements of a release
+        """
+        for dir_entry in os.scandir(self.path):
+            if not dir_entry.name.endswith('.json'):
+                continue
+
+            entry = self._read_entry(dir_entry.path, touch=False)
+            if entry is None:
+                continue
+
+            package_name, _, version = dir_entry.name[:-len('.json')].partition('==')
+            yield package_name, version or None, entry if version else self._unpack_releases(entry)
+
+    def evict(self):
+        """
+        When the cache is over {max_size} bytes, remove least recently used entries until it fits in {low_water_ratio} of it
+        Stopping below the limit leaves room for the next writes before the directory has to be scanned again
+        """
+        entries = []
+        total_size = 0
+        for dir_entry in os.scandir(self.path):
+            if not dir_entry.name.endswith('.json'):
+                continue
+
+            try:
+                stat = dir_entry.stat()
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+            total_size += stat.st_size
+
+        if total_size > self.max_size:
+            for _, size, entry_path in sorted(entries):
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    # Already evicted by a concurrent job
+                    pass
+
+                total_size -= size
+                if total_size <= self.max_size * self.low_water_ratio:
+                    break
+
+        with self._size_lock:
+            self._size = total_size
+
+
+class MemoryCache:
+    """
+    Thread safe in memory LRU cache of at most {max_entries} entries, expiring after {ttl} seconds (None never expires)
+    Hits and misses are counted for monitoring (See service.py)
+    """
+
+    def __init__(self, max_entries=10000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return (True, value) or (False, None) when {key} isn't cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+            return True, entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def stats(self):
+        with self._lock:
+            nb_lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / nb_lookups if nb_lookups > 0 else None
+            }
@@ -1,16 +1,54 @@
 import os
 import argparse
 
-from .guesser import Guesser
+from .guesser import Guesser, STRATEGIES
+from .batch import run_batch
+from .service import run_service
+from .monorepo import run_monorepo
+from .cache import ReleaseCache
+from .backends import create_backend, INDEX_TYPES
+from .compatibility import Target
+from .snapshot import build_snapshot
+from .state import get_state_filepath, load_state, save_state
+from .instrumentation import tracer
+from .errors import GuesserError
+from .pypi import PypiUnreachableError
 from .utils import validate_cwd_is_git_repo, user_response_yes_no, get_requirements_txt_lines, write_requirements_file
 
 
 __VERSION__ = "0.0.1"
 
-parser = argparse.ArgumentParser("Python Requirements Version Guesser")
+parser = argparse.ArgumentParser("Python Requirements Version Guesser", fromfile_prefix_chars='@')
 parser.add_argument('--write', type=str, default=None, required=False, nargs='?', const='')
 parser.add_argument('--force_guess', type=str, default=None, required=False)
 parser.add_argument('--keep_unused_packages', action='store_true', required=False)
+parser.add_argument('--only', type=str, default=None, required=False, help="Only guess these packages ({package1},{package2},...)")
+parser.add_argument('--pypi_concurrency', type=int, default=8, required=False)
+parser.add_argument('--offline', action='store_true', required=False)
+parser.add_argument('--cache_ttl', type=float, default=24, required=False, help="Hours before revalidating cached Pypi histories")
+parser.add_argument('--cache_max_size', type=float, default=100, required=False, help="Size of the Pypi release cache in MB")
+parser.add_argument('--index_url', type=str, default=None, required=False, help="Base url of the Pypi JSON api or simple index")
+parser.add_argument('--index_type', type=str, default='json', required=False, choices=INDEX_TYPES)
+parser.add_argument('--snapshot', type=str, default=None, required=False, help="Read the release histories from a snapshot file")
+parser.add_argument('--build_snapshot', type=str, default=None, required=False)
+parser.add_argument('--snapshot_packages', type=str, default=None, required=False, nargs='+', help="Packages to add to the snapshot (Or @file listing them)")
+parser.add_argument('--state_file', type=str, default=None, required=False)
+parser.add_argument('--reset_state', action='store_true', required=False)
+parser.add_argument('--pin_dependencies', action='store_true', required=False)
+parser.add_argument('--python_version', type=str, default=None, required=False, help="Only guess versions installable on this python version (X.Y)")
+parser.add_argument('--platform', type=str, default=None, required=False, help="Only guess versions with wheels for this platform tag (manylinux_2_17_x86_64, win_amd64, ...)")
+parser.add_argument('--strategy', type=str, default=None, required=False, choices=STRATEGIES)
+parser.add_argument('--batch', type=str, default=None, required=False, nargs='+', help="Repositories to process (Or @file listing them)")
+parser.add_argument('--batch_workers', type=int, default=None, required=False)
+parser.add_argument('--report_dir', type=str, default='py-reqs-guesser-reports', required=False)
+parser.add_argument('--monorepo', action='store_true', required=False, help="Guess the requirements of each sub-project separately")
+parser.add_argument('--monorepo_workers', type=int, default=None, required=False)
+parser.add_argument('--serve', type=str, default=None, required=False, help="Run as a daemon listening on host:port or unix:{path}")
+parser.add_argument('--serve_workers', type=int, default=4, required=False)
+parser.add_argument('--max_history_indexes', type=int, default=32, required=False, help="Git history indexes kept in memory by the daemon")
+parser.add_argument('--memory_cache_size', type=int, default=20000, required=False, help="Pypi entries kept in memory by the daemon")
+parser.add_argument('--timings', action='store_true', required=False)
+parser.add_argument('--trace_json', '--trace-json', type=str, default=None, required=False)
 
 
 def run():
@@ -21,17 +59,94 @@ def run():
 
     args = parser.parse_args()
 
+    if args.timings or args.trace_json:
+        tracer.start_recording()
+
+    # Releases are only filtered by python version / platform when one of them is given, the other one is the running interpreter's
+    target = None
+    if args.python_version or args.platform:
+        try:
+            target = Target(args.python_version, args.platform)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            exit(1)
+
+    if args.build_snapshot:
+        # Everything in the release cache plus --snapshot_packages
+        release_cache = ReleaseCache(ttl=args.cache_ttl*60*60, max_size=int(args.cache_max_size*1024*1024))
+        backend = create_backend(args.index_url, args.index_type, None, release_cache, args.offline, args.pypi_concurrency)
+        nb_packages = build_snapshot(args.build_snapshot, args.snapshot_packages, backend, release_cache)
+        print(f"Snapshot of {nb_packages} packages written to {args.build_snapshot}")
+        exit(0)
+
+    if args.serve:
+        try:
+            run_service(args.serve, workers=args.serve_workers, max_history_indexes=args.max_history_indexes,
+                        memory_cache_size=args.memory_cache_size, index_url=args.index_url, index_type=args.index_type,
+                        snapshot=args.snapshot, offline=args.offline, pypi_concurrency=args.pypi_concurrency,
+                        cache_ttl=args.cache_ttl*60*60, cache_max_size=int(args.cache_max_size*1024*1024), target=target)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            exit(1)
+        exit(0)
+
+    force_guess = args.force_guess.strip().split(',') if args.force_guess else None
+
+    if args.batch:
+        nb_errors = run_batch(args.batch, args.report_dir, args.strategy or 'first_import', args.batch_workers,
+                              force_guess=force_guess, keep_unused_packages=args.keep_unused_packages,
+                              pypi_concurrency=args.pypi_concurrency, offline=args.offline, cache_ttl=args.cache_ttl*60*60,
+                              cache_max_size=int(args.cache_max_size*1024*1024), reset_state=args.reset_state,
+                              pin_dependencies=args.pin_dependencies, index_url=args.index_url, index_type=args.index_type,
+                              snapshot=args.snapshot, target=target)
+        exit(1 if nb_errors > 0 else 0)
+
     if not validate_cwd_is_git_repo():
         print("[ERROR] py-reqs-guesser must be runned inside a git repository")
         exit(1)
 
+    if args.monorepo:
+        # Sub-projects are guessed concurrently, prompts would be interleaved
+        release_cache = ReleaseCache(ttl=args.cache_ttl*60*60, max_size=int(args.cache_max_size*1024*1024))
+        backend = create_backend(args.index_url, args.index_type, args.snapshot, release_cache, args.offline, args.pypi_concurrency)
+        nb_errors = run_monorepo('.', backend, args.strategy or 'first_import', args.monorepo_workers, write=args.write,
+                                 reset_state=args.reset_state, force_guess=force_guess,
+                                 keep_unused_packages=args.keep_unused_packages, pin_dependencies=args.pin_dependencies,
+                                 target=target, only=args.only.split(',') if args.only else None)
+        exit(1 if nb_errors > 0 else 0)
+
     print("Follow the steps to guess package versions based on when they were added to git.")
 
+    # State of the previous run
+    state_filepath = args.state_file or get_state_filepath()
+    state = None if args.reset_state else load_state(state_filepath)
+
+    if state is not None:
+        print(f"Resuming from the analysis made at commit {state['history']['head']}")
+
     # Initialisation
-    guesser = Guesser(args.force_guess, args.keep_unused_packages)
+    release_cache = ReleaseCache(ttl=args.cache_ttl*60*60, max_size=int(args.cache_max_size*1024*1024))
+    backend = create_backend(args.index_url, args.index_type, args.snapshot, release_cache, args.offline, args.pypi_concurrency)
+
+    try:
+        guesser = Guesser(force_guess=force_guess, keep_unused_packages=args.keep_unused_packages, state=state, strategy=args.strategy,
+                          pypi_backend=backend, target=target, only=args.only.split(',') if args.only else None)
 
-    # Interactive guessing of packages versions
-    packages = guesser.guess_package_versions()
+        # Interactive guessing of packages versions
+        packages = guesser.guess_package_versions()
+
+        if args.pin_dependencies:
+            packages += guesser.pin_dependencies(packages)
+    except PypiUnreachableError as e:
+        print(f"[ERROR] Internet access is required to fetch package history from Pypi (Or use --offline) : {e}")
+        exit(1)
+    except GuesserError as e:
+        print(f"[ERROR] {e}")
+        exit(1)
+
+    # Targeted runs (--only) don't have a full state to save
+    if not args.only:
+        save_state(state_filepath, guesser.get_state())
 
     # Create requirements.txt
     updated_requirements_txt_lines = get_requirements_txt_lines(packages)
@@ -47,8 +162,16 @@ def run():
             # Default location if --write toggle without {path}
             args.write = "requirements.txt"
 
-        write_requirements_file(updated_requirements_txt_lines, args.write)
-        
+        if not write_requirements_file(updated_requirements_txt_lines, args.write):
+            exit(0)
+
+    if args.timings:
+        print("\n" + "="*60 + "\n")
+        tracer.print_summary()
+
+    if args.trace_json:
+        tracer.write_json(args.trace_json)
+        print(f"Trace written to {args.trace_json}")
 
 if __name__ == "__main__":
     run()
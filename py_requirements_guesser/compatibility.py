@@ -0,0 +1,212 @@
+import re
+import sys
+import platform
+import sysconfig
+
+from .versions import SpecifierSet
+
+
+# Compatibility summary of a release : (requires_python or None, has a source distribution, wheel tags 'python-abi-platform')
+# It is all we need to know if a release can be installed on a target, the file lists of Pypi are never kept
+SOURCE_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.zip')
+PYTHON_VERSION_REGEX = re.compile(r'^(\d+)\.(\d+)(?:\.\d+)?$')
+MANYLINUX_REGEX = re.compile(r'^(many|musl)linux_(\d+)_(\d+)_(.+)$')
+MACOSX_REGEX = re.compile(r'^macosx_(\d+)_(\d+)_(.+)$')
+# manylinux1 / 2010 / 2014 are aliases of PEP 600 tags
+LEGACY_MANYLINUX = {'manylinux1': (2, 5), 'manylinux2010': (2, 12), 'manylinux2014': (2, 17)}
+MACOSX_ARCHS = {
+    'x86_64': ['x86_64', 'intel', 'fat64', 'fat3', 'universal', 'universal2'],
+    'arm64': ['arm64', 'universal2'],
+    'i386': ['i386', 'intel', 'fat', 'fat3', 'fat32', 'universal']
+}
+
+
+def get_wheel_tag(filename):
+    """
+    Return the 'python-abi-platform' tag of a wheel or None ('six-1.16.0-py2.py3-none-any.whl' -> 'py2.py3-none-any')
+    """
+    if not filename.endswith('.whl'):
+        return None
+
+    parts = filename[:-len('.whl')].split('-')
+    if len(parts) < 5:
+        return None
+
+    return '-'.join(parts[-3:])
+
+
+def summarize_release_files(files):
+    """
+    Compatibility summary of a release from its files [(filename, requires_python)]
+    """
+    requires_python = None
+    has_sdist = False
+    tags = set()
+    for filename, file_requires_python in files:
+        requires_python = requires_python or file_requires_python or None
+
+        tag = get_wheel_tag(filename)
+        if tag is not None:
+            tags.add(tag)
+        elif filename.endswith(SOURCE_EXTENSIONS):
+            has_sdist = True
+
+    return requires_python, has_sdist, sorted(tags)
+
+
+def get_platform_tag():
+    """
+    Platform tag of the running interpreter ('manylinux_2_35_x86_64', 'macosx_14_0_arm64', 'win_amd64', ...)
+    """
+    if sys.platform.startswith('linux'):
+        machine = platform.machine()
+        libc, libc_version = platform.libc_ver()
+        libc_version = PYTHON_VERSION_REGEX.match(libc_version or '')
+
+        if libc == 'glibc' and libc_version:
+            return f"manylinux_{libc_version.group(1)}_{libc_version.group(2)}_{machine}"
+
+        return f"linux_{machine}"
+    elif sys.platform == 'darwin':
+        mac_version = (platform.mac_ver()[0] or '10.9').split('.')
+        major = int(mac_version[0])
+
+        return f"macosx_{major}_{mac_version[1] if major == 10 else 0}_{platform.machine()}"
+
+    return sysconfig.get_platform().replace('-', '_').replace('.', '_')
+
+
+def get_compatible_platforms(platform_tag):
+    """
+    Platform tags of the wheels installable on {platform_tag} (Older glibc / musl / macOS versions, universal builds)
+    """
+    platforms = {platform_tag, 'any'}
+
+    for alias, (major, minor) in LEGACY_MANYLINUX.items():
+        if platform_tag.startswith(alias + '_'):
+            platform_tag = f"manylinux_{major}_{minor}_{platform_tag[len(alias) + 1:]}"
+
+    matches = MANYLINUX_REGEX.match(platform_tag)
+    if matches:
+        libc, major, minor, arch = matches.group(1), int(matches.group(2)), int(matches.group(3)), matches.group(4)
+        platforms.add(f"linux_{arch}")
+        platforms.update(f"{libc}linux_{major}_{m}_{arch}" for m in range(minor + 1))
+
+        if libc == 'many' and major == 2:
+            platforms.update(f"{alias}_{arch}" for alias, (_, alias_minor) in LEGACY_MANYLINUX.items() if alias_minor <= minor)
+
+        return platforms
+
+    matches = MACOSX_REGEX.match(platform_tag)
+    if matches:
+        major, minor, arch = int(matches.group(1)), int(matches.group(2)), matches.group(3)
+        # Since macOS 11, only the major version matters
+        versions = [(10, m) for m in range(minor + 1 if major == 10 else 16)]
+        versions += [(m, 0) for m in range(11, major + 1)]
+
+        platforms.update(f"macosx_{v_major}_{v_minor}_{a}" for v_major, v_minor in versions for a in MACOSX_ARCHS.get(arch, [arch]))
+
+    return platforms
+
+
+class Target:
+    """
+    Python version and platform the guessed requirements have to be installable on (CPython is assumed)
+    Releases are compatible when their requires_python accepts {python_version} and they ship a wheel for the target
+    (Or a source distribution). Default to the running interpreter
+    """
+
+    def __init__(self, python_version=None, platform_tag=None):
+        self.python_version = python_version or platform.python_version()
+        self.platform_tag = platform_tag or get_platform_tag()
+
+        matches = PYTHON_VERSION_REGEX.match(self.python_version)
+        if not matches:
+            raise ValueError(f"Invalid python version '{self.python_version}', should be X.Y or X.Y.Z")
+
+        major, minor = int(matches.group(1)), int(matches.group(2))
+
+        self.platforms = get_compatible_platforms(self.platform_tag)
+
+        # (python tag, abi tag) pairs installable on the target
+        cpython = f"cp{major}{minor}"
+        self.interpreter_abis = {(cpython, cpython), (cpython, 'abi3'), (cpython, 'none'), (f"py{major}", 'none')}
+        if (major, minor) < (3, 8):
+            self.interpreter_abis.add((cpython, cpython + 'm'))
+        self.interpreter_abis.update((f"cp{major}{m}", 'abi3') for m in range(2, minor))
+        self.interpreter_abis.update((f"py{major}{m}", 'none') for m in range(minor + 1))
+
+        self._requires_python = {}
+
+    def __str__(self):
+        return f"Python {self.python_version} ({self.platform_tag})"
+
+    def supports_requires_python(self, requires_python):
+        if not requires_python:
+            return True
+
+        if requires_python not in self._requires_python:
+            try:
+                self._requires_python[requires_python] = SpecifierSet(requires_python).contains(self.python_version)
+            except ValueError:
+                # Invalid metadata, pip would ignore it
+                self._requires_python[requires_python] = True
+
+        return self._requires_python[requires_python]
+
+    def supports_wheel(self, tag):
+        """
+        True if a wheel tagged 'python-abi-platform' (Possibly compressed tag sets 'py2.py3-none-any') installs on the target
+        """
+        try:
+            interpreters, abis, platforms = tag.split('-')
+        except ValueError:
+            return False
+
+        if not any(p in self.platforms for p in platforms.split('.')):
+            return False
+
+        return any((interpreter, abi) in self.interpreter_abis for interpreter in interpreters.split('.') for abi in abis.split('.'))
+
+    def rank(self, summary):
+        """
+        2 when a release has a wheel for the target, 1 when it can only be built from source, 0 when it can't be installed
+        Releases without summary are assumed to have a wheel
+        """
+        if summary is None:
+            return 2
+
+        requires_python, has_sdist, tags = summary
+
+        if not self.supports_requires_python(requires_python):
+            return 0
+        elif any(self.supports_wheel(tag) for tag in tags):
+            return 2
+
+        return 1 if has_sdist else 0
+
+    def marker_environment(self, environment):
+        """
+        PEP 508 marker variables of the target, {environment} (The running interpreter) fills the ones we can't infer
+        """
+        environment = dict(environment, python_full_version=self.python_version,
+                           python_version='.'.join(self.python_version.split('.')[:2]))
+
+        if 'linux' in self.platform_tag:
+            system, sys_platform, os_name = 'Linux', 'linux', 'posix'
+        elif self.platform_tag.startswith('macosx'):
+            system, sys_platform, os_name = 'Darwin', 'darwin', 'posix'
+        elif self.platform_tag.startswith('win'):
+            system, sys_platform, os_name = 'Windows', 'win32', 'nt'
+        else:
+            return environment
+
+        matches = MANYLINUX_REGEX.match(self.platform_tag) or MACOSX_REGEX.match(self.platform_tag)
+        if matches:
+            machine = matches.groups()[-1]
+        elif self.platform_tag.startswith('linux_'):
+            machine = self.platform_tag[len('linux_'):]
+        else:
+            machine = {'win32': 'x86', 'win_amd64': 'AMD64', 'win_arm64': 'ARM64'}.get(self.platform_tag, environment['platform_machine'])
+
+        return dict(environment, platform_system=system, sys_platform=sys_platform, os_name=os_name, platform_machine=machine)
@@ -0,0 +1,16 @@
+class GuesserError(Exception):
+    """
+    Base class of the errors that stop the analysis of a repository
+    """
+
+
+class NotAGitRepositoryError(GuesserError):
+    pass
+
+
+class NoImportsError(GuesserError):
+    pass
+
+
+class GitHistoryError(GuesserError):
+    pass
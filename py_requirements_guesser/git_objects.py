@@ -0,0 +1,519 @@
+import os
+import re
+import glob
+import mmap
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+
+
+OBJECT_TYPES = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+OFS_DELTA = 6
+REF_DELTA = 7
+TREE_MODE = b'40000'
+PACK_INDEX_MAGIC = b'\377tOc'
+READ_CHUNK_SIZE = 16 * 1024
+TREE_ENTRY_REGEX = re.compile(rb'(\d+) ([^\0]*)\0(.{20})', re.DOTALL)
+SHA256_FORMAT_REGEX = re.compile(r'^\s*objectformat\s*=\s*sha256', re.IGNORECASE | re.MULTILINE)
+SHA_REGEX = re.compile(r'^[0-9a-f]{40}$')
+
+
+class GitObjectError(Exception):
+    """
+    The repository can't be read in process (Missing object, unsupported format, ...)
+    """
+    pass
+
+
+def find_git_dir(path='.'):
+    """
+    Return the git directory of the repository containing {path} or None
+    Handle worktrees and submodules where .git is a file pointing to the git directory
+    """
+    path = os.path.abspath(path)
+
+    while True:
+        dot_git = os.path.join(path, '.git')
+
+        if os.path.isdir(dot_git):
+            return dot_git
+        elif os.path.isfile(dot_git):
+            with open(dot_git, 'r') as f:
+                content = f.read().strip()
+
+            if content.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+
+        path = parent
+
+
+class PackFile:
+    """
+    A pack and its (version 2) index, both memory mapped
+    """
+
+    def __init__(self, idx_filepath):
+        self.path = idx_filepath
+
+        with open(idx_filepath, 'rb') as f:
+            self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with open(idx_filepath[:-4] + '.pack', 'rb') as f:
+            self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.idx[:4] != PACK_INDEX_MAGIC or struct.unpack_from('>I', self.idx, 4)[0] != 2:
+            raise GitObjectError(f"Unsupported pack index '{idx_filepath}'")
+
+        self.fanout = struct.unpack_from('>256I', self.idx, 8)
+        self.count = self.fanout[255]
+        self.shas_start = 8 + 256 * 4
+        self.offsets_start = self.shas_start + self.count * 20 + self.count * 4
+        self.large_offsets_start = self.offsets_start + self.count * 4
+
+    def _sha_at(self, i):
+        start = self.shas_start + i * 20
+        return self.idx[start:start + 20]
+
+    def find_offset(self, sha):
+        """
+        Offset of the object {sha} (20 bytes) in the pack or None
+        """
+        first = self.fanout[sha[0] - 1] if sha[0] > 0 else 0
+        last = self.fanout[sha[0]]
+
+        # Binary search in the sorted object names of the index
+        while first < last:
+            middle = (first + last) // 2
+            if self._sha_at(middle) < sha:
+                first = middle + 1
+            else:
+                last = middle
+
+        if first == self.count or self._sha_at(first) != sha:
+            return None
+
+        i = first
+
+        offset = struct.unpack_from('>I', self.idx, self.offsets_start + i * 4)[0]
+        if offset & 0x80000000:
+            offset = struct.unpack_from('>Q', self.idx, self.large_offsets_start + (offset & 0x7fffffff) * 8)[0]
+
+        return offset
+
+    def decompress(self, offset, size):
+        decompressor = zlib.decompressobj()
+        chunks = []
+        while not decompressor.eof:
+            chunk = self.pack[offset:offset + READ_CHUNK_SIZE]
+            if len(chunk) == 0:
+                raise GitObjectError("Truncated pack")
+
+            chunks.append(decompressor.decompress(chunk))
+            offset += READ_CHUNK_SIZE
+
+        data = b''.join(chunks)
+        if len(data) != size:
+            raise GitObjectError("Corrupted pack object")
+
+        return data
+
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+
+        if not byte & 0x80:
+            return value, pos
+
+
+def apply_delta(base, delta):
+    _, pos = read_varint(delta, 0)
+    result_size, pos = read_varint(delta, pos)
+
+    result = bytearray()
+    delta_size = len(delta)
+    while pos < delta_size:
+        opcode = delta[pos]
+        pos += 1
+
+        if opcode & 0x80:
+            # Copy from base
+            copy_offset = 0
+            for i in range(4):
+                if opcode & (1 << i):
+                    copy_offset |= delta[pos] << (8 * i)
+                    pos += 1
+
+            copy_size = 0
+            for i in range(3):
+                if opcode & (1 << (4 + i)):
+                    copy_size |= delta[pos] << (8 * i)
+                    pos += 1
+
+            result += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif opcode:
+            # Insert literal data
+            result += delta[pos:pos + opcode]
+            pos += opcode
+        else:
+            raise GitObjectError("Invalid delta opcode")
+
+    if len(result) != result_size:
+        raise GitObjectError("Invalid delta result size")
+
+    return bytes(result)
+
+
+class GitRepository:
+    """
+    Read commits, trees and blobs straight from the object database (Loose objects and packs) without spawning git
+    Decompressed objects are kept in a LRU cache bounded to {cache_size} bytes
+    """
+
+    def __init__(self, repo_path='.', cache_size=64*1024*1024):
+        self.git_dir = find_git_dir(repo_path)
+
+        if self.git_dir is None:
+            raise GitObjectError(f"'{repo_path}' is not in a git repository")
+
+        # Worktrees share the objects and refs of the main repository
+        self.common_dir = self.git_dir
+        commondir_filepath = os.path.join(self.git_dir, 'commondir')
+        if os.path.exists(commondir_filepath):
+            with open(commondir_filepath, 'r') as f:
+                self.common_dir = os.path.normpath(os.path.join(self.git_dir, f.read().strip()))
+
+        self._check_format()
+
+        self.object_dirs = [os.path.join(self.common_dir, 'objects')]
+        alternates_filepath = os.path.join(self.object_dirs[0], 'info', 'alternates')
+        if os.path.exists(alternates_filepath):
+            with open(alternates_filepath, 'r') as f:
+                self.object_dirs += [os.path.join(self.object_dirs[0], l.strip()) for l in f if l.strip() and l[0] != '#']
+
+        self.packs = []
+        self._packs_mtime = self._get_packs_mtime()
+        self._load_packs()
+
+        self.shallow_commits = set()
+        shallow_filepath = os.path.join(self.common_dir, 'shallow')
+        if os.path.exists(shallow_filepath):
+            with open(shallow_filepath, 'r') as f:
+                self.shallow_commits = set(l.strip() for l in f if l.strip())
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.RLock()
+
+    def _check_format(self):
+        config_filepath = os.path.join(self.common_dir, 'config')
+        if not os.path.exists(config_filepath):
+            return
+
+        with open(config_filepath, 'r') as f:
+            config = f.read()
+
+        if SHA256_FORMAT_REGEX.search(config):
+            raise GitObjectError("SHA-256 repositories are not supported")
+
+    def _load_packs(self):
+        packs = []
+        for objects_dir in self.object_dirs:
+            for idx_filepath in sorted(glob.glob(os.path.join(objects_dir, 'pack', '*.idx'))):
+                if os.path.exists(idx_filepath[:-4] + '.pack'):
+                    packs.append(PackFile(idx_filepath))
+
+        self.packs = packs
+
+    def _cache_get(self, key):
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                return None
+
+            self._cache.move_to_end(key)
+
+            return cached[0]
+
+    def _cache_put(self, key, value, size):
+        if size > self.cache_size // 4:
+            return
+
+        with self._lock:
+            if key in self._cache:
+                return
+
+            self._cache[key] = (value, size)
+            self._cached_bytes += size
+
+            while self._cached_bytes > self.cache_size:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted_size
+
+    def read_object(self, sha):
+        """
+        Return (type, data) of the object {sha} (hex string)
+        """
+        cached = self._cache_get(sha)
+        if cached is not None:
+            return cached
+
+        binary_sha = bytes.fromhex(sha)
+
+        for pack in self.packs:
+            offset = pack.find_offset(binary_sha)
+            if offset is not None:
+                # Cached by offset
+                return self._read_packed_object(pack, offset)
+
+        for objects_dir in self.object_dirs:
+            loose_filepath = os.path.join(objects_dir, sha[:2], sha[2:])
+            if os.path.exists(loose_filepath):
+                with open(loose_filepath, 'rb') as f:
+                    raw = zlib.decompress(f.read())
+
+                header, _, data = raw.partition(b'\0')
+                obj = (header.split(b' ')[0].decode(), data)
+                self._cache_put(sha, obj, len(data))
+                return obj
+
+        # The object might have been packed since we opened the repository (gc, fetch)
+        if self._reload_packs_if_changed():
+            return self.read_object(sha)
+
+        raise GitObjectError(f"Object {sha} not found")
+
+    def _get_packs_mtime(self):
+        pack_dir = os.path.join(self.object_dirs[0], 'pack')
+        return os.path.getmtime(pack_dir) if os.path.exists(pack_dir) else None
+
+    def _reload_packs_if_changed(self):
+        mtime = self._get_packs_mtime()
+
+        if mtime == self._packs_mtime:
+            return False
+
+        self._packs_mtime = mtime
+        self._load_packs()
+        return True
+
+    def _read_packed_object(self, pack, offset):
+        cache_key = (pack.path, offset)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        data = pack.pack
+        pos = offset
+        byte = data[pos]
+        pos += 1
+        object_type = (byte >> 4) & 0x7
+        size = byte & 0x0f
+        shift = 4
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+
+        if object_type == OFS_DELTA:
+            byte = data[pos]
+            pos += 1
+            base_offset = byte & 0x7f
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                base_offset = ((base_offset + 1) << 7) | (byte & 0x7f)
+
+            base_type, base_data = self._read_packed_object(pack, offset - base_offset)
+            obj = (base_type, apply_delta(base_data, pack.decompress(pos, size)))
+        elif object_type == REF_DELTA:
+            base_sha = data[pos:pos + 20].hex()
+            pos += 20
+
+            base_type, base_data = self.read_object(base_sha)
+            obj = (base_type, apply_delta(base_data, pack.decompress(pos, size)))
+        elif object_type in OBJECT_TYPES:
+            obj = (OBJECT_TYPES[object_type], pack.decompress(pos, size))
+        else:
+            raise GitObjectError(f"Unknown pack object type {object_type}")
+
+        # Delta bases are looked up by offset
+        self._cache_put(cache_key, obj, len(obj[1]))
+
+        return obj
+
+    def read_commit(self, sha):
+        """
+        Return {'tree', 'parents', 'author_time', 'committer_time'} of commit {sha}
+        """
+        object_type, data = self.read_object(sha)
+
+        if object_type == 'tag':
+            # Annotated tag, follow it
+            return self.read_commit(data.split(b'\n', 1)[0].split(b' ')[1].decode())
+        elif object_type != 'commit':
+            raise GitObjectError(f"{sha} is a {object_type}, not a commit")
+
+        commit = {'tree': None, 'parents': [], 'author_time': None, 'committer_time': None}
+        for line in data.split(b'\n'):
+            if len(line) == 0:
+                # End of headers
+                break
+
+            key, _, value = line.partition(b' ')
+            if key == b'tree':
+                commit['tree'] = value.decode()
+            elif key == b'parent':
+                commit['parents'].append(value.decode())
+            elif key == b'author':
+                commit['author_time'] = int(value.rsplit(b' ', 2)[1])
+            elif key == b'committer':
+                commit['committer_time'] = int(value.rsplit(b' ', 2)[1])
+
+        if sha in self.shallow_commits:
+            # History is cut there, git considers these as root commits
+            commit['parents'] = []
+
+        return commit
+
+    def read_tree(self, sha):
+        """
+        Return {name: (mode, sha)} for the entries of tree {sha}
+        Parsed trees are cached as well, consecutive commits share most of their trees
+        """
+        cache_key = ('tree', sha)
+        entries = self._cache_get(cache_key)
+        if entries is not None:
+            return entries
+
+        _, data = self.read_object(sha)
+
+        entries = {name.decode('utf-8', errors='replace'): (mode, binary_sha.hex())
+                   for mode, name, binary_sha in TREE_ENTRY_REGEX.findall(data)}
+        self._cache_put(cache_key, entries, len(data))
+
+        return entries
+
+    def read_blob(self, sha):
+        return self.read_object(sha)[1]
+
+    def resolve_tree_path(self, tree, path):
+        """
+        Return the sha of the subtree at {path} ('a/b') of {tree} or None if there is no such directory
+        """
+        for name in path.split('/'):
+            if tree is None:
+                return None
+
+            mode, sha = self.read_tree(tree).get(name, (None, None))
+            tree = sha if mode == TREE_MODE else None
+
+        return tree
+
+    def _read_ref_file(self, ref):
+        for directory in (self.git_dir, self.common_dir):
+            ref_filepath = os.path.join(directory, ref)
+            if os.path.isfile(ref_filepath):
+                with open(ref_filepath, 'r') as f:
+                    return f.read().strip()
+
+        return None
+
+    def read_packed_refs(self):
+        refs = {}
+        packed_refs_filepath = os.path.join(self.common_dir, 'packed-refs')
+        if os.path.exists(packed_refs_filepath):
+            with open(packed_refs_filepath, 'r') as f:
+                for line in f:
+                    if line[0] in '#^':
+                        continue
+
+                    sha, ref = line.strip().split(' ', 1)
+                    refs[ref] = sha
+
+        return refs
+
+    def resolve_ref(self, ref='HEAD'):
+        """
+        Return the commit sha pointed by {ref} (Following symbolic refs) or None if it can't be read from the ref files
+        (Unborn branch, reftable, ...), see history.get_head_commit() to resolve it with git in that case
+        """
+        for _ in range(10):
+            value = self._read_ref_file(ref)
+
+            if value is None:
+                value = self.read_packed_refs().get(ref)
+                if value is None:
+                    return None
+
+            if not value.startswith('ref:'):
+                return value if SHA_REGEX.match(value) else None
+
+            ref = value[4:].strip()
+
+        raise GitObjectError(f"Too many levels of symbolic refs for '{ref}'")
+
+    def iter_commits(self, heads, exclude=()):
+        """
+        Yield (sha, commit) for the commits reachable from {heads} but not from {exclude}
+        """
+        excluded = self.reachable_commits(exclude) if exclude else set()
+
+        seen = set(excluded)
+        stack = [h for h in heads if h not in seen]
+        seen.update(stack)
+
+        while stack:
+            sha = stack.pop()
+            commit = self.read_commit(sha)
+
+            yield sha, commit
+
+            for parent in commit['parents']:
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+
+    def reachable_commits(self, heads):
+        return set(sha for sha, _ in self.iter_commits(heads))
+
+    def iter_changed_files(self, old_tree, new_tree, prefix=''):
+        """
+        Yield (path, old blob sha or None, new blob sha or None) for the files that differ between two trees
+        Identical subtrees are skipped without being read
+        """
+        old_entries = self.read_tree(old_tree) if old_tree else {}
+        new_entries = self.read_tree(new_tree) if new_tree else {}
+
+        for name in old_entries.keys() | new_entries.keys():
+            old_mode, old_sha = old_entries.get(name, (None, None))
+            new_mode, new_sha = new_entries.get(name, (None, None))
+
+            if old_sha == new_sha:
+                continue
+
+            path = prefix + name
+            old_is_tree = old_mode == TREE_MODE
+            new_is_tree = new_mode == TREE_MODE
+
+            if old_is_tree or new_is_tree:
+                yield from self.iter_changed_files(old_sha if old_is_tree else None, new_sha if new_is_tree else None, path + '/')
+
+            # Submodules (mode 160000) point to commits of another repository
+            old_blob = old_sha if old_mode is not None and not old_is_tree and old_mode != b'160000' else None
+            new_blob = new_sha if new_mode is not None and not new_is_tree and new_mode != b'160000' else None
+
+            if old_blob != new_blob:
+                yield path, old_blob, new_blob
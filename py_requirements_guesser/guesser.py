@@ -1,141 +1,546 @@
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from .history import GitHistoryIndex, HISTORY_PATHSPECS, get_include_pathspecs
+from .instrumentation import tracer, bind_tracer
+from .resolver import DependencyResolver
+from .backends import JsonApiBackend
+from .results import Candidate, PackageResult
+from .imports import find_imported_modules
+from .cache import normalize_package_name
+from .manifests import read_project_requirements, get_pinned_version, get_manifest_kind
+from .versions import SpecifierSet
+from .utils import get_pypi_history, get_all_imports
+from .utils import get_mapping_files_from_pipreqs, get_local_modules, user_response_multi_choices
+
+STRATEGIES = ['first_import', 'first_requirement', 'earliest', 'latest']
+# Candidate source of the choices saved in the state file
+CHOICE_SOURCES = {1: 'first_import', 2: 'first_requirement'}
+
+
+def format_date(candidate):
+    return candidate.date.strftime("%Y-%m-%d") if candidate is not None else None
+
+
+def format_candidate(candidate):
+    return f"Version {candidate.version if candidate is not None else None} / {format_date(candidate)}"
 
-from .utils import get_pypi_history, get_all_imports, get_date_when_package_committed, find_version_at_date
-from .utils import get_mapping_files_from_pipreqs, get_local_modules, get_packages_from_requirements, user_response_multi_choices
 
 class Guesser:
 
-    def __init__(self, force_guess=None, keep_unused_packages=False):
+    def __init__(self, force_guess=None, keep_unused_packages=False, pypi_client=None, release_cache=None, offline=False, state=None,
+                 repo_path='.', strategy=None, pypi_backend=None, log=print, target=None, only=None, subproject=None):
+        """
+        force_guess: Local modules whose version is guessed anyways (List of names, see get_local_modules())
+        strategy: Used instead of prompting the user when the first import and requirements.txt dates disagree
+                  One of STRATEGIES, a callable(package_name, candidates) returning one of the candidates or None (Interactive)
+        pypi_backend: Source of the release histories (See backends.py), default to the Pypi JSON api
+        log: Called with each progress message, None to stay silent
+        target: Only guess versions installable on this python version / platform (compatibility.Target), None to consider all releases
+        only: Targeted run, only guess these packages (Package or import names). The tree is only scanned until they are
+              found, the git history is only searched for them and nothing else is fetched from Pypi
+        subproject: Only analyse this sub-project of a monorepo (monorepo.Subproject) : its directory without the nested sub-projects,
+                    in the working tree and in the git history
+        """
+        if strategy is not None and not callable(strategy) and strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', should be one of {STRATEGIES}")
+
         self.keep_unused_packages = keep_unused_packages
+        self.strategy = strategy
+        self.target = target
+        self.log = log if log is not None else lambda message: None
+        self.pypi_backend = pypi_backend if pypi_backend is not None else JsonApiBackend(pypi_client, release_cache, offline)
+
+        # Directory of the analysed project, the nested sub-projects of a monorepo are left out
+        project_root = os.path.join(repo_path, subproject.path) if subproject is not None and subproject.path else repo_path
+        exclude = subproject.exclude if subproject is not None else ()
+        self.pathspecs = subproject.pathspecs if subproject is not None else HISTORY_PATHSPECS
 
         # Retrive mapping files from https://github.com/bndr/pipreqs
         # The mapping keys are all lowercase (case insensitive match)
-        self.stdlib_list, self.import_to_package_mapping, self.package_to_import_mapping = get_mapping_files_from_pipreqs()
+        with tracer.phase('mapping', shared=True):
+            self.stdlib_list, self.import_to_package_mapping, self.package_to_import_mapping = get_mapping_files_from_pipreqs()
 
         # Get local packages
         if force_guess:
-            force_guess = set(force_guess.strip().split(","))
+            force_guess = set(force_guess)
+
+        # Requested packages of a targeted run, {normalized_name: (package_name, import_name)}
+        self.only = None
+        if only is not None:
+            self.only = {}
+            for name in only:
+                if name in self.package_to_import_mapping:
+                    package_name, import_name = name, self.package_to_import_mapping.get(name)
+                else:
+                    package_name, import_name = self.import_to_package_mapping.get(name, name), name
+
+                self.only[normalize_package_name(package_name)] = (package_name, import_name)
 
-        local_packages = get_local_modules(print_modules=True, force_guess=force_guess)
+        with tracer.phase('local_modules', shared=True):
+            local_packages = get_local_modules(force_guess=force_guess, root=project_root,
+                                               modules=[i for _, i in self.only.values()] if self.only is not None else None,
+                                               exclude=exclude)
+
+        self.log("\nWe detected the following local project modules :")
+        for module in local_packages:
+            self.log("    " + module)
+        self.log("We won't attempt to guess version for these packages (local files)")
+        self.log("In case of conflict, this can be overriden using --force_guess {package1},{package2},...")
 
         # Remove local_packages from the list of imports
         self.stdlib_list.update(local_packages)
 
         # Retrieve all imported packages in project
-        all_imported_packages = set(get_all_imports(self.stdlib_list))
+        with tracer.phase('imports', shared=True):
+            if self.only is None:
+                all_imported_packages = set(get_all_imports(self.stdlib_list, root=project_root, exclude=exclude))
+            else:
+                requested_imports = [i for _, i in self.only.values() if i not in self.stdlib_list]
+                found = find_imported_modules(requested_imports, root=project_root, exclude=exclude)
+                all_imported_packages = set(i for i in requested_imports if i.lower() in found)
+
+        # Retrieve the packages declared by the dependency manifests (Requirements files and their includes, setup.py, setup.cfg,
+        # pyproject.toml, Pipfile) and the versions pinned by the lockfiles and constraints files
+        with tracer.phase('manifests', shared=True):
+            declared_packages, locked_versions, manifests, skipped_manifests = read_project_requirements(project_root)
+
+        # Requirements files included by another one (-r / -c) can have any name, their history is indexed too
+        prefix = f"{subproject.path}/" if subproject is not None and subproject.path else ''
+        included = [prefix + path for path in manifests if get_manifest_kind(path) in (None, 'requirements')]
+        self.pathspecs = self.pathspecs + get_include_pathspecs(included, self.pathspecs)
+
+        if self.only is not None:
+            declared_packages = {p: declared for p, declared in declared_packages.items() if p in self.only}
+
+        if len(manifests) > 0:
+            self.log("\nReading the requirements declared in :")
+            for manifest in manifests:
+                self.log("    " + manifest)
 
-        # Retrieve packages in requirements.txt
-        packages_in_requirements = get_packages_from_requirements('requirements.txt')
+        for manifest in skipped_manifests:
+            self.log(f"[WARNING] Skipping {manifest} : reading TOML files requires Python 3.11+ or tomli (pip install tomli)")
+
+        # Guessed versions and choices of this run (Saved in the state file)
+        self.decisions = {}
+        # Packages we couldn't attribute a version to, with the reason
+        self.skipped = {}
+        # PackageResult of every package handled so far
+        self.results = {}
+        # Pypi history (ReleaseIndex) of the packages whose version was guessed from it, for the reports (See batch.py)
+        self.release_indexes = {}
 
         # Do mapping between import name and package name
+        # Packages are keyed by their normalized name (PEP 503, see normalize_package_name()) : 'ruamel.yaml' declared in a
+        # requirements file, 'Ruamel_Yaml' in a constraints file and 'ruamel-yaml' in a lockfile are the same package
+        # Declared version ranges restrict the guessed versions ('specifier'), 'pinned_by' is the manifest pinning the version
+        # ('locked' when it is a lockfile or a constraints file)
         self.all_packages = {}
-        for package_name, version in packages_in_requirements.items():
-            package_name_lowercase = package_name.lower()
-            import_name = self.package_to_import_mapping.get(package_name_lowercase, package_name)
+        for normalized_name, declared in declared_packages.items():
+            package_name = declared['package_name']
+            import_name = self.package_to_import_mapping.get(package_name.lower(), package_name)
+            version = get_pinned_version(declared['specifier'])
 
-            self.all_packages[package_name.lower()] = {
+            self.all_packages[normalized_name] = {
                 'import_name': import_name,
                 'package_name': package_name,
                 'version': version,
-                'in_requirements': True
+                'in_requirements': True,
+                'specifier': str(declared['specifier']) if version is None else '',
+                'pinned_by': declared['manifest'] if version is not None else None,
+                'locked': False
             }
 
 
         for import_name in all_imported_packages:
             package_name = self.import_to_package_mapping.get(import_name, import_name)
-            package_name_lowercase = package_name.lower()
+            normalized_name = normalize_package_name(package_name)
 
-            if package_name_lowercase not in self.all_packages:
-                self.all_packages[package_name_lowercase] = {
+            if normalized_name not in self.all_packages:
+                self.all_packages[normalized_name] = {
                     'import_name': import_name,
                     'package_name': package_name,
                     'version': None,
-                    'in_requirements': False
+                    'in_requirements': False,
+                    'specifier': '',
+                    'pinned_by': None,
+                    'locked': False
                 }
 
+        # Lockfiles record the versions that were installed, they win over the guesses
+        for normalized_name, package_info in self.all_packages.items():
+            locked = locked_versions.get(normalized_name)
+            if package_info['version'] is None and locked is not None:
+                package_info['version'], package_info['pinned_by'] = locked
+                package_info['locked'] = True
 
-    def guess_package_versions(self):
-        packages = []
-        for package_name_lowercase, package_info in self.all_packages.items():
-            package_name = package_info['package_name']
-            version = package_info['version']
-            import_name = package_info['import_name']
-            package_in_requirements = package_info['in_requirements']
-
-            print("\n" + "-"*40)
-            print(f"PACKAGE : {package_name}")
-            if version is None:
-                # Reset variables
-                choice = None
-                date_added_via_import_str = None
-                date_added_via_req_str = None
-                date = None
-                import_version = None
-                req_version = None
-
-                # Get available versions from Pypi
-                available_versions = get_pypi_history(package_name, ignore_release_candidat=True)
-
-                if available_versions is None:
-                    print(f"[INFO] Couldn't find Pypi releases for package '{package_name}', ignoring")
-                    continue
-
-                # Retrieve candidate version based on the first time the package was imported in *.py
-                date_added_via_import = get_date_when_package_committed(import_name, via_requirements=False)
-                if date_added_via_import is not None:
-                    date_added_via_import_str = date_added_via_import.strftime("%Y-%m-%d")
-                    import_version = find_version_at_date(available_versions, date_added_via_import)
+        if self.target is not None:
+            self.log(f"\nOnly considering the releases that can be installed on {self.target}")
+
+        # Pypi histories are fetched by background workers while the git history is indexed and the user answers the prompts
+        # (See guess_package_versions()). Decisions of a previous run can only be reused once the history is up to date,
+        # the packages affected by the new commits are fetched then
+        use_state = state is not None and state['history']['pathspecs'] == self.pathspecs
+        reuse_decisions = use_state and self.only is None
+        self._prepared = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.pypi_backend.max_workers))
+
+        if not reuse_decisions:
+            self._start_preparing(self.all_packages)
+
+        # Index the first import/requirement commit date of every package in a single git history pass
+        # When we have the state of a previous run, only the commits since then are indexed
+        try:
+            with tracer.phase('git_history', shared=True):
+                if use_state:
+                    self.history = GitHistoryIndex.from_dict(state['history'], repo_path).update()
+                elif self.only is not None:
+                    # Pinned versions don't need any date
+                    pinned = set(p for p, package_info in self.all_packages.items() if package_info['version'] is not None)
+                    modules = [i for i in all_imported_packages if normalize_package_name(self.import_to_package_mapping.get(i, i)) not in pinned]
+                    packages = [p for p in declared_packages if p not in pinned]
+                    self.history = GitHistoryIndex(self.pathspecs, repo_path, modules=modules, packages=packages).build()
                 else:
-                    print(f"    [INFO] Package '{package_name}' is defined in requirements.txt but not used (Or committed), ")
-                    if self.keep_unused_packages:
-                        print("           will attempts guessing version anyways since --keep_unused_packages is set set")
-                        choice = 2
+                    self.history = GitHistoryIndex(self.pathspecs, repo_path).build()
+        except BaseException:
+            self.close()
+            raise
+
+        if reuse_decisions:
+            # Reuse the decisions of the previous run for packages not affected by the new commits
+            for normalized_name, package_info in self.all_packages.items():
+                previous = state['packages'].get(normalized_name)
+
+                if package_info['version'] is None and previous is not None and previous['version'] is not None and \
+                        previous['in_requirements'] == package_info['in_requirements'] and \
+                        previous.get('specifier', '') == package_info['specifier'] and \
+                        previous['import_date'] == self.history.import_dates.get(package_info['import_name'].lower()) and \
+                        previous['requirement_date'] == self.history.requirement_dates.get(normalized_name):
+                    package_info['previous'] = previous
+
+            self._start_preparing(self.all_packages)
+
+        if self.only is not None:
+            for normalized_name, (package_name, import_name) in self.only.items():
+                if normalized_name not in self.all_packages:
+                    self.log(f"[INFO] Package '{package_name}' is not imported by the project nor declared as a requirement, ignoring")
+                    self.skipped[package_name] = 'not_found'
+                    self.results[normalized_name] = PackageResult(package_name, import_name, None, 'not_found')
+
+    def _start_preparing(self, packages):
+        """
+        Submit the packages that need their Pypi history to the background workers (See _prepare_package())
+        """
+        for normalized_name, package_info in packages.items():
+            if package_info['version'] is None and 'previous' not in package_info:
+                self._prepared[normalized_name] = self._executor.submit(bind_tracer(self._prepare_package), package_info)
+
+        # Queued packages are still prepared, the threads exit once done
+        self._executor.shutdown(wait=False)
+
+    def _prepare_package(self, package_info):
+        """
+        Run by a background worker : fetch the Pypi history of a package, return its available versions
+        """
+        with tracer.phase('pypi_package', package=package_info['package_name']):
+            return self.get_available_versions(package_info)
+
+    def _get_prepared(self, normalized_name):
+        """
+        (available versions, first import candidate, requirements.txt candidate) of a package prepared by a background worker
+        The candidates are computed here, the git history is indexed by the time the packages are handled
+        """
+        available_versions = self._prepared[normalized_name].result()
+
+        return (available_versions,) + self.get_candidates(self.all_packages[normalized_name], available_versions)
+
+    def get_available_versions(self, package_info):
+        """
+        Pypi history of a package, restricted to the versions its declared specifier allows
+        """
+        available_versions = get_pypi_history(package_info['package_name'], True, backend=self.pypi_backend, target=self.target)
+
+        if available_versions is not None and package_info['specifier']:
+            available_versions = available_versions.filter(SpecifierSet(package_info['specifier']).contains)
+
+        return available_versions
+
+    def get_candidates(self, package_info, available_versions):
+        """
+        Versions available at the first import and at the first requirements.txt commit of a package (None when the date is unknown)
+        """
+        if available_versions is None:
+            return None, None
+
+        import_candidate = None
+        requirement_candidate = None
+
+        date_added_via_import = self.history.first_import_date(package_info['import_name'])
+        if date_added_via_import is not None:
+            import_candidate = Candidate('first_import', date_added_via_import, available_versions.version_at(date_added_via_import))
+
+        if package_info['in_requirements']:
+            date_added_via_req = self.history.first_requirement_date(package_info['package_name'])
+            if date_added_via_req is not None:
+                requirement_candidate = Candidate('first_requirement', date_added_via_req, available_versions.version_at(date_added_via_req))
+
+        return import_candidate, requirement_candidate
+
+    def needs_decision(self, prepared):
+        """
+        True when the user has to choose between the candidates of a prepared package
+        """
+        _, import_candidate, requirement_candidate = prepared
+
+        return self.strategy is None and import_candidate is not None and requirement_candidate is not None and \
+            import_candidate.version != requirement_candidate.version
+
+    def close(self):
+        """
+        Cancel the preparation of the packages that weren't handled (After an error)
+        """
+        for future in self._prepared.values():
+            future.cancel()
+
+    def guess_package_versions(self):
+        """
+        Attribute a version to every package, return their (package_name, version)
+        Packages are handled as soon as they are ready (Completion order of their Pypi history) : those that need no decision
+        are resolved right away and the user is only prompted when nothing else is ready, while the remaining histories keep
+        being fetched in the background. Results are returned (And kept in self.results) in a deterministic order
+        """
+        ready = queue.Queue()
+        for normalized_name, future in self._prepared.items():
+            future.add_done_callback(lambda _, key=normalized_name: ready.put(key))
+
+        versions = {}
+        prepared = {}
+        try:
+            # Packages that don't need Pypi (Pinned versions, previous run)
+            for normalized_name, package_info in self.all_packages.items():
+                if normalized_name not in self._prepared:
+                    versions[normalized_name] = self._guess(normalized_name)
+
+            nb_pending = len(self._prepared)
+            waiting_decision = []
+            while nb_pending > 0 or len(waiting_decision) > 0:
+                if len(waiting_decision) == 0 or not ready.empty():
+                    if len(waiting_decision) == 0:
+                        # Nothing to show until the next history arrives
+                        with tracer.phase('pypi', shared=True):
+                            normalized_name = ready.get()
                     else:
-                        print(f"[INFO] Ignoring package '{package_name}' (Use --keep_unused_packages if you want to keep it)")
+                        normalized_name = ready.get_nowait()
+
+                    nb_pending -= 1
+
+                    prepared[normalized_name] = self._get_prepared(normalized_name)
+                    if self.needs_decision(prepared[normalized_name]):
+                        waiting_decision.append(normalized_name)
                         continue
-                    
-
-                # Retrieve candidate version based on the first time the package was added to requirements.txt
-                if package_in_requirements:
-                    date_added_via_req = get_date_when_package_committed(package_name, via_requirements=True)
-                    if date_added_via_req is not None:
-                        req_version = find_version_at_date(available_versions, date_added_via_req)
-                        date_added_via_req_str = date_added_via_req.strftime("%Y-%m-%d")
-                    else:
-                        print(f"    [INFO] Package '{package_name}' was not in requirements.txt, using date of first import (Version {import_version} / {date_added_via_import_str})")
-                        choice = 1
                 else:
-                    print(f"    [INFO] Package '{package_name}' was not found in requirements.txt, using date of first import (Version {import_version} / {date_added_via_import_str})")
-                    choice = 1
+                    normalized_name = waiting_decision.pop(0)
 
+                versions[normalized_name] = self._guess(normalized_name, prepared.pop(normalized_name))
+        finally:
+            self.close()
 
-                # Ask user to choose version based on either first import date or first added to requirements.txt date
-                if choice is None:
-                    if req_version != import_version:
-                        choice = user_response_multi_choices(f"Choose guessing strategy for package '{package_name}'", [
-                            f'{"First time the package was imported".ljust(50)} (Version {import_version} / {date_added_via_import_str})', 
-                            f'{"When the package was added to requirements.txt".ljust(50)} (Version {req_version} / {date_added_via_req_str})'
-                        ])
-                    else:
-                        # Both requirements.txt and first import resolve to the same version
-                        choice = 1
+        order = {normalized_name: i for i, normalized_name in enumerate(self.all_packages)}
+        self.results = dict(sorted(self.results.items(), key=lambda item: order.get(item[0], -1)))
 
-                if choice == 2:
-                    version = req_version
-                    date = date_added_via_req_str
-                else:
-                    version = import_version
-                    date = date_added_via_import_str
+        return [(package_info['package_name'], versions[normalized_name])
+                for normalized_name, package_info in self.all_packages.items() if versions.get(normalized_name) is not None]
 
-                if version is not None:
-                    print(f"[INFO] Package '{package_name}' was first committed on {date} and was attributed version {version}")
-                else:
-                    print(f"[ERROR] Couldn't attribute version to package '{package_name}'. Are you sure you commited the changes ?")
-                    continue
+    def _guess(self, normalized_name, prepared=None):
+        with tracer.phase('guess', package=self.all_packages[normalized_name]['package_name']):
+            return self.guess_package_version(normalized_name, self.all_packages[normalized_name], prepared)
+
+    def guess_package_version(self, normalized_name, package_info, prepared=None):
+        """
+        Attribute a version to a single package (Prompting the user if needed), return None if we couldn't
+        prepared: (available versions, first import candidate, requirements.txt candidate) from a background worker (See
+                  _get_prepared()), fetched now when missing
+        The outcome is recorded in self.results
+        """
+        package_name = package_info['package_name']
+        version = package_info['version']
+        import_name = package_info['import_name']
+        package_in_requirements = package_info['in_requirements']
+
+        def record(version, reason, source=None, date=None, candidates=()):
+            self.results[normalized_name] = PackageResult(package_name, import_name, version, reason, source, date,
+                                                                 package_in_requirements, tuple(candidates))
+            if version is None:
+                self.skipped[package_name] = reason
+
+            return version
+
+        self.log("\n" + "-"*40)
+        self.log(f"PACKAGE : {package_name}")
+        if version is None and 'previous' in package_info:
+            previous = package_info['previous']
+            version = previous['version']
+            self.decisions[normalized_name] = previous
+            self.log(f"[INFO] Package '{package_name}' is unchanged since the last run (Commit {previous['commit'][:8]}), "
+                     f"reusing version {version} ({previous['date']})")
+
+            return record(version, 'previous_run', CHOICE_SOURCES.get(previous['choice']), previous['date'])
+
+        elif version is not None:
+            if package_info['locked']:
+                self.log(f"[INFO] Package '{package_name}' version is locked in {package_info['pinned_by']} (Version {version})")
+                return record(version, 'lockfile')
+
+            self.log(f"[INFO] Package '{package_name}' version is specified in {package_info['pinned_by']} (Version {version})")
+
+            return record(version, 'requirements.txt')
+
+        # Get available versions from Pypi
+        if prepared is None:
+            available_versions = self.get_available_versions(package_info)
+            prepared = (available_versions,) + self.get_candidates(package_info, available_versions)
+
+        available_versions, import_candidate, requirement_candidate = prepared
+        self.release_indexes[normalized_name] = available_versions
+
+        if available_versions is None:
+            if getattr(self.pypi_backend, 'offline', False):
+                self.log(f"[INFO] Package '{package_name}' is not in the release cache (--offline), ignoring")
+                return record(None, 'not_in_cache')
+
+            self.log(f"[INFO] Couldn't find Pypi releases for package '{package_name}', ignoring")
+            return record(None, 'not_on_pypi')
 
+        if len(available_versions) == 0 and self.target is not None:
+            self.log(f"[INFO] No release of package '{package_name}' can be installed on {self.target}, ignoring")
+            return record(None, 'incompatible')
+
+        choice = None
+        reason = 'single_candidate'
+
+        # Candidate version based on the first time the package was imported in *.py
+        if import_candidate is None:
+            self.log(f"    [INFO] Package '{package_name}' is declared as a requirement but not used (Or committed), ")
+            if self.keep_unused_packages:
+                self.log("           will attempts guessing version anyways since --keep_unused_packages is set set")
+                choice = 2
+            else:
+                self.log(f"[INFO] Ignoring package '{package_name}' (Use --keep_unused_packages if you want to keep it)")
+                return record(None, 'unused')
+
+        # Candidate version based on the first time the package was added to the requirements
+        if package_in_requirements:
+            if requirement_candidate is None:
+                self.log(f"    [INFO] Package '{package_name}' was not in the committed requirements, using date of first import "
+                         f"({format_candidate(import_candidate)})")
+                choice = 1
+        else:
+            self.log(f"    [INFO] Package '{package_name}' is not declared as a requirement, using date of first import "
+                     f"({format_candidate(import_candidate)})")
+            choice = 1
+
+        candidates = [c for c in [import_candidate, requirement_candidate] if c is not None]
+
+        # Ask user to choose version based on either first import date or first added to requirements.txt date
+        if choice is None:
+            if requirement_candidate.version != import_candidate.version and self.strategy is not None:
+                choice = self.choose_from_strategy(package_name, import_candidate, requirement_candidate)
+                reason = 'policy'
+                self.log(f"[INFO] Using '{getattr(self.strategy, '__name__', self.strategy)}' strategy for package '{package_name}'")
+            elif requirement_candidate.version != import_candidate.version:
+                choice = user_response_multi_choices(f"Choose guessing strategy for package '{package_name}'", [
+                    f'{"First time the package was imported".ljust(50)} ({format_candidate(import_candidate)})',
+                    f'{"When the package was added to the requirements".ljust(50)} ({format_candidate(requirement_candidate)})'
+                ])
+                reason = 'user_choice'
             else:
-                print(f"[INFO] Package '{package_name}' version is specified in requirements.txt (Version {version})")
+                # Both requirements.txt and first import resolve to the same version
+                choice = 1
+                reason = 'same_version'
+
+        candidate = requirement_candidate if choice == 2 else import_candidate
+        version = candidate.version if candidate is not None else None
+        date = format_date(candidate)
+
+        if version is None:
+            self.log(f"[ERROR] Couldn't attribute version to package '{package_name}'. Are you sure you commited the changes ?")
+            return record(None, 'no_version', candidates=candidates)
+
+        self.log(f"[INFO] Package '{package_name}' was first committed on {date} and was attributed version {version}")
+        self.decisions[normalized_name] = {
+            'import_date': self.history.import_dates.get(import_name.lower()),
+            'requirement_date': self.history.requirement_dates.get(normalized_name),
+            'in_requirements': package_in_requirements,
+            'specifier': package_info['specifier'],
+            'version': version,
+            'choice': choice,
+            'date': date,
+            'commit': self.history.head
+        }
+
+        return record(version, reason, candidate.source, date, candidates)
+
+    def pin_dependencies(self, packages):
+        """
+        Pin the transitive dependencies of the guessed {packages} at the date their versions were chosen
+        Return the (package_name, version) of the dependencies
+        """
+        roots = {}
+        for package_name, version in packages:
+            decision = self.decisions.get(normalize_package_name(package_name))
+            roots[package_name] = (version, decision['date'] if decision else None)
+
+        resolver = DependencyResolver(self.pypi_backend, target=self.target)
+
+        with tracer.phase('dependencies', shared=True):
+            dependencies = resolver.resolve(roots)
+
+        self.log("\n" + "-"*40)
+        self.log(f"[INFO] Pinned {len(dependencies)} dependencies of the guessed packages")
+
+        if not resolver.converged:
+            self.log(f"[WARNING] Dependency resolution didn't converge after {resolver.max_rounds} rounds")
+
+        for package_name, reason in resolver.unresolved.items():
+            self.log(f"[WARNING] Couldn't pin dependency '{package_name}' ({reason})")
+            self.skipped[package_name] = reason
+
+        for package_name, conflicts in resolver.conflicts.items():
+            self.log(f"[WARNING] Package '{package_name}' doesn't satisfy : {', '.join(conflicts)}")
+
+        return dependencies
+
+    def choose_from_strategy(self, package_name, import_candidate, requirement_candidate):
+        """
+        Non interactive choice between the first import (1) and the requirements.txt (2) candidates
+        """
+        if callable(self.strategy):
+            chosen = self.strategy(package_name, (import_candidate, requirement_candidate))
+            if chosen not in (import_candidate, requirement_candidate):
+                raise ValueError(f"The decision policy returned {chosen!r} for package '{package_name}' instead of one of the candidates")
+
+            return 1 if chosen.source == 'first_import' else 2
+        elif self.strategy == 'first_import':
+            return 1
+        elif self.strategy == 'first_requirement':
+            return 2
+        elif self.strategy == 'earliest':
+            return 1 if import_candidate.date <= requirement_candidate.date else 2
+        elif self.strategy == 'latest':
+            return 1 if import_candidate.date >= requirement_candidate.date else 2
+
+        raise ValueError(f"Unknown strategy '{self.strategy}', should be one of {STRATEGIES}")
 
-            packages.append((package_name, version))
+    def get_state(self):
+        """
+        State to save so that the next run only process new commits and affected packages
+        None for targeted runs (only), their history index and decisions are partial
+        """
+        if self.only is not None:
+            return None
 
-        return packages
+        return {
+            'history': self.history.to_dict(),
+            'packages': self.decisions
+        }
@@ -0,0 +1,505 @@
+import os
+import re
+import subprocess
+from fnmatch import fnmatchcase
+from datetime import datetime
+
+from .instrumentation import tracer
+from .git_objects import GitRepository, GitObjectError
+from .errors import GitHistoryError
+from .cache import normalize_package_name
+from .notebooks import get_notebook_code_lines
+from .manifests import get_manifest_kind, get_declared_packages, parse_requirement_line, MANIFEST_PATHSPECS
+
+
+# Every commit header is prefixed with a NUL byte (%x00) so it can't be mistaken for a diff line
+COMMIT_HEADER_PREFIX = "\x00"
+IMPORT_LINE_REGEX = re.compile(r'^\s*(?:from\s+(\w+)|import\s+(\w[\w\s.,]*))')
+
+HISTORY_PATHSPECS = ['*.py', '*.ipynb'] + MANIFEST_PATHSPECS
+EXCLUDE_PATHSPEC_PREFIXES = (':(exclude)', ':!', ':^')
+# Requirements files included by another one (-r / -c) can have any name, they are added by path (See get_include_pathspecs())
+INCLUDE_PATHSPEC_PREFIX = ':(literal)'
+PATHSPEC_WILDCARDS_REGEX = re.compile(r'[*?\[]')
+HISTORY_BACKENDS = ['subprocess', 'objects']
+
+
+def open_repository(repo_path='.'):
+    """
+    Return a GitRepository reading the object database in process or None if it can't be read (git is used instead)
+    """
+    try:
+        return GitRepository(repo_path)
+    except (GitObjectError, OSError, ValueError):
+        return None
+
+
+def get_head_commit(repo_path='.'):
+    """
+    Return the sha of the commit checked out or None (Empty repository)
+    HEAD is read from the ref files when possible, git resolves the refs we can't read (Reftable, broken refs, ...)
+    Raise GitHistoryError when HEAD can't be resolved, an unreadable repository is never taken for an empty one
+    """
+    repository = open_repository(repo_path)
+    if repository is not None:
+        try:
+            head = repository.resolve_ref('HEAD')
+        except GitObjectError:
+            head = None
+
+        if head is not None:
+            return head
+
+    tracer.record_subprocess('git rev-parse HEAD')
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--verify', '-q', 'HEAD'], cwd=repo_path,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except subprocess.CalledProcessError:
+        pass
+
+    # Nothing committed yet : HEAD points to a branch that doesn't exist (Unborn branch)
+    tracer.record_subprocess('git symbolic-ref HEAD')
+    if subprocess.call(['git', 'symbolic-ref', '-q', 'HEAD'], cwd=repo_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0:
+        return None
+
+    raise GitHistoryError(f"Couldn't resolve HEAD of the git repository '{repo_path}'")
+
+
+def is_ancestor_commit(commit, descendant='HEAD', repo_path='.'):
+    # git uses the commit-graph file and the generation numbers, no need to walk the whole history
+    tracer.record_subprocess('git merge-base --is-ancestor')
+    return subprocess.call(['git', 'merge-base', '--is-ancestor', commit, descendant], cwd=repo_path,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+
+def get_subproject_pathspecs(path, exclude=()):
+    """
+    History pathspecs of the sub-project at {path} ('' for the repository root), without its nested sub-projects {exclude}
+    (All paths are relative to the repository root)
+    """
+    prefix = f"{path}/" if path else ''
+
+    return [prefix + pathspec for pathspec in HISTORY_PATHSPECS] + [f":(exclude){nested}/*" for nested in exclude]
+
+
+def get_include_pathspecs(paths, pathspecs):
+    """
+    Pathspecs adding the requirements files at {paths} (Relative to the repository root) that {pathspecs} don't match
+    """
+    include_pathspecs = []
+    for path in paths:
+        path = os.path.normpath(path).replace('\\', '/')
+        # Outside of the repository
+        if path.startswith('../'):
+            continue
+
+        if not match_pathspecs(path, pathspecs + include_pathspecs):
+            include_pathspecs.append(INCLUDE_PATHSPEC_PREFIX + path)
+
+    return include_pathspecs
+
+
+def match_pathspecs(path, pathspecs):
+    """
+    Match {path} like git does for our pathspecs : fnmatch patterns ('*' matches '/' too), ':(exclude){pattern}' and
+    ':(literal){path}'
+    """
+    included = False
+    for pathspec in pathspecs:
+        exclude_prefix = next((prefix for prefix in EXCLUDE_PATHSPEC_PREFIXES if pathspec.startswith(prefix)), None)
+
+        if exclude_prefix is not None:
+            if fnmatchcase(path, pathspec[len(exclude_prefix):]):
+                return False
+        elif pathspec.startswith(INCLUDE_PATHSPEC_PREFIX):
+            included = included or path == pathspec[len(INCLUDE_PATHSPEC_PREFIX):]
+        elif not included:
+            included = fnmatchcase(path, pathspec)
+
+    return included
+
+
+def get_pathspecs_directory(pathspecs):
+    """
+    Deepest directory containing every path matched by {pathspecs} ('' for the repository root)
+    """
+    directories = []
+    for pathspec in pathspecs:
+        if pathspec.startswith(INCLUDE_PATHSPEC_PREFIX):
+            literal = pathspec[len(INCLUDE_PATHSPEC_PREFIX):]
+            directories.append(literal.rsplit('/', 1)[0].split('/') if '/' in literal else [])
+        elif not pathspec.startswith(EXCLUDE_PATHSPEC_PREFIXES):
+            literal = PATHSPEC_WILDCARDS_REGEX.split(pathspec, 1)[0]
+            directories.append(literal.rsplit('/', 1)[0].split('/') if '/' in literal else [])
+
+    common = []
+    for parts in zip(*directories):
+        if any(part != parts[0] for part in parts):
+            break
+        common.append(parts[0])
+
+    return '/'.join(common)
+
+
+def is_structured_manifest(path):
+    """
+    True for the manifests that are compared as a whole (setup.py, setup.cfg, pyproject.toml, Pipfile) instead of line by line
+    """
+    return get_manifest_kind(path) in ('setup.py', 'setup.cfg', 'pyproject.toml', 'Pipfile')
+
+
+def parse_imported_modules(line):
+    """
+    Return the top level modules imported by a python source line
+    'import a.b, c as d' -> ['a', 'c']      'from x.y import z' -> ['x']
+    """
+    matches = IMPORT_LINE_REGEX.match(line)
+    if not matches:
+        return []
+
+    if matches.group(1):
+        return [matches.group(1)]
+
+    modules = []
+    for imported in matches.group(2).split(','):
+        module = imported.strip().split(' ')[0].split('.')[0]
+        if module.isidentifier():
+            modules.append(module)
+
+    return modules
+
+
+class GitHistoryIndex:
+    """
+    Index of the first time each module was imported and each package was declared by a dependency manifest (See manifests.py)
+    The whole git history is walked once instead of running one git log per package and per manifest
+    Requirements files are indexed line by line, the other manifests are parsed before and after each change to find the
+    packages they started declaring (A dependency list spans many lines and a diff line doesn't say which table it is in)
+    The default 'subprocess' backend streams git log -p, the 'objects' backend reads commits, trees and blobs straight from
+    the object database (About 3x slower on full builds, see benchmarks/bench_git_history.py)
+    Modules are lowercase (case insensitive match), packages are normalized (See normalize_package_name())
+
+    Targeted runs (--only) restrict the index to some {modules} and requirement {packages} : git log -G only diffs the commits
+    mentioning them, from the oldest, and the walk stops as soon as all of them were found (git log --reverse only lists the
+    commits before the first one is diffed, the diffs are computed as the output is read). Such a partial index is never saved
+    """
+
+    def __init__(self, pathspecs=None, repo_path='.', backend='subprocess', modules=None, packages=None):
+        self.pathspecs = pathspecs if pathspecs is not None else HISTORY_PATHSPECS
+        self.repo_path = repo_path
+        self.backend = backend
+        self.modules = set(m.lower() for m in modules) if modules is not None else None
+        self.packages = set(normalize_package_name(p) for p in packages) if packages is not None else None
+        # Included requirements files (See get_include_pathspecs())
+        self.include_paths = set(p[len(INCLUDE_PATHSPEC_PREFIX):] for p in self.pathspecs if p.startswith(INCLUDE_PATHSPEC_PREFIX))
+        self.import_dates = {}
+        self.requirement_dates = {}
+        # Commit at which the index was built
+        self.head = None
+
+    def build(self, since=None):
+        """
+        Index the history up to HEAD, when {since} is given only the commits after it are walked
+        """
+        repository = open_repository(self.repo_path) if self.backend == 'objects' and not self.is_partial else None
+
+        if repository is not None:
+            try:
+                return self._build_from_objects(repository, since)
+            except GitObjectError:
+                # Unsupported object or corrupted repository, let git handle it
+                pass
+
+        self.head = get_head_commit(self.repo_path)
+
+        if self.head is None:
+            # Nothing committed yet
+            return self
+
+        revisions = [f"{since}..{self.head}"] if since else [self.head]
+        cmd = ['git', 'log', '-p', '--no-color', '--no-renames', '--no-ext-diff', '--unified=0', '--full-index',
+               '--pretty=format:%x00%at']
+        if self.is_partial:
+            names = sorted((self.modules or set()) | (self.packages or set()))
+            cmd += ['--reverse', '--regexp-ignore-case', '-G', '|'.join(re.escape(name) for name in names) or '^$']
+        cmd += revisions + ['--'] + self.pathspecs
+
+        tracer.record_subprocess(' '.join(cmd))
+        process = subprocess.Popen(cmd, cwd=self.repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def read_lines():
+            nb_bytes = 0
+            for line in process.stdout:
+                nb_bytes += len(line)
+                yield line.decode('utf-8', errors='replace')
+
+            tracer.record_bytes_read(nb_bytes)
+
+        try:
+            blob_changes = self.index_git_log_lines(read_lines())
+        finally:
+            if process.poll() is None:
+                # Stopped early (Partial index)
+                process.terminate()
+            process.stdout.close()
+            process.wait()
+
+        self.index_blob_changes(blob_changes)
+
+        return self
+
+    def index_blob_changes(self, blob_changes):
+        """
+        Compare the versions of the notebooks and manifests changed by each commit, read in a single git cat-file process
+        """
+        if len(blob_changes) == 0:
+            return
+
+        cmd = ['git', 'cat-file', '--batch']
+        tracer.record_subprocess(' '.join(cmd))
+        process = subprocess.Popen(cmd, cwd=self.repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def read_blob(sha):
+            if sha is None:
+                return None
+
+            process.stdin.write(f"{sha}\n".encode())
+            process.stdin.flush()
+
+            header = process.stdout.readline().split()
+            if len(header) < 3 or header[1] != b'blob':
+                return None
+
+            content = process.stdout.read(int(header[2]))
+            # Trailing newline
+            process.stdout.read(1)
+
+            return content
+
+        nb_bytes = 0
+        try:
+            for path, old_blob, new_blob, commit_date in blob_changes:
+                old_content = read_blob(old_blob)
+                new_content = read_blob(new_blob)
+                if new_content is None:
+                    continue
+
+                nb_bytes += len(new_content) + len(old_content or b'')
+                if path.endswith('.ipynb'):
+                    self.index_notebook_change(old_content, new_content, commit_date)
+                else:
+                    self.index_manifest_change(path, old_content, new_content, commit_date)
+        finally:
+            process.stdin.close()
+            process.stdout.close()
+            process.wait()
+
+        tracer.record_bytes_read(nb_bytes)
+
+    def _build_from_objects(self, repository, since=None):
+        """
+        Diff each commit against its first parent, merge commits are skipped like git log -p does without -m
+        The lines of a new blob that are not in the previous version of the file are the added lines : unlike a diff, moved
+        lines are not seen as added, which doesn't change the first date of a line
+        """
+        self.head = get_head_commit(self.repo_path)
+
+        if self.head is None:
+            # Nothing committed yet
+            return self
+
+        # Only the trees of the directory of a sub-project are diffed
+        directory = get_pathspecs_directory(self.pathspecs)
+
+        def get_tree(commit):
+            return repository.resolve_tree_path(commit['tree'], directory) if directory else commit['tree']
+
+        nb_bytes = 0
+        for _, commit in repository.iter_commits([self.head], exclude=[since] if since else ()):
+            if len(commit['parents']) > 1:
+                continue
+
+            parent_tree = get_tree(repository.read_commit(commit['parents'][0])) if commit['parents'] else None
+            tree = get_tree(commit)
+
+            for path, old_blob, new_blob in repository.iter_changed_files(parent_tree, tree, f"{directory}/" if directory else ''):
+                if new_blob is None or not match_pathspecs(path, self.pathspecs):
+                    continue
+
+                new_content = repository.read_blob(new_blob)
+                old_content = repository.read_blob(old_blob) if old_blob else b''
+                nb_bytes += len(new_content) + len(old_content)
+
+                if path.endswith('.ipynb'):
+                    self.index_notebook_change(old_content if old_blob else None, new_content, commit['author_time'])
+                    continue
+
+                if is_structured_manifest(path):
+                    self.index_manifest_change(path, old_content if old_blob else None, new_content, commit['author_time'])
+                    if not path.endswith('.py'):
+                        continue
+
+                old_lines = set(old_content.splitlines())
+                for line in new_content.splitlines():
+                    if line not in old_lines:
+                        self.index_added_line(path, line.decode('utf-8', errors='replace'), commit['author_time'])
+
+        tracer.record_bytes_read(nb_bytes)
+
+        return self
+
+    def update(self):
+        """
+        Bring an index loaded from a previous run up to date with HEAD by indexing only the new commits
+        The index is rebuilt from scratch if history was rewritten (Rebase, amend, ...)
+        """
+        previous_head = self.head
+
+        if previous_head is not None and previous_head == get_head_commit(self.repo_path):
+            return self
+
+        if previous_head is None or not is_ancestor_commit(previous_head, repo_path=self.repo_path):
+            self.import_dates = {}
+            self.requirement_dates = {}
+            return self.build()
+
+        return self.build(since=previous_head)
+
+    @property
+    def is_partial(self):
+        return self.modules is not None or self.packages is not None
+
+    def is_complete(self):
+        """
+        True when every module and package of a partial index was found
+        """
+        return self.is_partial and (self.modules or set()) <= set(self.import_dates) and \
+            (self.packages or set()) <= set(self.requirement_dates)
+
+    def to_dict(self):
+        return {
+            'head': self.head,
+            'pathspecs': self.pathspecs,
+            'import_dates': self.import_dates,
+            'requirement_dates': self.requirement_dates
+        }
+
+    @classmethod
+    def from_dict(cls, data, repo_path='.'):
+        index = cls(data['pathspecs'], repo_path)
+        index.head = data['head']
+        index.import_dates = data['import_dates']
+        index.requirement_dates = data['requirement_dates']
+
+        return index
+
+    def index_git_log_lines(self, lines):
+        """
+        Index the added lines of a git log -p output
+        The diff of a notebook is a diff of its JSON (Outputs included), return (path, old blob, new blob, commit date)
+        of the notebook and structured manifest changes instead so their contents can be compared (See index_blob_changes())
+        """
+        commit_date = None
+        current_path = None
+        current_blobs = None
+        in_hunk = False
+        blob_changes = []
+
+        for line in lines:
+            line = line.rstrip('\n')
+
+            if line.startswith(COMMIT_HEADER_PREFIX):
+                if self.is_partial and len(blob_changes) > 0:
+                    # The notebooks and manifests of the previous commit can complete the index
+                    self.index_blob_changes(blob_changes)
+                    blob_changes = []
+
+                if self.is_complete():
+                    break
+
+                commit_date = int(line[1:])
+                current_path = None
+                in_hunk = False
+            elif line.startswith('diff --git '):
+                current_path = None
+                current_blobs = None
+                in_hunk = False
+            elif not in_hunk:
+                if line.startswith('index '):
+                    # index {old blob}..{new blob} [mode], null shas for added/deleted files
+                    current_blobs = [None if set(sha) == {'0'} else sha for sha in line.split()[1].split('..')]
+                elif line.startswith('+++ '):
+                    # Deleted files are diffed against /dev/null
+                    current_path = line[6:] if line.startswith('+++ b/') else None
+
+                    if current_path is not None and (current_path.endswith('.ipynb') or is_structured_manifest(current_path)):
+                        if current_blobs is not None:
+                            blob_changes.append((current_path, current_blobs[0], current_blobs[1], commit_date))
+                        # The imports of setup.py are still indexed from its diff
+                        if not current_path.endswith('.py'):
+                            current_path = None
+                elif line.startswith('@@'):
+                    in_hunk = True
+            elif line.startswith('+') and current_path is not None:
+                self.index_added_line(current_path, line[1:], commit_date)
+
+        return blob_changes
+
+    def index_added_line(self, path, line, commit_date):
+        if path.endswith('.py'):
+            self.index_imports_line(line, commit_date)
+        elif get_manifest_kind(path) == 'requirements' or path in self.include_paths:
+            requirement = parse_requirement_line(line)
+            if requirement is not None:
+                self._record(self.requirement_dates, requirement['name'], commit_date)
+
+    def index_notebook_change(self, old_content, new_content, commit_date):
+        """
+        Compare the code cells, outputs are skipped
+        """
+        old_lines = get_notebook_code_lines(old_content) if old_content is not None else set()
+        for line in get_notebook_code_lines(new_content) - old_lines:
+            self.index_imports_line(line, commit_date)
+
+    def index_manifest_change(self, path, old_content, new_content, commit_date):
+        """
+        Record the packages declared by the new version of a manifest that the previous one didn't declare
+        """
+        old_packages = get_declared_packages(path, old_content) if old_content is not None else set()
+        for package_name in get_declared_packages(path, new_content) - old_packages:
+            self._record(self.requirement_dates, package_name, commit_date)
+
+    def index_imports_line(self, line, commit_date):
+        for module in parse_imported_modules(line):
+            self._record(self.import_dates, module, commit_date)
+
+    def _record(self, dates, name, commit_date):
+        name = normalize_package_name(name) if dates is self.requirement_dates else name.lower()
+        if self.is_partial:
+            names = self.modules if dates is self.import_dates else self.packages
+            if names is None or name not in names:
+                return
+
+        if name not in dates or commit_date < dates[name]:
+            dates[name] = commit_date
+
+    def first_import_date(self, import_name):
+        """
+        Date of the first commit adding an 'import {import_name}' or 'from {import_name}' line
+        """
+        return self._get_date(self.import_dates, import_name)
+
+    def first_requirement_date(self, package_name):
+        """
+        Date of the first commit declaring {package_name} in a dependency manifest
+        """
+        return self._get_date(self.requirement_dates, normalize_package_name(package_name))
+
+    @staticmethod
+    def _get_date(dates, name):
+        timestamp = dates.get(name.lower())
+
+        if timestamp is None:
+            return None
+
+        return datetime.fromtimestamp(timestamp)
@@ -0,0 +1,336 @@
+import os
+import re
+import ast
+import sys
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .history import parse_imported_modules
+from .notebooks import iter_notebook_code_cells, strip_magics
+from .instrumentation import tracer
+
+
+# Directories that never contain project code (Virtualenvs, vcs, caches, js dependencies)
+PRUNED_DIRECTORIES = {'.git', '.hg', '.svn', 'venv', '.venv', 'node_modules', 'site-packages', '__pycache__', '.tox', '.nox',
+                      '.mypy_cache', '.pytest_cache', '.ipynb_checkpoints'}
+
+# Lines that are unambiguously import statements, any other statement with an import is parsed with ast
+_DOTTED_NAME = rb'\w+(?:[ \t]*\.[ \t]*\w+)*'
+_IMPORTED_NAME = _DOTTED_NAME + rb'(?:[ \t]+as[ \t]+\w+)?'
+_STATEMENT_END = rb'[ \t]*(?:[;#].*)?\r?$'
+SIMPLE_IMPORT_REGEX = re.compile(rb'^[ \t]*import[ \t]+(' + _IMPORTED_NAME + rb'(?:[ \t]*,[ \t]*' + _IMPORTED_NAME + rb')*)' + _STATEMENT_END)
+SIMPLE_FROM_IMPORT_REGEX = re.compile(rb'^[ \t]*from[ \t]+(\.*)[ \t]*(' + _DOTTED_NAME + rb')?[ \t]+import\b')
+IMPORT_STATEMENT_REGEX = re.compile(rb'[ \t]*(?:import|from)[ \t]')
+# Imports sharing a line with another statement ('try: import x', 'if x: import y', 'import a; import b')
+ONE_LINE_IMPORT_REGEX = re.compile(rb'[:;][ \t]*(?:import|from)[ \t]')
+
+NOTEBOOK_EXTENSION = '.ipynb'
+
+# Below this number of files (Or size of notebooks), spawning worker processes cost more than it saves
+MIN_FILES_FOR_PROCESS_POOL = 500
+MIN_NOTEBOOK_BYTES_FOR_PROCESS_POOL = 32 * 1024 * 1024
+NOTEBOOK_CHUNK_BYTES = 16 * 1024 * 1024
+# Notebooks are searched by blocks of this size (See find_imported_modules())
+NOTEBOOK_READ_BYTES = 1024 * 1024
+
+
+def iter_python_files(root='.', extensions=('.py',), exclude=()):
+    """
+    Yield the path (relative to {root}) of every python file in {root}
+    Vendored environments are pruned : PRUNED_DIRECTORIES and any directory containing a pyvenv.cfg
+    exclude: Directories (Relative to {root}) that are pruned too, the nested sub-projects of a monorepo
+    """
+    exclude = set(exclude)
+    directories = ['']
+
+    while directories:
+        directory = directories.pop()
+
+        try:
+            dir_entries = list(os.scandir(os.path.join(root, directory)))
+        except OSError:
+            continue
+
+        if directory and any(e.name == 'pyvenv.cfg' for e in dir_entries):
+            continue
+
+        for dir_entry in dir_entries:
+            relative_path = f"{directory}/{dir_entry.name}" if directory else dir_entry.name
+
+            if dir_entry.is_dir(follow_symlinks=False):
+                if dir_entry.name not in PRUNED_DIRECTORIES and relative_path not in exclude:
+                    directories.append(relative_path)
+            elif dir_entry.name.endswith(extensions):
+                yield relative_path
+
+
+def parse_import_lines(source):
+    """
+    Fast path : return the top level modules imported in {source} using only regexes
+    Only the lines containing the 'import' keyword are looked at, every import statement has one
+    Return None if a line looks like an import but isn't a simple import statement (Line continuation, text in a docstring,
+    import after a colon or a semicolon, ...)
+    """
+    modules = set()
+    position = source.find(b'import')
+    while position != -1:
+        line_start = source.rfind(b'\n', 0, position) + 1
+        line_end = source.find(b'\n', position)
+        if line_end == -1:
+            line_end = len(source)
+
+        line = source[line_start:line_end]
+        position = source.find(b'import', line_end)
+
+        # 'from x \' continued by 'import y' or import sharing its line with another statement
+        if source[max(0, line_start - 3):line_start].rstrip(b'\r\n').endswith(b'\\') or ONE_LINE_IMPORT_REGEX.search(line):
+            return None
+
+        matches = SIMPLE_IMPORT_REGEX.match(line)
+        if matches:
+            for imported in matches.group(1).split(b','):
+                modules.add(imported.split()[0].split(b'.')[0].decode())
+            continue
+
+        matches = SIMPLE_FROM_IMPORT_REGEX.match(line)
+        if matches and (matches.group(1) or matches.group(2)):
+            # Relative imports are local modules
+            if len(matches.group(1)) == 0:
+                modules.add(matches.group(2).split(b'.')[0].strip().decode())
+            continue
+
+        if IMPORT_STATEMENT_REGEX.match(line):
+            return None
+
+    return modules
+
+
+def iter_statements(nodes):
+    """
+    Yield the statements of {nodes} and the ones nested in their blocks
+    Import statements can't be nested in expressions, which are most of the syntax tree and are not visited
+    """
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        yield node
+
+        for field in ('body', 'orelse', 'finalbody', 'handlers', 'cases'):
+            stack.extend(getattr(node, field, ()))
+
+
+def parse_source_imports(source):
+    """
+    Return the top level modules imported in python {source} (bytes)
+    Imports nested in functions, classes or try blocks are included, relative imports (local modules) are not
+    """
+    # Most files only contain simple import statements, no need to build the syntax tree
+    modules = parse_import_lines(source)
+    if modules is not None:
+        return modules
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        # Python 2 files or invalid syntax, fallback on a line based parsing
+        modules = set()
+        for line in source.decode('utf-8', errors='replace').split('\n'):
+            modules.update(parse_imported_modules(line))
+
+        return modules
+
+    modules = set()
+    for node in iter_statements(tree.body):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split('.')[0])
+
+    return modules
+
+
+def parse_notebook_imports(stream):
+    """
+    Return the top level modules imported in the code cells of a notebook
+    """
+    modules = set()
+    for source in iter_notebook_code_cells(stream):
+        modules.update(parse_source_imports(strip_magics(source).encode()))
+
+    return modules
+
+
+def scan_files_imports(file_paths):
+    """
+    Return the modules imported in {file_paths} (Python files and notebooks) and the number of bytes read
+    """
+    modules = set()
+    nb_bytes = 0
+    for file_path in file_paths:
+        if file_path.endswith(NOTEBOOK_EXTENSION):
+            try:
+                with open(file_path, 'rb') as f:
+                    nb_bytes += os.fstat(f.fileno()).st_size
+                    modules.update(parse_notebook_imports(f))
+            except (OSError, ValueError):
+                # Unreadable or invalid notebook
+                pass
+
+            continue
+
+        try:
+            with open(file_path, 'rb') as f:
+                source = f.read()
+        except OSError:
+            continue
+
+        nb_bytes += len(source)
+        modules.update(parse_source_imports(source))
+
+    return modules, nb_bytes
+
+
+def chunk_notebooks(notebook_paths):
+    """
+    Group notebooks in chunks of about NOTEBOOK_CHUNK_BYTES, a large notebook gets its own chunk
+    """
+    chunks = []
+    chunk = []
+    chunk_bytes = 0
+    for notebook_path, size in notebook_paths:
+        if chunk_bytes + size > NOTEBOOK_CHUNK_BYTES and len(chunk) > 0:
+            chunks.append(chunk)
+            chunk = []
+            chunk_bytes = 0
+
+        chunk.append(notebook_path)
+        chunk_bytes += size
+
+    if len(chunk) > 0:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def get_process_pool(max_workers):
+    """
+    Process pool for the import scan. Forking a process running other threads (Service workers, monorepo sub-projects, Pypi
+    fetches) can deadlock the child on a lock held by one of them : the workers are then started by a forkserver (Or spawned)
+    """
+    if threading.active_count() == 1 or sys.version_info < (3, 7):
+        return ProcessPoolExecutor(max_workers=max_workers)
+
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(start_method))
+
+
+def scan_imports(root='.', max_workers=None, exclude=()):
+    """
+    Return the set of top level modules imported by the python files and notebooks in {root} (Except the {exclude} directories)
+    Large trees (Or large notebooks) are parsed in a process pool
+    """
+    file_paths = []
+    notebook_paths = []
+    for relative_path in iter_python_files(root, ('.py', NOTEBOOK_EXTENSION), exclude):
+        file_path = os.path.join(root, relative_path)
+
+        if relative_path.endswith(NOTEBOOK_EXTENSION):
+            try:
+                notebook_paths.append((file_path, os.path.getsize(file_path)))
+            except OSError:
+                continue
+        else:
+            file_paths.append(file_path)
+
+    notebook_bytes = sum(size for _, size in notebook_paths)
+
+    if len(file_paths) < MIN_FILES_FOR_PROCESS_POOL and notebook_bytes < MIN_NOTEBOOK_BYTES_FOR_PROCESS_POOL:
+        modules, nb_bytes = scan_files_imports(file_paths + [notebook_path for notebook_path, _ in notebook_paths])
+        tracer.record_bytes_read(nb_bytes)
+
+        return modules
+
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(100, len(file_paths) // (max_workers * 4))
+    chunks = [file_paths[i:i+chunk_size] for i in range(0, len(file_paths), chunk_size)]
+    # Biggest notebook chunks first so they don't end up last in the queue
+    chunks = chunk_notebooks(sorted(notebook_paths, key=lambda x: -x[1])) + chunks
+
+    modules = set()
+    with get_process_pool(max_workers) as executor:
+        for chunk_modules, nb_bytes in executor.map(scan_files_imports, chunks):
+            modules.update(chunk_modules)
+            tracer.record_bytes_read(nb_bytes)
+
+    return modules
+
+
+def stream_mentions(stream, mentions, overlap):
+    """
+    Return True if the regex {mentions} matches the content of {stream}, read by chunks of NOTEBOOK_READ_BYTES
+    The last {overlap} bytes of a chunk are searched again with the next one so that a match can't be split
+    """
+    tail = b''
+    while True:
+        chunk = stream.read(NOTEBOOK_READ_BYTES)
+        if not chunk:
+            return False
+
+        chunk = tail + chunk
+        if mentions.search(chunk):
+            return True
+
+        tail = chunk[-overlap:]
+
+
+def find_imported_modules(modules, root='.', exclude=()):
+    """
+    Return which of {modules} are imported by the python files and notebooks in {root} (Case insensitive, lowercase names)
+    The scan stops as soon as all of them were found, files that don't mention any of them are not parsed
+    Notebooks are streamed : their raw bytes are searched by chunks and only the ones mentioning a module are parsed
+    """
+    def mentions_regex(names):
+        return re.compile(b'|'.join(re.escape(name.encode()) for name in names), re.IGNORECASE)
+
+    remaining = set(module.lower() for module in modules)
+    mentions = mentions_regex(remaining)
+    found = set()
+    nb_bytes = 0
+
+    for relative_path in iter_python_files(root, ('.py', NOTEBOOK_EXTENSION), exclude):
+        if len(remaining) == 0:
+            break
+
+        try:
+            with open(os.path.join(root, relative_path), 'rb') as f:
+                if relative_path.endswith(NOTEBOOK_EXTENSION):
+                    nb_bytes += os.fstat(f.fileno()).st_size
+                    if not stream_mentions(f, mentions, max(len(name.encode()) for name in remaining)):
+                        continue
+
+                    f.seek(0)
+                    imported = parse_notebook_imports(f)
+                else:
+                    source = f.read()
+                    nb_bytes += len(source)
+                    if not mentions.search(source):
+                        continue
+
+                    imported = parse_source_imports(source)
+        except OSError:
+            continue
+        except ValueError:
+            # Invalid notebook
+            continue
+
+        matches = remaining & set(module.lower() for module in imported)
+        if len(matches) > 0:
+            found |= matches
+            remaining -= matches
+            mentions = mentions_regex(remaining)
+
+    tracer.record_bytes_read(nb_bytes)
+
+    return found
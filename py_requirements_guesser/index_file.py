@@ -0,0 +1,106 @@
+import os
+import mmap
+import struct
+import tempfile
+
+
+INDEX_MAGIC = b'PRGIDX01'
+HEADER_FORMAT = '<8sI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+OFFSET_SIZE = 4
+
+
+def write_sorted_table(filepath, items):
+    """
+    Write (key, value) bytes pairs as a sorted string table :
+        magic | number of records | offsets of the records (uint32) | records (key \\0 value)
+    Keys must not contain null bytes
+    """
+    items = sorted(items)
+
+    offsets = []
+    records = bytearray()
+    for key, value in items:
+        offsets.append(len(records))
+        records += key + b'\0' + value
+    offsets.append(len(records))
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_filepath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, INDEX_MAGIC, len(items)))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.write(records)
+
+    # Atomic so concurrent readers never see a partial table
+    os.replace(tmp_filepath, filepath)
+
+
+class SortedTable:
+    """
+    Read only view over a table written by write_sorted_table()
+    The file is memory mapped, opening it doesn't read the records and lookups are binary searches
+    """
+
+    def __init__(self, filepath):
+        with open(filepath, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count = struct.unpack_from(HEADER_FORMAT, self._buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"'{filepath}' is not a sorted table")
+
+        self._records_start = HEADER_SIZE + (self._count + 1) * OFFSET_SIZE
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, i):
+        start, end = struct.unpack_from('<II', self._buffer, HEADER_SIZE + i * OFFSET_SIZE)
+
+        return self._buffer[self._records_start + start:self._records_start + end]
+
+    def _key_value(self, i):
+        key, _, value = self._record(i).partition(b'\0')
+
+        return key, value
+
+    def _lower_bound(self, key):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_value(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def get(self, key, default=None):
+        i = self._lower_bound(key)
+
+        if i < self._count:
+            record_key, value = self._key_value(i)
+            if record_key == key:
+                return value
+
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def iter_prefix(self, prefix):
+        """
+        Yield the (key, value) pairs whose key starts with {prefix}
+        """
+        for i in range(self._lower_bound(prefix), self._count):
+            key, value = self._key_value(i)
+            if not key.startswith(prefix):
+                return
+
+            yield key, value
+
+    def close(self):
+        self._buffer.close()
@@ -0,0 +1,209 @@
+import time
+import json
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    # Python 3.6
+    ContextVar = None
+
+
+COUNTERS = ['subprocesses', 'bytes_read', 'http_requests', 'http_seconds']
+
+
+class Tracer:
+    """
+    Collect timing events for the phases of a run (And for each package)
+    Each phase records its wall time and the number of subprocesses, bytes read and HTTP requests (With their latency) made while it was open
+
+    Phases opened with shared=True (The main steps of a run) also count the work done by the worker threads they spawn,
+    other phases only count the work of the thread that opened them
+
+    Monitoring can subscribe to the events :
+        tracer.subscribe(lambda event: print(event))
+
+    Each run has its own tracer (See use_tracer()), the events of a run are also emitted by its {parent}
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.events = []
+        self.recording = False
+        self._subscribers = []
+        self._open_phases = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def start_recording(self):
+        """
+        Keep the events in memory (For the --timings summary and --trace_json)
+        """
+        self.recording = True
+
+    def reset(self):
+        with self._lock:
+            self.events = []
+
+    def emit(self, event):
+        with self._lock:
+            if self.recording:
+                self.events.append(event)
+
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            callback(event)
+
+        if self.parent is not None:
+            self.parent.emit(event)
+
+    @contextmanager
+    def phase(self, name, package=None, shared=False):
+        phase = {
+            'event': 'phase',
+            'phase': name,
+            'package': package,
+            'start': time.time(),
+            'seconds': None,
+            'thread': None if shared else threading.get_ident(),
+            **{counter: 0 for counter in COUNTERS}
+        }
+
+        start = time.perf_counter()
+        with self._lock:
+            self._open_phases.append(phase)
+
+        try:
+            yield phase
+        finally:
+            phase['seconds'] = time.perf_counter() - start
+
+            with self._lock:
+                self._open_phases.remove(phase)
+
+            del phase['thread']
+            self.emit(phase)
+
+    def _increment(self, **counters):
+        thread = threading.get_ident()
+
+        with self._lock:
+            for phase in self._open_phases:
+                if phase['thread'] is None or phase['thread'] == thread:
+                    for counter, value in counters.items():
+                        phase[counter] += value
+
+    def record_subprocess(self, command):
+        self._increment(subprocesses=1)
+        self.emit({'event': 'subprocess', 'command': command, 'start': time.time()})
+
+    def record_bytes_read(self, nb_bytes):
+        self._increment(bytes_read=nb_bytes)
+
+    def record_http_request(self, url, status, seconds, nb_bytes):
+        self._increment(http_requests=1, http_seconds=seconds, bytes_read=nb_bytes)
+        self.emit({'event': 'http_request', 'url': url, 'status': status, 'seconds': seconds, 'bytes': nb_bytes, 'start': time.time()})
+
+    def summary(self):
+        """
+        Aggregate the recorded phases per name (Per package phases are summed)
+        """
+        phases = {}
+        for event in self.events:
+            if event['event'] != 'phase':
+                continue
+
+            phase = phases.setdefault(event['phase'], {'count': 0, 'seconds': 0, **{counter: 0 for counter in COUNTERS}})
+            phase['count'] += 1
+            phase['seconds'] += event['seconds']
+            for counter in COUNTERS:
+                phase[counter] += event[counter]
+
+        return phases
+
+    def print_summary(self):
+        print(f"{'phase'.ljust(20)} {'count'.rjust(6)} {'seconds'.rjust(9)} {'subprocesses'.rjust(12)} {'MB read'.rjust(9)} "
+              f"{'http requests'.rjust(13)} {'http seconds'.rjust(12)}")
+
+        for name, phase in self.summary().items():
+            print(f"{name.ljust(20)} {phase['count']:6d} {phase['seconds']:9.3f} {phase['subprocesses']:12d} "
+                  f"{phase['bytes_read'] / (1024*1024):9.2f} {phase['http_requests']:13d} {phase['http_seconds']:12.3f}")
+
+    def write_json(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump({'summary': self.summary(), 'events': self.events}, f, indent=2)
+
+
+class _ThreadLocalVar(threading.local):
+    """
+    ContextVar stand-in for Python 3.6, the value is only visible to the thread that set it
+    """
+    value = None
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        token, self.value = self.value, value
+        return token
+
+    def reset(self, token):
+        self.value = token
+
+
+# Tracer of the current run, the process wide tracer is used outside of runs
+process_tracer = Tracer()
+_run_tracer = ContextVar('run_tracer', default=None) if ContextVar is not None else _ThreadLocalVar()
+
+
+def get_tracer():
+    return _run_tracer.get() or process_tracer
+
+
+@contextmanager
+def use_tracer(run_tracer):
+    """
+    Make {run_tracer} the tracer of the code run in this context, so that concurrent runs don't mix their events and counters
+    """
+    token = _run_tracer.set(run_tracer)
+    try:
+        yield run_tracer
+    finally:
+        _run_tracer.reset(token)
+
+
+def bind_tracer(function):
+    """
+    Wrap {function} so that it uses the tracer of the caller when it runs in a worker thread
+    Threads don't inherit the context of the thread submitting the work
+    """
+    run_tracer = get_tracer()
+
+    @wraps(function)
+    def run(*args, **kwargs):
+        with use_tracer(run_tracer):
+            return function(*args, **kwargs)
+
+    return run
+
+
+class _CurrentTracer:
+    """
+    Forward to the tracer of the current run
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_tracer(), name)
+
+
+tracer = _CurrentTracer()
@@ -0,0 +1,190 @@
+import re
+import json
+import codecs
+
+
+WHITESPACE_REGEX = re.compile(r'[ \t\n\r]*')
+SCALAR_END_REGEX = re.compile(r'[,\]}\s]')
+STRUCTURE_REGEX = re.compile(r'["\[\]{}]')
+STRING_CONTENT_REGEX = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+
+
+class JsonStream:
+    """
+    Incremental JSON reader working on a binary stream (file, http response)
+    Only a small window of the document is kept in memory :
+        - iter_object() / iter_array() walk containers one member at a time
+        - read_value() materialize the current value
+        - skip_value() jump over the current value without building it (Or keeping it in memory)
+    Values that are not consumed by the caller while iterating are skipped
+    """
+
+    def __init__(self, stream, chunk_size=64*1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        # Number of characters already dropped from the buffer
+        self._offset = 0
+
+    def _fill(self):
+        """
+        Read the next chunk, the consumed part of the buffer (Before self._pos) is dropped
+        """
+        chunk = self.stream.read(self.chunk_size)
+
+        if len(chunk) == 0:
+            return False
+
+        self._offset += self._pos
+        self._buf = self._buf[self._pos:] + self._decoder.decode(chunk)
+        self._pos = 0
+
+        return True
+
+    def _fill_or_raise(self):
+        if not self._fill():
+            raise ValueError("Unexpected end of JSON stream")
+
+    def _tell(self):
+        return self._offset + self._pos
+
+    def _skip_whitespaces(self):
+        while True:
+            self._pos = WHITESPACE_REGEX.match(self._buf, self._pos).end()
+
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def _next_char(self):
+        self._skip_whitespaces()
+
+        if self._pos >= len(self._buf):
+            raise ValueError("Unexpected end of JSON stream")
+
+        return self._buf[self._pos]
+
+    def _expect(self, char):
+        if self._next_char() != char:
+            raise ValueError(f"Expected '{char}' at position {self._tell()} of JSON stream")
+
+        self._pos += 1
+
+    def _scalar_end(self):
+        while True:
+            matches = SCALAR_END_REGEX.search(self._buf, self._pos)
+
+            if matches is not None:
+                return matches.start()
+            elif not self._fill():
+                return len(self._buf)
+
+    def _value_end(self):
+        """
+        Return the buffer index where the current value ends
+        The scanned characters are dropped as we go so skipping a huge value stay cheap
+        """
+        if self._next_char() not in '{["':
+            return self._scalar_end()
+
+        depth = 0
+        in_string = False
+
+        while True:
+            if in_string:
+                self._pos = STRING_CONTENT_REGEX.match(self._buf, self._pos).end()
+
+                if self._pos >= len(self._buf) or self._buf[self._pos] == '\\':
+                    # The string (Or an escape sequence) continue in the next chunk
+                    self._fill_or_raise()
+                    continue
+
+                # Closing quote
+                self._pos += 1
+                in_string = False
+
+                if depth == 0:
+                    return self._pos
+
+                continue
+
+            matches = STRUCTURE_REGEX.search(self._buf, self._pos)
+
+            if matches is None:
+                # Nothing we need to keep in the scanned data
+                self._pos = len(self._buf)
+                self._fill_or_raise()
+                continue
+
+            self._pos = matches.end()
+
+            if matches.group() == '"':
+                in_string = True
+            elif matches.group() in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return self._pos
+
+    def read_value(self):
+        if self._next_char() not in '{["':
+            # Make sure the whole number/literal is in the buffer
+            self._scalar_end()
+
+        while True:
+            try:
+                value, self._pos = self._json_decoder.raw_decode(self._buf, self._pos)
+                return value
+            except json.JSONDecodeError:
+                # Value is incomplete (Or invalid if there is nothing left to read)
+                self._fill_or_raise()
+
+    def skip_value(self):
+        self._pos = self._value_end()
+
+    def _iter_members(self, opening_char, closing_char, read_key):
+        self._expect(opening_char)
+
+        if self._next_char() == closing_char:
+            self._pos += 1
+            return
+
+        while True:
+            if read_key:
+                key = self.read_value()
+                self._expect(':')
+            else:
+                key = None
+
+            self._skip_whitespaces()
+            value_position = self._tell()
+
+            yield key
+
+            if self._tell() == value_position:
+                # The caller didn't consume the value
+                self.skip_value()
+
+            char = self._next_char()
+            self._pos += 1
+
+            if char == closing_char:
+                return
+            elif char != ',':
+                raise ValueError(f"Expected ',' or '{closing_char}' at position {self._tell()} of JSON stream")
+
+    def iter_object(self):
+        """
+        Iterate over the keys of the current object, the stream is positioned on the associated value
+        """
+        return self._iter_members('{', '}', read_key=True)
+
+    def iter_array(self):
+        """
+        Iterate over the items of the current array, the stream is positioned on each item
+        """
+        for _ in self._iter_members('[', ']', read_key=False):
+            yield self
@@ -0,0 +1,443 @@
+import os
+import re
+import ast
+import json
+import configparser
+from typing import NamedTuple, List, Dict
+
+from .versions import SpecifierSet, parse_requirement
+from .cache import normalize_package_name
+
+try:
+    import tomllib as toml
+except ImportError:
+    try:
+        import tomli as toml
+    except ImportError:
+        # Python < 3.11 without tomli, the TOML manifests are skipped
+        toml = None
+
+
+# Files declaring the dependencies of a project, the history of all of them is indexed (See history.py)
+MANIFEST_FILENAMES = {'setup.py', 'setup.cfg', 'pyproject.toml', 'Pipfile'}
+# Exact versions of an installed environment, only read in the working tree (Their history is mostly transitive dependencies churn)
+LOCKFILE_FILENAMES = {'poetry.lock', 'Pipfile.lock'}
+TOML_MANIFESTS = {'pyproject.toml', 'Pipfile', 'poetry.lock'}
+MANIFEST_PATHSPECS = ['*requirements*.txt', '*setup.py', '*setup.cfg', '*pyproject.toml', '*Pipfile']
+
+# Options of a requirements file line ('-r base.txt', '--constraint=c.txt', ...), anything else starting with '-' is ignored
+INCLUDE_OPTION_REGEX = re.compile(r'^(-r|--requirement|-c|--constraint)(?:\s*=\s*|\s+|(?=[^\s-]))(\S+)')
+EDITABLE_OPTION_REGEX = re.compile(r'^(?:-e|--editable)(?:\s*=\s*|\s+)(\S+)')
+EGG_FRAGMENT_REGEX = re.compile(r'#(?:.*&)?egg=([A-Za-z0-9][A-Za-z0-9._-]*)')
+# pip strips comments starting at a '#' preceded by whitespace, per line options (--hash, ...) follow the requirement
+COMMENT_REGEX = re.compile(r'(^|\s+)#.*$')
+LINE_OPTIONS_REGEX = re.compile(r'\s+--?[A-Za-z].*$')
+POETRY_VERSION_REGEX = re.compile(r'^(\^|~(?!=))?\s*(\d+(?:\.\d+)*)(\.\*)?$')
+
+
+class Manifest(NamedTuple):
+    """
+    Dependencies declared by a manifest
+    requirements: parse_requirement() dicts ({'name', 'extras', 'specifier', 'marker'})
+    includes: (path, is_constraint) of the requirements files it pulls in (-r / -c), relative to the manifest directory
+    locked: {name: version} pinned by a lockfile or a constraints file, they don't declare the packages (PEP 503 normalized names)
+    """
+    requirements: List[dict]
+    includes: List[tuple]
+    locked: Dict[str, str]
+
+
+def get_manifest_kind(path):
+    """
+    Return the kind of dependency manifest at {path} ('requirements', 'setup.py', 'setup.cfg', 'pyproject.toml', 'Pipfile',
+    'poetry.lock', 'Pipfile.lock') or None
+    Requirements files are the .txt files named *requirements* or in a requirements/ directory
+    """
+    parts = path.replace('\\', '/').split('/')
+    filename = parts[-1]
+
+    if filename in MANIFEST_FILENAMES or filename in LOCKFILE_FILENAMES:
+        return filename
+    elif filename.endswith('.txt') and ('requirements' in filename.lower() or (len(parts) > 1 and parts[-2].lower() == 'requirements')):
+        return 'requirements'
+
+    return None
+
+
+def parse_requirement_line(line):
+    """
+    Parse a line of a requirements file, return a parse_requirement() dict or None (Comments, options, local paths)
+    Extras, markers, per line options, 'name @ url' and '-e {vcs url}#egg={name}' are supported
+    """
+    line = COMMENT_REGEX.sub('', line).strip().rstrip('\\').strip()
+    if len(line) == 0:
+        return None
+
+    matches = EDITABLE_OPTION_REGEX.match(line)
+    if matches or '://' in line.split(';')[0].split('@')[0] or line.startswith(('git+', 'hg+', 'svn+', 'bzr+')):
+        # Only urls with an #egg= fragment name their package
+        matches = EGG_FRAGMENT_REGEX.search(matches.group(1) if matches else line)
+        return parse_requirement(matches.group(1)) if matches else None
+    elif line[0] == '-':
+        return None
+
+    return parse_requirement(LINE_OPTIONS_REGEX.sub('', line))
+
+
+def parse_requirements_file(content):
+    """
+    Requirements file ({content} is a str), lines ending with a backslash continue on the next one
+    """
+    requirements = []
+    includes = []
+
+    for line in content.replace('\\\r\n', ' ').replace('\\\n', ' ').splitlines():
+        matches = INCLUDE_OPTION_REGEX.match(line.strip())
+        if matches:
+            includes.append((matches.group(2), matches.group(1) in ('-c', '--constraint')))
+            continue
+
+        requirement = parse_requirement_line(line)
+        if requirement is not None:
+            requirements.append(requirement)
+
+    return Manifest(requirements, includes, {})
+
+
+def parse_setup_py(content):
+    """
+    install_requires of the setup() call, read with ast (Nothing is executed)
+    A list literal or a module level variable assigned to one are supported, anything computed is ignored
+    """
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        # Python 2 only or invalid file
+        return Manifest([], [], {})
+
+    assignments = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    assignments[target.id] = node.value
+
+    requirements = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+
+        function_name = node.func.id if isinstance(node.func, ast.Name) else getattr(node.func, 'attr', None)
+        if function_name != 'setup':
+            continue
+
+        for keyword in node.keywords:
+            if keyword.arg != 'install_requires':
+                continue
+
+            value = assignments.get(keyword.value.id, keyword.value) if isinstance(keyword.value, ast.Name) else keyword.value
+            try:
+                value = ast.literal_eval(value)
+            except ValueError:
+                continue
+
+            if isinstance(value, str):
+                value = value.splitlines()
+            if isinstance(value, (list, tuple)):
+                requirements += _parse_requirement_strings(value)
+
+    return Manifest(requirements, [], {})
+
+
+def parse_setup_cfg(content):
+    """
+    [options] install_requires of a setuptools declarative config
+    """
+    config = configparser.ConfigParser(interpolation=None)
+    try:
+        config.read_string(content)
+        install_requires = config.get('options', 'install_requires', fallback='')
+    except configparser.Error:
+        return Manifest([], [], {})
+
+    # 'file: requirements.txt' directives
+    if install_requires.strip().startswith('file:'):
+        includes = [(path.strip(), False) for path in install_requires.strip()[len('file:'):].split(',') if path.strip()]
+        return Manifest([], includes, {})
+
+    return Manifest(_parse_requirement_strings(line for line in install_requires.splitlines() if not line.strip().startswith('#')), [], {})
+
+
+def parse_pyproject_toml(content):
+    """
+    PEP 621 [project] dependencies and Poetry [tool.poetry.dependencies] (The 'python' constraint is skipped)
+    """
+    try:
+        document = load_toml(content)
+    except ValueError:
+        document = None
+
+    if document is None:
+        return Manifest([], [], {})
+
+    project = document.get('project', {})
+    requirements = _parse_requirement_strings(project.get('dependencies', []) if isinstance(project, dict) else [])
+
+    poetry = document.get('tool', {}).get('poetry', {})
+    requirements += _parse_constraint_table(poetry.get('dependencies', {}) if isinstance(poetry, dict) else {})
+
+    return Manifest(requirements, [], {})
+
+
+def parse_pipfile(content):
+    """
+    [packages] of a Pipfile, dev-packages are not runtime requirements
+    """
+    try:
+        document = load_toml(content)
+    except ValueError:
+        document = None
+
+    if document is None:
+        return Manifest([], [], {})
+
+    return Manifest(_parse_constraint_table(document.get('packages', {})), [], {})
+
+
+def parse_poetry_lock(content):
+    try:
+        document = load_toml(content)
+    except ValueError:
+        document = None
+
+    if document is None:
+        return Manifest([], [], {})
+
+    packages = document.get('package', [])
+    return Manifest([], [], {normalize_package_name(p['name']): str(p['version'])
+                             for p in packages if isinstance(p, dict) and 'name' in p and 'version' in p})
+
+
+def parse_pipfile_lock(content):
+    try:
+        document = json.loads(content)
+    except ValueError:
+        return Manifest([], [], {})
+
+    locked = {}
+    for name, package in document.get('default', {}).items():
+        version = package.get('version', '') if isinstance(package, dict) else ''
+        if version.startswith('=='):
+            locked[normalize_package_name(name)] = version[2:]
+
+    return Manifest([], [], locked)
+
+
+MANIFEST_PARSERS = {
+    'requirements': parse_requirements_file,
+    'setup.py': parse_setup_py,
+    'setup.cfg': parse_setup_cfg,
+    'pyproject.toml': parse_pyproject_toml,
+    'Pipfile': parse_pipfile,
+    'poetry.lock': parse_poetry_lock,
+    'Pipfile.lock': parse_pipfile_lock
+}
+
+
+def parse_manifest(path, content):
+    """
+    Parse the manifest at {path} ({content} is bytes or str), return a Manifest or None if {path} isn't a manifest
+    """
+    kind = get_manifest_kind(path)
+    if kind is None:
+        return None
+
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+
+    return MANIFEST_PARSERS[kind](content)
+
+
+def get_declared_packages(path, content):
+    """
+    Normalized names of the packages declared by the manifest at {path} (See normalize_package_name())
+    """
+    manifest = parse_manifest(path, content)
+
+    return set(normalize_package_name(r['name']) for r in manifest.requirements) if manifest is not None else set()
+
+
+def find_project_manifests(root='.'):
+    """
+    Manifests at the root of a project : requirements files (And requirements/*.txt), setup.py, setup.cfg, pyproject.toml,
+    Pipfile and the lockfiles. Return their paths relative to {root}
+    """
+    paths = []
+    for directory in ['', 'requirements']:
+        try:
+            filenames = sorted(os.listdir(os.path.join(root, directory)))
+        except OSError:
+            continue
+
+        for filename in filenames:
+            path = f"{directory}/{filename}" if directory else filename
+            if get_manifest_kind(path) is not None and os.path.isfile(os.path.join(root, path)):
+                paths.append(path)
+
+    return paths
+
+
+def read_project_requirements(root='.', paths=None):
+    """
+    Read the manifests of a project (find_project_manifests() or {paths}) and the requirements files they include
+    TOML manifests (pyproject.toml, Pipfile, poetry.lock) are skipped when neither tomllib nor tomli is available
+    Return (declared, locked, manifests, skipped)
+        declared: {normalized_name: {'package_name', 'specifier', 'manifest'}}, the specifiers of every manifest are combined
+        locked: {normalized_name: (version, manifest)} from the lockfiles and the constraints files
+        (Names are normalized by normalize_package_name())
+        manifests: Paths of all the manifests read, relative to {root}
+        skipped: Paths of the TOML manifests that couldn't be read
+    """
+    declared = {}
+    locked = {}
+    pending = [(path, False) for path in (paths if paths is not None else find_project_manifests(root))]
+    manifests = []
+    skipped = []
+
+    while pending:
+        path, is_constraint = pending.pop(0)
+        path = os.path.normpath(path).replace('\\', '/')
+        if path in manifests:
+            continue
+
+        if toml is None and get_manifest_kind(path) in TOML_MANIFESTS:
+            skipped.append(path)
+            continue
+
+        try:
+            with open(os.path.join(root, path), 'rb') as f:
+                content = f.read()
+        except OSError:
+            continue
+
+        manifests.append(path)
+        # Included files are requirements files whatever their name
+        manifest = MANIFEST_PARSERS[get_manifest_kind(path) or 'requirements'](content.decode('utf-8', errors='replace'))
+
+        pending += [(os.path.join(os.path.dirname(path), include), constraint) for include, constraint in manifest.includes]
+
+        for requirement in manifest.requirements:
+            if is_constraint:
+                version = get_pinned_version(requirement['specifier'])
+                if version is not None:
+                    locked.setdefault(normalize_package_name(requirement['name']), (version, path))
+                continue
+
+            package = declared.setdefault(normalize_package_name(requirement['name']), {
+                'package_name': requirement['name'],
+                'specifier': SpecifierSet(),
+                'manifest': path
+            })
+            package['specifier'].specifiers += [s for s in requirement['specifier'].specifiers if s not in package['specifier'].specifiers]
+
+        for name, version in manifest.locked.items():
+            locked.setdefault(name, (version, path))
+
+    return declared, locked, manifests, skipped
+
+
+def get_pinned_version(specifier):
+    """
+    Version of a '==X' specifier (Wildcards excluded), None when the specifier allows many versions
+    """
+    pinned = [version for operator, version in specifier.specifiers if operator in ('==', '===') and not version.endswith('.*')]
+
+    return pinned[0] if len(pinned) > 0 else None
+
+
+def poetry_to_specifier(constraint):
+    """
+    Translate a Poetry / Pipfile version constraint to PEP 440 ('^1.2' -> '>=1.2,<2.0', '~1.2' -> '>=1.2,<1.3', '1.2' -> '==1.2')
+    Alternatives ('^1.0 || ^2.0') can't be expressed, they don't constrain the version
+    """
+    constraint = constraint.strip()
+    if constraint in ('', '*') or '||' in constraint:
+        return ''
+
+    specifiers = []
+    for part in constraint.split(','):
+        part = part.strip()
+        matches = POETRY_VERSION_REGEX.match(part)
+
+        if not matches:
+            specifiers.append(part)
+        elif matches.group(3):
+            specifiers.append(f"=={matches.group(2)}.*")
+        elif matches.group(1) is None:
+            specifiers.append(f"=={matches.group(2)}")
+        else:
+            release = [int(p) for p in matches.group(2).split('.')]
+            if matches.group(1) == '^':
+                # Bump the first non zero component
+                bumped = next((i for i, p in enumerate(release) if p != 0), len(release) - 1)
+            else:
+                bumped = min(1, len(release) - 1)
+
+            upper = release[:bumped] + [release[bumped] + 1]
+            specifiers.append(f">={matches.group(2)},<{'.'.join(str(p) for p in upper + [0] * max(0, 2 - len(upper)))}")
+
+    return ','.join(specifiers)
+
+
+def _parse_requirement_strings(requirements):
+    parsed = []
+    for requirement in requirements:
+        if isinstance(requirement, str):
+            requirement = parse_requirement(requirement.strip())
+            if requirement is not None:
+                parsed.append(requirement)
+
+    return parsed
+
+
+def _parse_constraint_table(table):
+    """
+    {name: constraint or {'version': constraint, ...}} tables of Poetry and Pipfile
+    """
+    requirements = []
+    if not isinstance(table, dict):
+        return requirements
+
+    for name, constraint in table.items():
+        if name.lower() == 'python':
+            continue
+
+        if isinstance(constraint, list):
+            # Multiple constraints with markers, the first one is kept
+            constraint = constraint[0] if len(constraint) > 0 else '*'
+        if isinstance(constraint, dict):
+            if 'path' in constraint:
+                # Local project
+                continue
+            # Git dependencies don't have a version
+            constraint = constraint.get('version', '*')
+
+        requirement = parse_requirement(f"{name} {poetry_to_specifier(str(constraint))}")
+        if requirement is None:
+            requirement = parse_requirement(name)
+
+        if requirement is not None:
+            requirements.append(requirement)
+
+    return requirements
+
+
+def load_toml(content):
+    """
+    Parse a TOML document with tomllib (Python 3.11+) or tomli, raise ValueError if it is invalid
+    Return None when neither is available
+    """
+    if toml is None:
+        return None
+
+    return toml.loads(content)
@@ -0,0 +1,98 @@
+import os
+import sys
+import threading
+
+from .cache import CACHE_ROOT
+from .index_file import SortedTable, write_sorted_table
+
+
+# Mapping files from https://github.com/bndr/pipreqs (Version 0.4.13), shipped as package data
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+MAPPING_FILEPATH = os.path.join(DATA_PATH, 'mapping')
+STDLIB_FILEPATH = os.path.join(DATA_PATH, 'stdlib')
+
+IMPORT_TO_PACKAGE_PREFIX = b'i:'
+PACKAGE_TO_IMPORT_PREFIX = b'p:'
+STDLIB_PREFIX = b's:'
+
+_mapping_tables = {}
+_stdlib_modules = {}
+_mapping_tables_lock = threading.Lock()
+
+
+class MappingView:
+    """
+    Case insensitive, read only dict-like view over one of the mappings of the index
+    """
+
+    def __init__(self, table, prefix):
+        self.table = table
+        self.prefix = prefix
+
+    def get(self, name, default=None):
+        value = self.table.get(self.prefix + name.lower().encode())
+
+        return value.decode() if value is not None else default
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+def compile_mapping_index(index_filepath, mapping_filepath=MAPPING_FILEPATH, stdlib_filepath=STDLIB_FILEPATH):
+    """
+    Compile the pipreqs text files into a single sorted table
+    """
+    from_import_to_package_mapping = {}
+    from_package_to_import_mapping = {}
+    with open(mapping_filepath, 'r') as f:
+        for line in f.readlines():
+            import_name, package_name = line.strip().split(":")
+
+            from_import_to_package_mapping[import_name.lower()] = package_name
+            from_package_to_import_mapping[package_name.lower()] = import_name
+
+    with open(stdlib_filepath, 'r') as f:
+        stdlib = set([l.strip() for l in f.readlines() if len(l.strip()) > 0])
+
+    items = [(IMPORT_TO_PACKAGE_PREFIX + k.encode(), v.encode()) for k, v in from_import_to_package_mapping.items()]
+    items += [(PACKAGE_TO_IMPORT_PREFIX + k.encode(), v.encode()) for k, v in from_package_to_import_mapping.items()]
+    items += [(STDLIB_PREFIX + module.encode(), b'') for module in stdlib]
+
+    write_sorted_table(index_filepath, items)
+
+
+def load_mapping_index(index_filepath=f"{CACHE_ROOT}/mapping.idx"):
+    """
+    Memory map the compiled mapping index, it is (re)compiled when missing or older than the shipped mapping files
+    The table is shared by every caller in the process
+    """
+    with _mapping_tables_lock:
+        if index_filepath in _mapping_tables:
+            return _mapping_tables[index_filepath]
+
+        source_mtime = max(os.path.getmtime(MAPPING_FILEPATH), os.path.getmtime(STDLIB_FILEPATH))
+        if not os.path.exists(index_filepath) or os.path.getmtime(index_filepath) < source_mtime:
+            compile_mapping_index(index_filepath)
+
+        table = SortedTable(index_filepath)
+        _mapping_tables[index_filepath] = table
+
+        return table
+
+
+def get_stdlib_modules(table):
+    """
+    Standard library modules according to pipreqs and the running interpreter (sys.stdlib_module_names, python >= 3.10)
+    The list is only read once per table, callers get their own copy
+    """
+    with _mapping_tables_lock:
+        stdlib = _stdlib_modules.get(id(table))
+
+        if stdlib is None:
+            stdlib = set(key[len(STDLIB_PREFIX):].decode() for key, _ in table.iter_prefix(STDLIB_PREFIX))
+            stdlib.update(getattr(sys, 'stdlib_module_names', ()))
+            stdlib.update(sys.builtin_module_names)
+            stdlib = frozenset(stdlib)
+            _stdlib_modules[id(table)] = stdlib
+
+    return set(stdlib)
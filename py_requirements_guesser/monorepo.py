@@ -0,0 +1,155 @@
+import os
+from typing import NamedTuple, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .api import RequirementsGuesser
+from .backends import MemoryCachedBackend
+from .history import get_subproject_pathspecs
+from .imports import iter_python_files
+from .instrumentation import bind_tracer
+from .manifests import get_manifest_kind, MANIFEST_FILENAMES
+from .state import get_state_filepath, load_state, save_state
+from .utils import write_requirements_file
+
+
+class Subproject(NamedTuple):
+    """
+    Directory of a monorepo declaring its own dependencies
+    path: Relative to the repository root ('' for the root project)
+    nested: Paths of the sub-projects inside it, they are analysed on their own
+    """
+    path: str
+    nested: Tuple[str, ...] = ()
+
+    @property
+    def exclude(self):
+        """
+        Nested sub-projects, relative to the sub-project directory
+        """
+        return [nested[len(self.path) + 1:] if self.path else nested for nested in self.nested]
+
+    @property
+    def pathspecs(self):
+        return get_subproject_pathspecs(self.path, self.nested)
+
+    def __str__(self):
+        return self.path or '.'
+
+
+def find_subprojects(root='.'):
+    """
+    Detect the sub-projects of a monorepo : the directories holding a requirements file, setup.py, setup.cfg, pyproject.toml
+    or Pipfile (A requirements/ directory belongs to its parent). The root is one of them when it holds a manifest too
+    Return the Subprojects sorted by path
+    """
+    paths = set()
+    for relative_path in iter_python_files(root, tuple(MANIFEST_FILENAMES) + ('.txt',)):
+        if get_manifest_kind(relative_path) is None:
+            continue
+
+        directory = os.path.dirname(relative_path)
+        if get_manifest_kind(relative_path) == 'requirements' and os.path.basename(directory).lower() == 'requirements':
+            directory = os.path.dirname(directory)
+
+        paths.add(directory)
+
+    def is_inside(path, directory):
+        return path != directory and (directory == '' or path.startswith(directory + '/'))
+
+    subprojects = []
+    for path in sorted(paths):
+        # Only the sub-projects directly inside it, deeper ones are already excluded with their parent
+        nested = [p for p in sorted(paths) if is_inside(p, path) and not any(is_inside(p, o) and is_inside(o, path) for o in paths)]
+        subprojects.append(Subproject(path, tuple(nested)))
+
+    return subprojects
+
+
+def guess_subprojects(guesser, repo_path, subprojects, max_workers=None, states=None, **options):
+    """
+    Guess the requirements of {subprojects} concurrently, {guesser} is a RequirementsGuesser shared by all of them
+    (Same release cache and Pypi connections). {states} are the states of the previous run by sub-project path
+    Yield (Subproject, GuessResult or the exception raised, log messages) in completion order
+    """
+    states = states or {}
+
+    def guess(subproject):
+        messages = []
+        try:
+            result = guesser.guess(repo_path, state=states.get(subproject.path), log=messages.append, subproject=subproject, **options)
+        except Exception as e:
+            # Keep going with the other sub-projects
+            result = e
+
+        return subproject, result, messages
+
+    # Mostly waiting on Pypi and git, like the default of ThreadPoolExecutor
+    max_workers = max_workers or max(1, min(len(subprojects), (os.cpu_count() or 1) + 4))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in as_completed([executor.submit(bind_tracer(guess), subproject) for subproject in subprojects]):
+            yield future.result()
+
+
+def run_monorepo(repo_path, backend, strategy, max_workers=None, write=None, reset_state=False, **options):
+    """
+    Guess the requirements of every sub-project of the monorepo at {repo_path}, print them as they are done
+    With {write}, each sub-project gets its requirements written to {sub-project}/{write} (Existing files are only overwritten
+    when the user confirms, the sub-projects the user declined are listed at the end)
+    The state of each sub-project is saved on its own (Default state file of its directory)
+    Return the number of sub-projects that failed
+    """
+    subprojects = find_subprojects(repo_path)
+    if len(subprojects) == 0:
+        print("[ERROR] Couldn't find any sub-project (Directory with a requirements file, setup.py, setup.cfg, pyproject.toml or Pipfile)")
+        return 1
+
+    print(f"Guessing package versions for {len(subprojects)} sub-projects using the '{strategy}' strategy :")
+    for subproject in subprojects:
+        print(f"    {subproject}")
+
+    state_filepaths = {s.path: get_state_filepath(os.path.join(repo_path, s.path)) for s in subprojects}
+    states = {} if reset_state else {path: load_state(filepath) for path, filepath in state_filepaths.items()}
+
+    # The Pypi histories are kept in memory, packages used by many sub-projects are only read once
+    guesser = RequirementsGuesser(pypi_backend=MemoryCachedBackend(backend))
+
+    nb_errors = 0
+    not_written = []
+    results = guess_subprojects(guesser, repo_path, subprojects, max_workers, states, policy=strategy, **options)
+    for i, (subproject, result, messages) in enumerate(results):
+        print("\n" + "="*60 + "\n")
+        print(f"[{i+1}/{len(subprojects)}] Sub-project '{subproject}'")
+        for message in messages:
+            print(message)
+
+        if isinstance(result, Exception):
+            nb_errors += 1
+            print(f"[ERROR] {type(result).__name__}: {result}")
+            continue
+
+        if result.state is not None:
+            save_state(state_filepaths[subproject.path], result.state)
+
+        if options.get('only') and all(package.reason == 'not_found' for package in result.packages):
+            # Targeted run (--only), nothing to write for sub-projects that don't use the requested packages
+            print("\nNone of the requested packages are used by this sub-project")
+            continue
+
+        print("\nRequirements.txt :")
+        print(result.requirements)
+
+        if write is not None:
+            filepath = os.path.join(repo_path, subproject.path, write or "requirements.txt")
+            if not write_requirements_file(result.requirements, filepath):
+                # The other sub-projects are still written
+                print(f"[INFO] Keeping the existing {filepath}")
+                not_written.append(subproject)
+
+    print(f"\n{len(subprojects) - nb_errors} sub-projects guessed ({nb_errors} errors)")
+    if len(not_written) > 0:
+        print(f"Requirements not written (Existing file kept) for {len(not_written)} sub-projects :")
+        for subproject in not_written:
+            print(f"    {subproject}")
+
+    return nb_errors
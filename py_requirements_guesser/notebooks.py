@@ -0,0 +1,61 @@
+import io
+import re
+
+from .json_stream import JsonStream
+
+
+# IPython magics and shell escapes (%matplotlib inline, !pip install x, ?obj) are not python
+MAGIC_LINE_REGEX = re.compile(r'^[ \t]*[%!?].*$', re.MULTILINE)
+
+
+def iter_notebook_code_cells(stream):
+    """
+    Yield the source of each code cell of a notebook (nbformat 3 and 4)
+    The document is streamed, outputs (Images, dataframes, ...) are skipped without being decoded
+    """
+    reader = JsonStream(stream)
+
+    for key in reader.iter_object():
+        if key == 'cells':
+            yield from _iter_code_cells(reader)
+        elif key == 'worksheets':
+            # nbformat 3
+            for _ in reader.iter_array():
+                for worksheet_key in reader.iter_object():
+                    if worksheet_key == 'cells':
+                        yield from _iter_code_cells(reader)
+
+
+def _iter_code_cells(reader):
+    for _ in reader.iter_array():
+        cell_type = None
+        source = None
+
+        for key in reader.iter_object():
+            if key == 'cell_type':
+                cell_type = reader.read_value()
+            elif key in ('source', 'input'):
+                source = reader.read_value()
+
+        if cell_type == 'code' and source is not None:
+            yield ''.join(source) if isinstance(source, list) else source
+
+
+def strip_magics(source):
+    return MAGIC_LINE_REGEX.sub('', source)
+
+
+def get_notebook_code_lines(content):
+    """
+    Return the set of code lines of a notebook ({content} is bytes), magics excluded
+    """
+    lines = set()
+    try:
+        for source in iter_notebook_code_cells(io.BytesIO(content)):
+            lines.update(strip_magics(source).split('\n'))
+    except ValueError:
+        # Invalid or truncated notebook
+        pass
+
+    return lines
+
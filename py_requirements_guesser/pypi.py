@@ -0,0 +1,263 @@
+import time
+import zlib
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+
+from .errors import GuesserError
+from .json_stream import JsonStream
+from .instrumentation import tracer
+from .releases import to_ordinal
+from .compatibility import summarize_release_files
+
+
+PYPI_JSON_API_URL = "https://pypi.org/pypi"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# zlib header and trailer of the gzip format
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class PypiUnreachableError(GuesserError):
+    pass
+
+
+class GzipStream:
+    """
+    Gzip encoded HTTP response decompressed as it is read, the parsers never hold the whole body
+    """
+
+    def __init__(self, resp, chunk_size=64*1024):
+        self.resp = resp
+        self.headers = resp.headers
+        self.chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._buffer) < size) and not self._decompressor.eof:
+            chunk = self.resp.read(self.chunk_size)
+            if not chunk:
+                self._buffer += self._decompressor.flush()
+                break
+
+            self._buffer += self._decompressor.decompress(chunk)
+
+        if size < 0:
+            size = len(self._buffer)
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+
+        return data
+
+
+class PypiClient:
+    """
+    Minimal HTTP client for the Pypi JSON api
+    Each thread keeps its own keep-alive connection so concurrent requests don't pay the TLS handshake every time
+    Requests answered by 429/5xx (Or failing on network errors) are retried with exponential backoff
+    Responses are gzip encoded (JSON documents shrink about 10x), they are decompressed while parsed
+    """
+
+    def __init__(self, base_url=PYPI_JSON_API_URL, max_workers=8, max_retries=3, backoff_factor=0.5, timeout=20):
+        url = urlsplit(base_url)
+
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+
+        self._local = threading.local()
+
+    def _get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(self.host, timeout=self.timeout)
+            self._local.connection = connection
+
+        return connection
+
+    def _close_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def request(self, path, headers=None, parse_body=None):
+        """
+        GET {base_url}/{path}, return (status, headers, body)
+        When {parse_body} is given, successful responses (200) are streamed into it and the body is its return value
+        """
+        url_path = f"{self.base_path}/{path.lstrip('/')}"
+        headers = dict(headers or {}, **{'Accept-Encoding': 'gzip'})
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                connection = self._get_connection()
+                connection.request('GET', url_path, headers=headers)
+                resp = connection.getresponse()
+                gzipped = resp.headers.get('Content-Encoding', '').lower() == 'gzip'
+
+                if resp.status == 200 and parse_body is not None:
+                    body = parse_body(GzipStream(resp) if gzipped else resp)
+                    # Drain what the parser didn't consume so the connection can be reused
+                    resp.read()
+                else:
+                    body = resp.read()
+                    if gzipped and body:
+                        body = zlib.decompress(body, GZIP_WBITS)
+
+                if resp.will_close:
+                    self._close_connection()
+
+                tracer.record_http_request(f"{self.scheme}://{self.host}{url_path}", resp.status, time.perf_counter() - start,
+                                           int(resp.headers.get('Content-Length') or 0))
+
+                if resp.status not in RETRY_STATUS_CODES:
+                    return resp.status, resp.headers, body
+
+                retry_after = resp.headers.get('Retry-After')
+                error = f"HTTP {resp.status}"
+            except (OSError, ValueError, zlib.error, http.client.HTTPException) as e:
+                # Connection might have been dropped by the server, reconnect on next attempt
+                self._close_connection()
+                error = str(e)
+                tracer.record_http_request(f"{self.scheme}://{self.host}{url_path}", None, time.perf_counter() - start, 0)
+
+            if attempt < self.max_retries:
+                delay = self.backoff_factor * (2 ** attempt)
+                if retry_after is not None and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+
+                time.sleep(delay)
+
+        raise PypiUnreachableError(f"Failed to retrieve '{url_path}' from {self.host} ({error})")
+
+
+def parse_pypi_releases(stream):
+    """
+    Keep only the (version, upload date ordinal, compatibility summary) of each release from a Pypi JSON document
+    The upload date of a release is the one of its first file, the summary holds its requires_python and wheel tags (See compatibility.py)
+    The document is streamed, only one release file list is in memory at once
+    """
+    releases = []
+    for version, release_files in iter_pypi_releases(stream):
+        if len(release_files) == 0:
+            continue
+
+        # Yanked files are ignored by installers, mirrors that don't list the filenames have no summary
+        summary = None
+        if all('filename' in f for f in release_files):
+            summary = summarize_release_files([(f['filename'], f.get('requires_python')) for f in release_files if not f.get('yanked')])
+
+        releases.append((version, to_ordinal(release_files[0]['upload_time']), summary))
+
+    return releases
+
+
+def iter_pypi_releases(stream):
+    """
+    Yield (version, file list) for each release of a Pypi JSON document, every other key is skipped
+    """
+    reader = JsonStream(stream)
+
+    for key in reader.iter_object():
+        if key == 'releases':
+            for version in reader.iter_object():
+                yield version, reader.read_value()
+
+
+def parse_requires_dist(stream):
+    """
+    Return the requires_dist metadata (PEP 508 requirement strings) from the Pypi JSON document of a release
+    The rest of the document is not decoded
+    """
+    reader = JsonStream(stream)
+
+    for key in reader.iter_object():
+        if key == 'info':
+            for info_key in reader.iter_object():
+                if info_key == 'requires_dist':
+                    return reader.read_value() or []
+
+    return []
+
+
+def fetch_package_releases(package_name, client, cache=None, offline=False):
+    """
+    Return the (version, upload date ordinal, compatibility summary) of {package_name} or None if the package doesn't exist on Pypi
+    """
+    def request(headers):
+        return client.request(f"{quote(package_name)}/json", headers, parse_body=parse_pypi_releases)
+
+    return fetch_cached_releases(package_name, request, client.host, cache, offline)
+
+
+def fetch_cached_releases(package_name, request, host, cache=None, offline=False):
+    """
+    Return the releases of {package_name}, {request}(headers) retrieves them as (status, headers, releases)
+    Fresh cache entries are used as is, stale ones are revalidated using their ETag (If-None-Match)
+    In {offline} mode, only the cache is used
+    """
+    entry = cache.get(package_name) if cache is not None else None
+
+    if entry is not None and (offline or cache.is_fresh(entry)):
+        return entry['releases']
+    elif offline:
+        return None
+
+    headers = {}
+    if entry is not None and entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+
+    status, resp_headers, body = request(headers)
+
+    if status == 304:
+        releases = entry['releases']
+        # Same document, only the timestamp of the entry is updated
+        if resp_headers.get('ETag', entry['etag']) == entry['etag'] and cache.refresh(package_name):
+            return releases
+    elif status == 404:
+        releases = None
+    elif status == 200:
+        releases = body
+    else:
+        raise PypiUnreachableError(f"Unexpected HTTP {status} while retrieving '{package_name}' from {host}")
+
+    if cache is not None:
+        etag = resp_headers.get('ETag') or (entry['etag'] if entry is not None else None)
+        cache.put(package_name, releases, etag)
+
+    return releases
+
+
+def fetch_requires_dist(package_name, version, client, cache=None, offline=False):
+    """
+    Return the requirements of release {version} of {package_name} or None if the release doesn't exist on Pypi
+    """
+    entry = cache.get_requires_dist(package_name, version) if cache is not None else None
+
+    if entry is not None:
+        return entry['requires_dist']
+    elif offline:
+        return None
+
+    status, _, body = client.request(f"{quote(package_name)}/{quote(version)}/json", parse_body=parse_requires_dist)
+
+    if status == 404:
+        requires_dist = None
+    elif status == 200:
+        requires_dist = body
+    else:
+        raise PypiUnreachableError(f"Unexpected HTTP {status} while retrieving '{package_name}=={version}' from {client.host}")
+
+    if cache is not None:
+        cache.put_requires_dist(package_name, version, requires_dist)
+
+    return requires_dist
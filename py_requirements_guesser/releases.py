@@ -0,0 +1,155 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+
+def to_ordinal(day):
+    """
+    Convert a date, datetime or 'YYYY-MM-DD' string to its proleptic Gregorian ordinal
+    """
+    if isinstance(day, int):
+        return day
+    elif isinstance(day, str):
+        return datetime.strptime(day[:10], '%Y-%m-%d').toordinal()
+
+    return day.toordinal()
+
+
+def pack_compatibility(releases):
+    """
+    Compact form of the compatibility summaries (See compatibility.py) of {releases} [(version, ordinal, summary)]
+    for the release cache and snapshots
+    Each distinct wheel tag is stored once per package : {'tags': [...], 'releases': [[requires_python, has_sdist, [tag index]]]}
+    Return None when no release has a summary
+    """
+    if all(len(release) < 3 or release[2] is None for release in releases):
+        return None
+
+    tag_indexes = {}
+    packed = []
+    for release in releases:
+        if len(release) < 3 or release[2] is None:
+            packed.append(None)
+            continue
+
+        requires_python, has_sdist, tags = release[2]
+        packed.append([requires_python, int(has_sdist), [tag_indexes.setdefault(tag, len(tag_indexes)) for tag in tags]])
+
+    return {'tags': list(tag_indexes), 'releases': packed}
+
+
+def unpack_compatibility(releases, compatibility):
+    """
+    Inverse of pack_compatibility(), return the [(version, ordinal, summary)] releases
+    """
+    if compatibility is None:
+        return [(release[0], release[1], None) for release in releases]
+
+    tags = compatibility['tags']
+
+    return [(version, ordinal, (packed[0], bool(packed[1]), [tags[i] for i in packed[2]]) if packed is not None else None)
+            for (version, ordinal, *_), packed in zip(releases, compatibility['releases'])]
+
+
+class ReleaseIndex:
+    """
+    Release history of a package, sorted once by upload date
+    Dates are stored as ordinals in a compact array so that date lookups are binary searches
+    Releases are (version, date) or (version, date, compatibility summary) (See compatibility.py)
+    """
+
+    def __init__(self, releases=()):
+        releases = sorted(((release[0], to_ordinal(release[1]), release[2] if len(release) > 2 else None) for release in releases),
+                          key=lambda x: x[1])
+
+        self.versions = [version for version, _, _ in releases]
+        self.ordinals = array('l', (ordinal for _, ordinal, _ in releases))
+        self.summaries = [summary for _, _, summary in releases]
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __iter__(self):
+        """
+        Iterate over (version, release date) from the oldest to the newest release
+        """
+        for version, ordinal in zip(self.versions, self.ordinals):
+            yield version, date.fromordinal(ordinal)
+
+    def __contains__(self, version):
+        return version in self.versions
+
+    def filter(self, predicate):
+        """
+        Return a new index with the releases for which predicate(version) is True
+        """
+        index = ReleaseIndex()
+        for version, ordinal, summary in zip(self.versions, self.ordinals, self.summaries):
+            if predicate(version):
+                index.versions.append(version)
+                index.ordinals.append(ordinal)
+                index.summaries.append(summary)
+
+        return index
+
+    def compatible_with(self, target):
+        """
+        Return a new index with the releases installable on {target} (See compatibility.Target)
+        When some releases ship a wheel for the target, releases that would have to be built from source are left out too
+        """
+        ranks = dict(zip(self.versions, (target.rank(summary) for summary in self.summaries)))
+        best_rank = max(ranks.values(), default=0)
+
+        return self.filter(lambda version: ranks[version] > 0 and ranks[version] == best_rank)
+
+    def release_date(self, version):
+        """
+        Return the release date of {version} or None if it doesn't exist
+        """
+        try:
+            return date.fromordinal(self.ordinals[self.versions.index(version)])
+        except ValueError:
+            return None
+
+    def latest(self):
+        return self.versions[-1] if len(self.versions) > 0 else None
+
+    def version_at(self, day):
+        """
+        Return the latest version released on or before {day}
+        If {day} is older than all releases, fallback on the oldest available version
+        """
+        if len(self.versions) == 0:
+            return None
+
+        index = bisect_right(self.ordinals, to_ordinal(day))
+
+        return self.versions[max(index - 1, 0)]
+
+    def versions_at(self, days):
+        """
+        Batch version_at() for many dates (Reports), the dates are sorted once and matched in a single pass over the releases
+        """
+        ordinals = [to_ordinal(day) for day in days]
+
+        if len(self.versions) == 0:
+            return [None] * len(ordinals)
+
+        versions = [None] * len(ordinals)
+        index = 0
+        for i in sorted(range(len(ordinals)), key=ordinals.__getitem__):
+            while index < len(self.ordinals) and self.ordinals[index] <= ordinals[i]:
+                index += 1
+
+            versions[i] = self.versions[max(index - 1, 0)]
+
+        return versions
+
+    def releases_between(self, start, end):
+        """
+        Return the (version, release date) released between {start} and {end} (Inclusive), oldest first
+        """
+        first = bisect_left(self.ordinals, to_ordinal(start))
+        last = bisect_right(self.ordinals, to_ordinal(end))
+
+        return [(self.versions[i], date.fromordinal(self.ordinals[i])) for i in range(first, last)]
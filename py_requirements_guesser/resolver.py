@@ -0,0 +1,204 @@
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+from .backends import JsonApiBackend
+from .cache import normalize_package_name
+from .releases import to_ordinal
+from .instrumentation import tracer, bind_tracer
+from .versions import parse_version, parse_requirement, evaluate_marker, default_marker_environment
+from .utils import get_pypi_history
+
+
+class DependencyResolver:
+    """
+    Pin the transitive dependencies of the guessed packages
+
+    The dependency graph is walked one level at a time, the release histories and requires_dist metadata
+    of a whole level are fetched concurrently (At most backend.max_workers requests in flight)
+    Every dependency is pinned to the newest release, available at the date of the packages requiring it,
+    that satisfies all their version constraints. When no release was available at that date, the oldest
+    matching release is used
+
+    Release histories and requirements are memoized by package / release so subgraphs shared by multiple
+    packages are only fetched once (And cached on disk with the release cache)
+    """
+
+    def __init__(self, backend=None, environment=None, max_rounds=50, target=None):
+        self.backend = backend if backend is not None else JsonApiBackend()
+        self.environment = environment if environment is not None else default_marker_environment()
+        self.max_rounds = max_rounds
+        # Dependencies are pinned to releases installable on the target, its markers replace the running interpreter ones
+        self.target = target
+        if target is not None and environment is None:
+            self.environment = target.marker_environment(self.environment)
+
+        # Memoized Pypi data
+        self.histories = {}
+        self.requires = {}
+
+        # Dependencies we couldn't pin, with the reason
+        self.unresolved = {}
+        # Guessed packages that don't satisfy the constraints of other packages
+        self.conflicts = {}
+        # False when the pins still changed after {max_rounds} rounds
+        self.converged = True
+
+    def resolve(self, packages):
+        """
+        {packages}: {package_name: (version, date)} of the guessed packages, date ('YYYY-MM-DD') can be None
+                    (Release date of the version is then used)
+        Return the (package_name, version) of their dependencies, in the order they were discovered
+        """
+        roots = {normalize_package_name(name): {'name': name, 'version': version, 'date': day}
+                 for name, (version, day) in packages.items()}
+
+        pins = {}
+        nodes = {}
+        for _ in range(self.max_rounds):
+            nodes = self._walk(roots, pins)
+
+            # Packages discovered by the last level (And guessed packages we need the release date of)
+            new_nodes = [(key, node) for key, node in nodes.items()
+                         if key not in self.histories and (key not in roots or roots[key]['date'] is None)]
+
+            # Constraints might have changed since the last round, pins are recomputed
+            new_pins = {key: self._pin(key, node) for key, node in nodes.items() if key not in roots and key in self.histories}
+
+            releases = [(key, node['version']) for key, node in roots.items()]
+            releases += [(key, version) for key, version in new_pins.items() if version is not None]
+            releases = [(nodes[key]['name'], version) for key, version in releases if (key, version) not in self.requires]
+
+            if new_pins == pins and len(new_nodes) == 0 and len(releases) == 0:
+                break
+
+            pins = new_pins
+            self._fetch_level(new_nodes, releases)
+        else:
+            self.converged = False
+
+        self.unresolved = {nodes[key]['name']: 'no_matching_version' for key, version in pins.items() if version is None}
+        self._check_conflicts(roots, nodes)
+
+        return [(nodes[key]['name'], version) for key, version in pins.items() if version is not None and key in nodes]
+
+    def _fetch_level(self, new_nodes, releases):
+        """
+        Fetch the data of one level of the graph concurrently
+        The history of a new dependency is followed, in the same task, by the requirements of the release it gets pinned to
+        """
+        def fetch_requires(package_name, version):
+            key = (normalize_package_name(package_name), version)
+            if key in self.requires:
+                return
+
+            with tracer.phase('pypi_requires', package=package_name):
+                self.requires[key] = self.backend.get_requires_dist(package_name, version)
+
+        def fetch_node(key, node):
+            with tracer.phase('pypi_package', package=node['name']):
+                self.histories[key] = get_pypi_history(node['name'], True, backend=self.backend, target=self.target)
+
+            if node['version'] is None:
+                version = self._pin(key, node)
+                if version is not None:
+                    fetch_requires(node['name'], version)
+
+        tasks = [(fetch_node, key, node) for key, node in new_nodes] + [(fetch_requires, name, version) for name, version in releases]
+        if len(tasks) == 0:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.backend.max_workers, len(tasks)))) as executor:
+            # Consume the results so that errors are raised
+            list(executor.map(bind_tracer(lambda task: task[0](*task[1:])), tasks))
+
+    def _walk(self, roots, pins):
+        """
+        Walk the graph from the guessed packages through the current pins
+        Return {package key: {'name', 'version', 'constraints', 'extras', 'date'}} of every reachable package
+        A dependency date is the most recent date of the packages requiring it
+        """
+        nodes = {}
+        for key, root in roots.items():
+            day = root['date']
+            if day is None and self.histories.get(key) is not None:
+                day = self.histories[key].release_date(root['version'])
+
+            nodes[key] = {'name': root['name'], 'version': root['version'], 'constraints': {}, 'extras': set(),
+                          'date': to_ordinal(day) if day is not None else date.today().toordinal()}
+
+        queue = list(roots)
+        expanded = set()
+        while queue:
+            key = queue.pop(0)
+            node = nodes[key]
+            version = node['version'] if key in roots else pins.get(key)
+
+            expansion = (key, version, frozenset(node['extras']), node['date'])
+            if version is None or expansion in expanded:
+                continue
+            expanded.add(expansion)
+
+            for requirement in self._get_requirements(key, version, node['extras']):
+                child_key = normalize_package_name(requirement['name'])
+
+                if child_key not in nodes:
+                    nodes[child_key] = {'name': requirement['name'], 'version': None, 'constraints': {}, 'extras': set(),
+                                        'date': node['date']}
+
+                child = nodes[child_key]
+                child['constraints'][node['name']] = requirement['specifier']
+
+                if child_key not in roots and (node['date'] > child['date'] or not requirement['extras'] <= child['extras']):
+                    child['date'] = max(child['date'], node['date'])
+                    child['extras'] |= requirement['extras']
+
+                queue.append(child_key)
+
+        return nodes
+
+    def _get_requirements(self, key, version, extras):
+        """
+        Requirements of a release that apply to the current environment and requested {extras}
+        """
+        requirements = []
+        for requirement in self.requires.get((key, version)) or []:
+            requirement = parse_requirement(requirement)
+            if requirement is None:
+                continue
+
+            if requirement['marker']:
+                try:
+                    if not evaluate_marker(requirement['marker'], self.environment, extras):
+                        continue
+                except ValueError:
+                    continue
+
+            requirements.append(requirement)
+
+        return requirements
+
+    def _pin(self, key, node):
+        """
+        Newest release available at the node date satisfying all constraints (Or the oldest matching release)
+        """
+        history = self.histories[key]
+        if history is None:
+            return None
+
+        matching = [(version, release_date) for version, release_date in history
+                    if all(specifier.contains(version) for specifier in node['constraints'].values())]
+
+        if len(matching) == 0:
+            return None
+
+        available = [version for version, release_date in matching if release_date.toordinal() <= node['date']]
+        if len(available) == 0:
+            return matching[0][0]
+
+        return max(available, key=lambda version: parse_version(version) or ())
+
+    def _check_conflicts(self, roots, nodes):
+        for key, root in roots.items():
+            for required_by, specifier in nodes[key]['constraints'].items():
+                if not specifier.contains(root['version']):
+                    self.conflicts.setdefault(root['name'], []).append(f"{required_by} requires {root['name']}{specifier}")
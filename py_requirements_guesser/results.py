@@ -0,0 +1,95 @@
+from datetime import datetime
+from typing import NamedTuple, Optional, List, Dict, Tuple
+
+from .utils import get_requirements_txt_lines
+
+
+# Why a package got its version (Or why it was skipped)
+REASONS = {
+    'requirements.txt': "Version pinned in requirements.txt (Or another dependency manifest)",
+    'lockfile': "Version locked in poetry.lock, Pipfile.lock or a constraints file",
+    'previous_run': "Unchanged since the previous run, its version was reused",
+    'single_candidate': "Only one of the first import / first requirement dates is known",
+    'same_version': "The first import and first requirement dates resolve to the same version",
+    'policy': "Chosen by the decision policy",
+    'user_choice': "Chosen by the user",
+    'not_on_pypi': "No release on Pypi",
+    'not_in_cache': "Not in the release cache (Offline)",
+    'incompatible': "No release can be installed on the target python version / platform",
+    'unused': "Declared as a requirement but never imported",
+    'not_found': "Requested (--only) but neither imported nor declared as a requirement",
+    'no_version': "No release available at the candidate date"
+}
+
+
+class Candidate(NamedTuple):
+    """
+    Version that was available on Pypi at the date of a git history event
+    source: 'first_import' (First commit importing the package) or 'first_requirement' (First commit declaring it in a requirements
+            file, setup.py, setup.cfg, pyproject.toml or Pipfile)
+    """
+    source: str
+    date: datetime
+    version: Optional[str]
+
+
+class PackageResult(NamedTuple):
+    """
+    Outcome for a single package, version is None when the package was skipped (See REASONS)
+    source: Candidate the version comes from ('first_import' or 'first_requirement'), None otherwise
+    date: Date of the chosen candidate ('YYYY-MM-DD')
+    """
+    package_name: str
+    import_name: str
+    version: Optional[str]
+    reason: str
+    source: Optional[str] = None
+    date: Optional[str] = None
+    in_requirements: bool = False
+    candidates: Tuple[Candidate, ...] = ()
+
+
+class GuessResult(NamedTuple):
+    """
+    Outcome of the analysis of a repository
+    packages: Every package imported or declared as a requirement, skipped ones included
+    dependencies: (package_name, version) of the pinned transitive dependencies
+    state: Pass it to the next analysis of the repository so that only the new commits are processed
+    subproject: Path of the analysed sub-project of a monorepo, relative to {repo_path}
+    """
+    repo_path: str
+    commit: Optional[str]
+    packages: List[PackageResult]
+    dependencies: List[Tuple[str, str]]
+    skipped: Dict[str, str]
+    state: Optional[dict] = None
+    subproject: Optional[str] = None
+
+    @property
+    def versions(self):
+        """
+        (package_name, version) of the packages that were attributed a version
+        """
+        return [(p.package_name, p.version) for p in self.packages if p.version is not None]
+
+    @property
+    def requirements(self):
+        """
+        Content of the requirements.txt file
+        """
+        return get_requirements_txt_lines(self.versions + self.dependencies)
+
+    def to_dict(self):
+        """
+        JSON serializable version of the result (Without the state), dates are 'YYYY-MM-DD'
+        """
+        return {
+            'repo_path': self.repo_path,
+            'subproject': self.subproject,
+            'commit': self.commit,
+            'packages': [dict(package._asdict(), candidates=[dict(c._asdict(), date=c.date.strftime("%Y-%m-%d")) for c in package.candidates])
+                         for package in self.packages],
+            'dependencies': [{'package_name': package_name, 'version': version} for package_name, version in self.dependencies],
+            'skipped': self.skipped,
+            'requirements': self.requirements
+        }
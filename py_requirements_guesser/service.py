@@ -0,0 +1,388 @@
+import os
+import re
+import json
+import stat
+import time
+import shutil
+import asyncio
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from .api import RequirementsGuesser
+from .guesser import STRATEGIES
+from .compatibility import Target
+from .cache import ReleaseCache, MemoryCache
+from .backends import create_backend, MemoryCachedBackend
+from .history import get_head_commit, is_ancestor_commit
+from .errors import GuesserError, NotAGitRepositoryError
+from .pypi import PypiUnreachableError
+from .instrumentation import Tracer, get_tracer, use_tracer, tracer
+from .utils import validate_cwd_is_git_repo
+
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 422: 'Unprocessable Entity',
+                500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable'}
+MAX_REQUEST_BYTES = 1024 * 1024
+# Commit shas, branches and tags (Never an option of git)
+COMMIT_REGEX = re.compile(r'^[\w.^~/@{}][\w.^~/@{}-]*$')
+
+
+class BadRequestError(Exception):
+    pass
+
+
+def parse_job(body):
+    """
+    Validate the JSON body of a /guess request
+    """
+    try:
+        job = json.loads(body or b'{}')
+    except ValueError:
+        raise BadRequestError("Invalid JSON body")
+
+    if not isinstance(job, dict) or not isinstance(job.get('repo_path'), str):
+        raise BadRequestError("'repo_path' is required")
+
+    commit = job.get('commit')
+    if commit is not None and (not isinstance(commit, str) or not COMMIT_REGEX.match(commit)):
+        raise BadRequestError(f"Invalid commit '{commit}'")
+
+    policy = job.get('policy', 'first_import')
+    if policy not in STRATEGIES:
+        raise BadRequestError(f"Unknown policy '{policy}', should be one of {STRATEGIES}")
+
+    force_guess = job.get('force_guess')
+    if force_guess is not None and (not isinstance(force_guess, list) or not all(isinstance(m, str) for m in force_guess)):
+        raise BadRequestError("'force_guess' should be a list of module names")
+
+    target = None
+    if job.get('python_version') is not None or job.get('platform') is not None:
+        if not all(isinstance(job.get(key), (str, type(None))) for key in ('python_version', 'platform')):
+            raise BadRequestError("'python_version' and 'platform' should be strings")
+
+        try:
+            target = Target(job.get('python_version'), job.get('platform'))
+        except ValueError as e:
+            raise BadRequestError(str(e))
+
+    return {
+        'repo_path': job['repo_path'],
+        'target': target,
+        'commit': commit,
+        'policy': policy,
+        'force_guess': force_guess,
+        'keep_unused_packages': bool(job.get('keep_unused_packages', False)),
+        'pin_dependencies': bool(job.get('pin_dependencies', False))
+    }
+
+
+async def read_request(reader):
+    """
+    Return the (method, path, body) of an HTTP/1.1 request
+    """
+    request_line = (await reader.readline()).decode('latin-1').split()
+    if len(request_line) != 3:
+        raise BadRequestError("Invalid request line")
+
+    method, target, _ = request_line
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    content_length = headers.get('content-length', '0')
+    if not content_length.isdigit() or int(content_length) > MAX_REQUEST_BYTES:
+        raise BadRequestError("Invalid Content-Length")
+
+    body = await reader.readexactly(int(content_length)) if int(content_length) > 0 else b''
+
+    return method, target.split('?')[0], body
+
+
+class GuessService:
+    """
+    Long running guesser answering jobs over a local HTTP or unix socket API (See run_service())
+
+        POST /guess  {"repo_path": ..., "commit": ..., "policy": ..., "pin_dependencies": ..., "force_guess": [...], "keep_unused_packages": ...,
+                      "python_version": ..., "platform": ...}
+        GET  /stats  Queue depth, jobs counters and hit ratios of the in memory caches
+        GET  /health
+
+    Requests are handled by an asyncio loop, the jobs are queued and run by {workers} threads
+    Everything a cold run pays for is kept warm in memory between jobs :
+        - The pipreqs mapping table (Shared by the whole process)
+        - The Pypi release histories and requirements, in a LRU of {memory_cache_size} entries (Backed by the on disk release cache)
+        - The git history index of the last {max_history_indexes} analysed commits, a job only indexes the commits made since
+          the most recent cached index of its repository that is an ancestor of the analysed commit
+
+    Jobs with a {commit} are analysed in a temporary worktree of the repository checked out at that commit
+    Jobs without python_version / platform use the {target} of the service (None considers all releases)
+    The on disk {release_cache} defaults to the user cache directory
+    """
+
+    def __init__(self, workers=4, max_queue=256, max_history_indexes=32, memory_cache_size=20000, index_url=None, index_type='json',
+                 snapshot=None, offline=False, pypi_concurrency=8, cache_ttl=24*60*60, cache_max_size=100*1024*1024, target=None,
+                 release_cache=None):
+        release_cache = release_cache if release_cache is not None else ReleaseCache(ttl=cache_ttl, max_size=cache_max_size)
+        backend = create_backend(index_url, index_type, snapshot, release_cache, offline, pypi_concurrency)
+
+        self.pypi_backend = MemoryCachedBackend(backend, memory_cache_size, cache_ttl)
+        self.guesser = RequirementsGuesser(release_cache=release_cache, pypi_backend=self.pypi_backend)
+        # (repository path, head) -> GitHistoryIndex.to_dict()
+        self.history_indexes = MemoryCache(max_history_indexes)
+
+        self.target = target
+        self.workers = workers
+        self.max_queue = max_queue
+        self.started_at = time.time()
+
+        # Only modified from the event loop
+        self.nb_running = 0
+        self.nb_completed = 0
+        self.nb_failed = 0
+        self.job_seconds = 0
+
+        self._queue = None
+        self._executor = None
+        self._tasks = []
+
+    def get_history_state(self, repo_path, analysed_path):
+        """
+        State (See Guesser.get_state()) with the most recent cached history index of {repo_path} that can be brought up to date
+        with the commit checked out in {analysed_path}. The decisions of previous jobs are never reused, policies can differ
+        """
+        head = get_head_commit(analysed_path)
+
+        for (cached_repo_path, cached_head), _ in reversed(self.history_indexes.items()):
+            if cached_repo_path != repo_path:
+                continue
+
+            if cached_head == head or is_ancestor_commit(cached_head, repo_path=analysed_path):
+                found, history = self.history_indexes.get((cached_repo_path, cached_head))
+
+                if found:
+                    # The index is updated in place by the guesser, the cached one is shared with other jobs
+                    return {
+                        'history': dict(history, import_dates=dict(history['import_dates']),
+                                        requirement_dates=dict(history['requirement_dates'])),
+                        'packages': {}
+                    }
+
+        # Counted as a miss
+        self.history_indexes.get((repo_path, head))
+
+        return None
+
+    def checkout(self, repo_path, commit):
+        """
+        Create a temporary worktree of {repo_path} at {commit}, return its path
+        """
+        worktree_path = os.path.join(tempfile.mkdtemp(prefix='py-reqs-guesser-'), 'worktree')
+
+        tracer.record_subprocess('git worktree add')
+        try:
+            subprocess.check_output(['git', 'worktree', 'add', '--detach', '--force', worktree_path, commit], cwd=repo_path,
+                                    stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(os.path.dirname(worktree_path), ignore_errors=True)
+            raise GuesserError(f"Couldn't checkout commit '{commit}' of '{repo_path}' : {e.output.decode(errors='replace').strip()}")
+
+        return worktree_path
+
+    def remove_worktree(self, repo_path, worktree_path):
+        tracer.record_subprocess('git worktree remove')
+        subprocess.call(['git', 'worktree', 'remove', '--force', worktree_path], cwd=repo_path,
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(os.path.dirname(worktree_path), ignore_errors=True)
+
+    def run_job(self, job):
+        """
+        Analyse a repository (Run in a worker thread), return the JSON serializable result
+        """
+        repo_path = os.path.realpath(job['repo_path'])
+
+        if not validate_cwd_is_git_repo(repo_path):
+            raise NotAGitRepositoryError(f"'{job['repo_path']}' is not a git repository")
+
+        # Jobs run concurrently, each one has its own tracer
+        with use_tracer(Tracer(parent=get_tracer())) as job_tracer:
+            worktree_path = self.checkout(repo_path, job['commit']) if job['commit'] else None
+            analysed_path = worktree_path or repo_path
+
+            try:
+                result = self.guesser.guess(analysed_path, job['policy'], job['force_guess'], job['keep_unused_packages'],
+                                            job['pin_dependencies'], state=self.get_history_state(repo_path, analysed_path),
+                                            target=job['target'] or self.target, tracer=job_tracer)
+            finally:
+                if worktree_path is not None:
+                    self.remove_worktree(repo_path, worktree_path)
+
+        history = result.state['history']
+        if history['head'] is not None:
+            self.history_indexes.put((repo_path, history['head']), history)
+
+        return dict(result.to_dict(), repo_path=repo_path)
+
+    async def _run_jobs(self):
+        loop = asyncio.get_event_loop()
+
+        while True:
+            job, future, queued_at = await self._queue.get()
+            started_at = time.perf_counter()
+            self.nb_running += 1
+
+            try:
+                result = await loop.run_in_executor(self._executor, self.run_job, job)
+                response = 200, dict(result, queued_seconds=started_at - queued_at, seconds=time.perf_counter() - started_at)
+            except PypiUnreachableError as e:
+                response = 502, {'error': str(e)}
+            except GuesserError as e:
+                response = 422, {'error': str(e)}
+            except Exception as e:
+                response = 500, {'error': f"{type(e).__name__}: {e}"}
+
+            self.nb_running -= 1
+            self.job_seconds += time.perf_counter() - started_at
+            if response[0] == 200:
+                self.nb_completed += 1
+            else:
+                self.nb_failed += 1
+
+            # The client might have disconnected in the meantime
+            if not future.done():
+                future.set_result(response)
+
+    async def handle_request(self, reader):
+        method, path, body = await read_request(reader)
+
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        elif path == '/stats':
+            return 200, self.stats()
+        elif path != '/guess':
+            return 404, {'error': f"Unknown endpoint '{path}'"}
+        elif method != 'POST':
+            return 405, {'error': "Use POST to submit a job"}
+
+        job = parse_job(body)
+
+        if self._queue.full():
+            return 503, {'error': f"Too many queued jobs ({self.max_queue})"}
+
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait((job, future, time.perf_counter()))
+
+        return await future
+
+    async def handle_connection(self, reader, writer):
+        try:
+            status, response = await self.handle_request(reader)
+        except (BadRequestError, asyncio.IncompleteReadError) as e:
+            status, response = 400, {'error': str(e)}
+
+        body = json.dumps(response).encode()
+        writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+
+        try:
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    def stats(self):
+        nb_jobs = self.nb_completed + self.nb_failed
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'running': self.nb_running,
+            'completed': self.nb_completed,
+            'failed': self.nb_failed,
+            'mean_job_seconds': self.job_seconds / nb_jobs if nb_jobs > 0 else None,
+            'caches': {
+                'releases': self.pypi_backend.releases.stats(),
+                'requires': self.pypi_backend.requires.stats(),
+                'history_indexes': self.history_indexes.stats()
+            }
+        }
+
+    async def start(self, address):
+        """
+        Listen on {address} : 'host:port' or 'unix:{path}'
+        """
+        if address.startswith('unix:'):
+            # Left by a previous instance
+            remove_socket_file(address[len('unix:'):])
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._tasks = [asyncio.ensure_future(self._run_jobs()) for _ in range(self.workers)]
+
+        if address.startswith('unix:'):
+            return await asyncio.start_unix_server(self.handle_connection, path=address[len('unix:'):])
+
+        host, _, port = address.rpartition(':')
+
+        return await asyncio.start_server(self.handle_connection, host or '127.0.0.1', int(port))
+
+    async def stop(self):
+        """
+        Stop taking jobs, the running ones finish in the background
+        """
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def remove_socket_file(socket_path):
+    """
+    Remove the unix socket at {socket_path}, raise ValueError if something else than a socket is there
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"'{socket_path}' already exists and is not a socket, refusing to remove it")
+
+    os.remove(socket_path)
+
+
+def run_service(address, **options):
+    """
+    Run a GuessService until interrupted (--serve)
+    """
+    service = GuessService(**options)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(service.start(address))
+
+    print(f"Serving on {address} with {service.workers} workers (POST /guess, GET /stats, GET /health)")
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(service.stop())
+        loop.close()
+
+        if address.startswith('unix:'):
+            remove_socket_file(address[len('unix:'):])
@@ -0,0 +1,173 @@
+import re
+import html
+import threading
+from email.parser import HeaderParser
+from urllib.parse import urljoin, urlsplit, quote
+
+from .json_stream import JsonStream
+from .pypi import PypiClient, PypiUnreachableError
+from .releases import to_ordinal
+from .compatibility import summarize_release_files
+from .cache import normalize_package_name
+
+
+# PEP 691 (JSON) is preferred, mirrors that only serve the PEP 503 HTML pages are supported as well
+SIMPLE_INDEX_ACCEPT = "application/vnd.pypi.simple.v1+json, text/html;q=0.1"
+SIMPLE_INDEX_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+ANCHOR_REGEX = re.compile(r'<a\s+([^>]*)>([^<]*)</a>', re.IGNORECASE)
+ATTRIBUTE_REGEX = re.compile(r'([\w-]+)\s*=\s*"([^"]*)"')
+DISTRIBUTION_EXTENSIONS = ('.whl', '.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.zip', '.egg')
+
+
+def get_filename_version(package_name, filename):
+    """
+    Return the version of a distribution file or None ('six-1.16.0-py2.py3-none-any.whl' -> '1.16.0')
+    """
+    extension = next((e for e in DISTRIBUTION_EXTENSIONS if filename.endswith(e)), None)
+    if extension is None:
+        return None
+
+    stem = filename[:-len(extension)]
+
+    if extension in ('.whl', '.egg'):
+        parts = stem.split('-')
+        return parts[1] if len(parts) > 1 else None
+
+    # Source distributions are {name}-{version}, the name itself can contain dashes
+    normalized_name = normalize_package_name(package_name)
+    for i in range(len(stem)):
+        if stem[i] == '-' and normalize_package_name(stem[:i]) == normalized_name:
+            return stem[i + 1:]
+
+    return None
+
+
+def iter_simple_index_files(stream, content_type):
+    """
+    Yield {'filename', 'url', 'upload_time', 'requires_python', 'core_metadata', 'yanked'} for each file of a simple index project page
+    """
+    if content_type.startswith(SIMPLE_INDEX_JSON_CONTENT_TYPE):
+        reader = JsonStream(stream)
+
+        for key in reader.iter_object():
+            if key == 'files':
+                for _ in reader.iter_array():
+                    file_info = reader.read_value()
+                    yield {
+                        'filename': file_info['filename'],
+                        'url': file_info['url'],
+                        'upload_time': file_info.get('upload-time'),
+                        'requires_python': file_info.get('requires-python'),
+                        'core_metadata': bool(file_info.get('core-metadata', file_info.get('dist-info-metadata'))),
+                        'yanked': bool(file_info.get('yanked'))
+                    }
+    else:
+        for attributes, text in ANCHOR_REGEX.findall(stream.read().decode('utf-8', errors='replace')):
+            attributes = {name.lower(): html.unescape(value) for name, value in ATTRIBUTE_REGEX.findall(attributes)}
+            core_metadata = attributes.get('data-core-metadata', attributes.get('data-dist-info-metadata'))
+
+            yield {
+                'filename': html.unescape(text.strip()),
+                'url': attributes.get('href', ''),
+                'upload_time': attributes.get('data-upload-time'),
+                'requires_python': attributes.get('data-requires-python'),
+                'core_metadata': core_metadata is not None and core_metadata != 'false',
+                'yanked': 'data-yanked' in attributes
+            }
+
+
+def parse_simple_index_page(package_name, stream, content_type):
+    """
+    Return the releases (version, upload date ordinal of the first file, compatibility summary) and the core metadata url
+    of each release. Files without upload time (Mirrors not implementing PEP 700) can't be dated and are ignored
+    """
+    upload_dates = {}
+    release_files = {}
+    metadata_urls = {}
+    for file_info in iter_simple_index_files(stream, content_type):
+        version = get_filename_version(package_name, file_info['filename'])
+        if version is None or file_info['yanked']:
+            continue
+
+        if file_info['core_metadata'] and version not in metadata_urls:
+            metadata_urls[version] = file_info['url'].split('#')[0] + '.metadata'
+
+        if file_info['upload_time']:
+            ordinal = to_ordinal(file_info['upload_time'])
+            upload_dates[version] = min(ordinal, upload_dates.get(version, ordinal))
+
+        release_files.setdefault(version, []).append((file_info['filename'], file_info['requires_python']))
+
+    releases = [(version, ordinal, summarize_release_files(release_files[version])) for version, ordinal in upload_dates.items()]
+
+    return releases, metadata_urls
+
+
+def parse_core_metadata(stream):
+    """
+    Return the Requires-Dist of a core metadata file (PKG-INFO / METADATA format)
+    """
+    headers = HeaderParser().parsestr(stream.read().decode('utf-8', errors='replace'), headersonly=True)
+
+    return headers.get_all('Requires-Dist') or []
+
+
+class SimpleIndexClient:
+    """
+    Client for a PEP 691 / PEP 503 simple repository (Pypi or a local mirror)
+    Core metadata files (PEP 658) can be hosted on another server than the index, one client is used per host
+    """
+
+    def __init__(self, index_url, max_workers=8, **client_options):
+        self.index_url = index_url.rstrip('/') + '/'
+        self.max_workers = max_workers
+        self.host = urlsplit(self.index_url).netloc
+        self.client_options = dict(client_options, max_workers=max_workers)
+
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _get_client(self, url):
+        """
+        Return the client of the host serving {url} and the path to request
+        """
+        url = urlsplit(url)
+        key = (url.scheme, url.netloc)
+
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = PypiClient(f"{url.scheme}://{url.netloc}", **self.client_options)
+
+            client = self._clients[key]
+
+        return client, url.path + (f"?{url.query}" if url.query else '')
+
+    def get_project_page(self, package_name, headers=None):
+        """
+        Return (status, response headers, (releases, metadata urls)) for the project page of {package_name}
+        """
+        project_url = urljoin(self.index_url, quote(normalize_package_name(package_name)) + '/')
+
+        def parse_body(resp):
+            releases, metadata_urls = parse_simple_index_page(package_name, resp, resp.headers.get('Content-Type', 'text/html'))
+
+            # Links are relative to the project page
+            return releases, {version: urljoin(project_url, url) for version, url in metadata_urls.items()}
+
+        client, path = self._get_client(project_url)
+
+        return client.request(path, dict(headers or {}, Accept=SIMPLE_INDEX_ACCEPT), parse_body)
+
+    def get_requires_dist(self, metadata_url):
+        """
+        Return the requirements from a core metadata file or None if it doesn't exist
+        """
+        client, path = self._get_client(metadata_url)
+        status, _, body = client.request(path, parse_body=parse_core_metadata)
+
+        if status == 404:
+            return None
+        elif status != 200:
+            raise PypiUnreachableError(f"Unexpected HTTP {status} while retrieving '{metadata_url}'")
+
+        return body
@@ -0,0 +1,122 @@
+import json
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import normalize_package_name
+from .releases import pack_compatibility, unpack_compatibility
+from .index_file import SortedTable, write_sorted_table
+from .instrumentation import bind_tracer
+
+
+# The snapshot is a sorted table (See index_file.py) :
+#     h:{package}           -> number of releases (uint32) | upload date ordinals (int32) | versions separated by \0
+#     c:{package}           -> packed compatibility summaries of the releases, same order as h: (JSON, see releases.py)
+#     r:{package}=={version} -> requires_dist separated by \n
+#     m:format              -> SNAPSHOT_FORMAT
+SNAPSHOT_FORMAT = b'release-snapshot-1'
+FORMAT_KEY = b'm:format'
+HISTORY_PREFIX = b'h:'
+COMPATIBILITY_PREFIX = b'c:'
+REQUIRES_PREFIX = b'r:'
+
+
+def encode_releases(releases):
+    versions = [release[0].encode() for release in releases]
+    ordinals = [release[1] for release in releases]
+
+    return struct.pack(f'<I{len(ordinals)}i', len(ordinals), *ordinals) + b'\0'.join(versions)
+
+
+def decode_releases(value):
+    count = struct.unpack_from('<I', value, 0)[0]
+    ordinals = struct.unpack_from(f'<{count}i', value, 4)
+    versions = value[4 + 4 * count:].decode().split('\0') if count > 0 else []
+
+    return list(zip(versions, ordinals))
+
+
+def write_snapshot(filepath, histories, requires=None):
+    """
+    Write the release {histories} ({package_name: [(version, upload date ordinal, compatibility summary)]}) and optionally the
+    {requires} ({(package_name, version): requires_dist}) of many packages to a snapshot file
+    Packages that don't exist (None) are left out
+    """
+    items = [(FORMAT_KEY, SNAPSHOT_FORMAT)]
+    items += [(HISTORY_PREFIX + normalize_package_name(name).encode(), encode_releases(releases))
+              for name, releases in histories.items() if releases is not None]
+    items += [(COMPATIBILITY_PREFIX + normalize_package_name(name).encode(), json.dumps(compatibility, separators=(',', ':')).encode())
+              for name, compatibility in ((name, pack_compatibility(releases)) for name, releases in histories.items() if releases is not None)
+              if compatibility is not None]
+    items += [(REQUIRES_PREFIX + f"{normalize_package_name(name)}=={version}".encode(), '\n'.join(requires_dist).encode())
+              for (name, version), requires_dist in (requires or {}).items() if requires_dist is not None]
+
+    write_sorted_table(filepath, items)
+
+    return len(items) - 1
+
+
+class ReleaseSnapshot:
+    """
+    Memory mapped snapshot of the release histories of many packages, lookups are binary searches in the file
+    """
+
+    def __init__(self, filepath):
+        self.table = SortedTable(filepath)
+
+        if self.table.get(FORMAT_KEY) != SNAPSHOT_FORMAT:
+            raise ValueError(f"'{filepath}' is not a release snapshot")
+
+    def __contains__(self, package_name):
+        return HISTORY_PREFIX + normalize_package_name(package_name).encode() in self.table
+
+    def get_releases(self, package_name):
+        """
+        Return the (version, upload date ordinal, compatibility summary) of {package_name} or None if it isn't in the snapshot
+        Snapshots built before the summaries were cached have none
+        """
+        key = normalize_package_name(package_name).encode()
+        value = self.table.get(HISTORY_PREFIX + key)
+
+        if value is None:
+            return None
+
+        compatibility = self.table.get(COMPATIBILITY_PREFIX + key)
+
+        return unpack_compatibility(decode_releases(value), json.loads(compatibility.decode()) if compatibility is not None else None)
+
+    def get_requires_dist(self, package_name, version):
+        value = self.table.get(REQUIRES_PREFIX + f"{normalize_package_name(package_name)}=={version}".encode())
+
+        if value is None:
+            return None
+
+        return value.decode().split('\n') if len(value) > 0 else []
+
+    def close(self):
+        self.table.close()
+
+
+def build_snapshot(filepath, package_names=None, backend=None, cache=None):
+    """
+    Build a snapshot from the content of the release {cache} and the histories of {package_names} (Retrieved with {backend})
+    Return the number of packages in the snapshot
+    """
+    histories = {}
+    requires = {}
+
+    if cache is not None:
+        for package_name, version, entry in cache.iter_entries():
+            if version is None:
+                histories[package_name] = entry['releases']
+            else:
+                requires[(package_name, version)] = entry['requires_dist']
+
+    missing = [p for p in (package_names or []) if normalize_package_name(p) not in histories]
+    if len(missing) > 0:
+        with ThreadPoolExecutor(max_workers=backend.max_workers) as executor:
+            for package_name, releases in zip(missing, executor.map(bind_tracer(backend.get_releases), missing)):
+                histories[normalize_package_name(package_name)] = releases
+
+    write_snapshot(filepath, histories, requires)
+
+    return len([releases for releases in histories.values() if releases is not None])
@@ -0,0 +1,54 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from .cache import CACHE_ROOT
+
+
+# Bumped whenever the layout of the state file change, older states are ignored
+STATE_FORMAT_VERSION = 2
+
+
+def get_state_filepath(repo_path='.'):
+    """
+    Default state file of a repository, keyed on its absolute path
+    """
+    repo_hash = hashlib.sha1(os.path.abspath(repo_path).encode()).hexdigest()[:16]
+
+    return f"{CACHE_ROOT}/state/{repo_hash}.json"
+
+
+def load_state(filepath):
+    """
+    Load the analysis state saved by a previous run
+    {
+        'history': GitHistoryIndex.to_dict(),
+        'packages': {
+            normalized_name: {'import_date', 'requirement_date', 'in_requirements', 'specifier', 'version', 'choice',
+                                     'date', 'commit'}
+        }
+    }
+    Return None if there is no (valid) state
+    """
+    try:
+        with open(filepath, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if state.get('format') != STATE_FORMAT_VERSION:
+        return None
+
+    return state
+
+
+def save_state(filepath, state):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_filepath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(dict(state, format=STATE_FORMAT_VERSION), f)
+
+    os.replace(tmp_filepath, filepath)
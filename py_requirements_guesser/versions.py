@@ -0,0 +1,289 @@
+import re
+import os
+import sys
+import platform
+
+from .cache import normalize_package_name
+
+
+# Subset of PEP 440 / PEP 508, enough to follow the requires_dist metadata of Pypi packages
+VERSION_REGEX = re.compile(r'''
+    ^\s*v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_letter>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_number>[0-9]+)?)?
+    (?:-(?P<post_implicit>[0-9]+)|[-_.]?(?P<post_letter>post|rev|r)[-_.]?(?P<post_number>[0-9]+)?)?
+    (?:[-_.]?(?P<dev_letter>dev)[-_.]?(?P<dev_number>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+''', re.VERBOSE | re.IGNORECASE)
+SPECIFIER_REGEX = re.compile(r'^\s*(===|==|!=|~=|<=|>=|<|>)\s*([^\s]+)\s*$')
+REQUIREMENT_REGEX = re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?\s*([^;]*?)\s*(?:;\s*(.*))?$')
+MARKER_TOKEN_REGEX = re.compile(r'''\s*(\(|\)|===|==|!=|~=|<=|>=|<|>|'[^']*'|"[^"]*"|[A-Za-z_][A-Za-z0-9_.]*)''')
+
+PRE_RELEASE_RANKS = {'a': 0, 'alpha': 0, 'b': 1, 'beta': 1, 'c': 2, 'rc': 2, 'pre': 2, 'preview': 2}
+VERSION_MARKERS = {'python_version', 'python_full_version', 'implementation_version'}
+
+
+def parse_version(version):
+    """
+    Return a sortable key for {version} or None if it isn't a valid PEP 440 version
+    Local versions (+xxx) are ignored
+    """
+    matches = VERSION_REGEX.match(version)
+    if not matches:
+        return None
+
+    release = [int(part) for part in matches.group('release').split('.')]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    has_post = matches.group('post_implicit') is not None or matches.group('post_letter') is not None
+    has_dev = matches.group('dev_letter') is not None
+
+    if matches.group('pre_letter'):
+        pre = (PRE_RELEASE_RANKS[matches.group('pre_letter').lower()], int(matches.group('pre_number') or 0))
+    elif has_dev and not has_post:
+        # 1.0.dev1 < 1.0a1
+        pre = (-1, 0)
+    else:
+        pre = (3, 0)
+
+    post = (1, int(matches.group('post_implicit') or matches.group('post_number') or 0)) if has_post else (0, 0)
+    dev = (0, int(matches.group('dev_number') or 0)) if has_dev else (1, 0)
+
+    return int(matches.group('epoch') or 0), tuple(release), pre, post, dev
+
+
+def is_prerelease(version):
+    key = parse_version(version)
+    return key is not None and (key[2] != (3, 0) or key[4] != (1, 0))
+
+
+class SpecifierSet:
+    """
+    Comma separated version specifiers ('>=1.2,<2', '~=3.1', '==1.*', ...)
+    """
+
+    def __init__(self, specifiers=''):
+        self.specifiers = []
+
+        for specifier in specifiers.split(','):
+            if len(specifier.strip()) == 0:
+                continue
+
+            matches = SPECIFIER_REGEX.match(specifier)
+            if not matches:
+                raise ValueError(f"Invalid version specifier '{specifier}'")
+
+            self.specifiers.append((matches.group(1), matches.group(2)))
+
+    def __str__(self):
+        return ','.join(operator + version for operator, version in self.specifiers)
+
+    def __len__(self):
+        return len(self.specifiers)
+
+    def contains(self, version):
+        """
+        Pre-releases are not special cased, the release histories we check against don't contain them
+        """
+        key = parse_version(version)
+
+        for operator, spec_version in self.specifiers:
+            if operator == '===':
+                matched = version.strip() == spec_version
+            elif key is None:
+                matched = False
+            elif spec_version.endswith('.*'):
+                matched = self._match_prefix(key, spec_version[:-2]) == (operator == '==')
+            elif operator == '~=':
+                prefix = spec_version.split('+')[0].rsplit('.', 1)[0]
+                matched = key >= parse_version(spec_version) and self._match_prefix(key, prefix)
+            else:
+                spec_key = parse_version(spec_version)
+                if spec_key is None:
+                    return False
+
+                matched = {
+                    '==': key == spec_key,
+                    '!=': key != spec_key,
+                    '<=': key <= spec_key,
+                    '>=': key >= spec_key,
+                    '<': key < spec_key,
+                    '>': key > spec_key
+                }[operator]
+
+            if not matched:
+                return False
+
+        return True
+
+    @staticmethod
+    def _match_prefix(key, prefix):
+        prefix_key = parse_version(prefix)
+        if prefix_key is None:
+            return False
+
+        epoch, prefix_release = prefix_key[0], [int(part) for part in prefix.split('!')[-1].split('.')]
+        release = list(key[1]) + [0] * max(0, len(prefix_release) - len(key[1]))
+
+        return key[0] == epoch and release[:len(prefix_release)] == prefix_release
+
+
+def parse_requirement(requirement):
+    """
+    Parse a PEP 508 requirement ('requests[socks] (>=2.0) ; python_version < "3.8"')
+    Return {'name', 'extras', 'specifier', 'marker'} or None if it can't be parsed
+    Direct references (name @ url) don't constrain the version
+    """
+    matches = REQUIREMENT_REGEX.match(requirement)
+    if not matches:
+        return None
+
+    name, extras, specifier, marker = matches.groups()
+
+    specifier = specifier.strip()
+    if specifier.startswith('@'):
+        specifier = ''
+    elif specifier.startswith('(') and specifier.endswith(')'):
+        specifier = specifier[1:-1]
+
+    try:
+        specifier = SpecifierSet(specifier)
+    except ValueError:
+        return None
+
+    return {
+        'name': name,
+        'extras': set(normalize_package_name(e.strip()) for e in (extras or '').split(',') if e.strip()),
+        'specifier': specifier,
+        'marker': marker.strip() if marker else None
+    }
+
+
+def default_marker_environment():
+    """
+    PEP 508 marker variables of the running interpreter
+    """
+    implementation_version = '.'.join(str(part) for part in sys.implementation.version[:3])
+
+    return {
+        'implementation_name': sys.implementation.name,
+        'implementation_version': implementation_version,
+        'os_name': os.name,
+        'platform_machine': platform.machine(),
+        'platform_release': platform.release(),
+        'platform_system': platform.system(),
+        'platform_version': platform.version(),
+        'python_full_version': platform.python_version(),
+        'platform_python_implementation': platform.python_implementation(),
+        'python_version': '.'.join(platform.python_version_tuple()[:2]),
+        'sys_platform': sys.platform
+    }
+
+
+def evaluate_marker(marker, environment, extras=()):
+    """
+    Evaluate a PEP 508 environment marker, 'extra' markers are true when one of {extras} is requested
+    Raise ValueError on markers we can't parse
+    """
+    tokens = []
+    pos = 0
+    marker = marker.strip()
+    while pos < len(marker):
+        matches = MARKER_TOKEN_REGEX.match(marker, pos)
+        if not matches:
+            raise ValueError(f"Invalid marker '{marker}'")
+
+        tokens.append(matches.group(1))
+        pos = matches.end()
+
+    return any(_MarkerParser(tokens, dict(environment, extra=extra)).parse() for extra in (list(extras) or ['']))
+
+
+class _MarkerParser:
+    def __init__(self, tokens, environment):
+        self.tokens = tokens
+        self.pos = 0
+        self.environment = environment
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError("Unexpected end of marker")
+
+        self.pos += 1
+        return token
+
+    def parse(self):
+        result = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected token '{self._peek()}' in marker")
+
+        return result
+
+    def _or(self):
+        result = self._and()
+        while self._peek() == 'or':
+            self._next()
+            result = self._and() or result
+
+        return result
+
+    def _and(self):
+        result = self._atom()
+        while self._peek() == 'and':
+            self._next()
+            result = self._atom() and result
+
+        return result
+
+    def _atom(self):
+        if self._peek() == '(':
+            self._next()
+            result = self._or()
+            if self._next() != ')':
+                raise ValueError("Unbalanced parenthesis in marker")
+
+            return result
+
+        left = self._next()
+        operator = self._next()
+        if operator == 'not':
+            operator += ' ' + self._next()
+        right = self._next()
+
+        return self._compare(left, operator, right)
+
+    def _value(self, token):
+        if token[0] in '\'"':
+            return token[1:-1]
+        elif token in self.environment:
+            return self.environment[token]
+
+        raise ValueError(f"Unknown marker variable '{token}'")
+
+    def _compare(self, left, operator, right):
+        is_version = left in VERSION_MARKERS or right in VERSION_MARKERS
+        is_extra = left == 'extra' or right == 'extra'
+        left, right = self._value(left), self._value(right)
+
+        if is_extra:
+            left, right = normalize_package_name(left), normalize_package_name(right)
+
+        if operator == 'in':
+            return left in right
+        elif operator == 'not in':
+            return left not in right
+        elif is_version and operator not in ('===',) and parse_version(left) is not None:
+            return SpecifierSet(operator + right).contains(left)
+        elif operator in ('==', '==='):
+            return left == right
+        elif operator == '!=':
+            return left != right
+
+        raise ValueError(f"Unsupported marker comparison '{left} {operator} {right}'")
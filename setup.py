@@ -19,6 +19,7 @@ setuptools.setup(
     python_requires='>=3.6',                # Minimum version requirement of the package
     py_modules=['py_requirements_guesser'],
     packages=['py_requirements_guesser'],
+    package_data={'py_requirements_guesser': ['data/mapping', 'data/stdlib', 'data/LICENSE-pipreqs']},
     entry_points={
         'console_scripts': [
             'py-requirements-guesser=py_requirements_guesser.cli:run'
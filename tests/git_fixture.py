@@ -0,0 +1,42 @@
+"""
+Small git repositories built commit by commit for the tests, with fixed commit dates
+"""
+import os
+import subprocess
+
+
+def git(repo_path, *args, timestamp=None):
+    env = dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com', GIT_COMMITTER_NAME='test',
+               GIT_COMMITTER_EMAIL='test@example.com')
+    if timestamp is not None:
+        env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = f"@{timestamp} +0000"
+
+    return subprocess.check_output(['git', '-c', 'init.defaultBranch=master', '-c', 'commit.gpgsign=false'] + list(args),
+                                   cwd=repo_path, env=env, stderr=subprocess.DEVNULL).decode().strip()
+
+
+def create_repository(repo_path):
+    os.makedirs(repo_path, exist_ok=True)
+    git(repo_path, 'init', '-q')
+
+    return repo_path
+
+
+def commit(repo_path, files, timestamp, message='commit'):
+    """
+    Write {files} ({path: content}, None deletes the file) and commit them at {timestamp}, return the commit sha
+    """
+    for path, content in files.items():
+        filepath = os.path.join(repo_path, path)
+        if content is None:
+            os.remove(filepath)
+            continue
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as f:
+            f.write(content)
+
+    git(repo_path, 'add', '-A')
+    git(repo_path, 'commit', '-q', '--allow-empty', '-m', message, timestamp=timestamp)
+
+    return git(repo_path, 'rev-parse', 'HEAD')
@@ -0,0 +1,127 @@
+"""
+Scripted local HTTP server standing in for Pypi (Or a mirror) in the tests
+"""
+import gzip
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def pypi_document(releases, requires_dist=None):
+    """
+    Render a Pypi JSON document from {releases} ({version: upload date})
+    """
+    return json.dumps({
+        'info': {'requires_dist': requires_dist},
+        'releases': {version: [{'filename': f"pkg-{version}.tar.gz", 'upload_time': f"{date}T00:00:00",
+                                'requires_python': None, 'yanked': False}]
+                     for version, date in releases.items()}
+    }).encode()
+
+
+def json_api_routes(index, base_path='/pypi'):
+    """
+    Pypi JSON api routes of a fixture {index} : {package_name: {version: (upload date, requires_dist)}}
+    """
+    routes = {}
+    for package_name, releases in index.items():
+        routes[f"{base_path}/{package_name}/json"] = [(200, {}, pypi_document({v: day for v, (day, _) in releases.items()}))]
+
+        for version, (_, requires_dist) in releases.items():
+            routes[f"{base_path}/{package_name}/{version}/json"] = [(200, {}, pypi_document({}, requires_dist))]
+
+    return routes
+
+
+def simple_index_routes(index, base_path='/simple', html=False):
+    """
+    Simple repository routes (PEP 691 JSON or PEP 503 HTML pages) of a fixture {index}, with a core metadata file (PEP 658) per release
+    """
+    routes = {}
+    for package_name, releases in index.items():
+        files = []
+        for version, (day, requires_dist) in releases.items():
+            filename = f"{package_name}-{version}.tar.gz"
+            files.append({'filename': filename, 'url': f"../../files/{filename}", 'upload-time': f"{day}T00:00:00Z",
+                          'requires-python': None, 'core-metadata': True})
+
+            metadata = f"Metadata-Version: 2.1\nName: {package_name}\nVersion: {version}\n"
+            metadata += ''.join(f"Requires-Dist: {requirement}\n" for requirement in requires_dist or [])
+            routes[f"/files/{filename}.metadata"] = [(200, {}, metadata.encode())]
+
+        if html:
+            anchors = ''.join(f'<a href="{f["url"]}" data-upload-time="{f["upload-time"]}" data-core-metadata="true">{f["filename"]}</a>'
+                              for f in files)
+            page = (200, {'Content-Type': 'text/html'}, f"<html><body>{anchors}</body></html>".encode())
+        else:
+            page = (200, {'Content-Type': 'application/vnd.pypi.simple.v1+json'},
+                    json.dumps({'meta': {'api-version': '1.1'}, 'name': package_name, 'files': files}).encode())
+
+        routes[f"{base_path}/{package_name}/"] = [page]
+
+    return routes
+
+
+def gzip_routes(routes):
+    """
+    Gzip encode the bodies of {routes} like a server honoring 'Accept-Encoding: gzip'
+    """
+    return {path: [(status, dict(headers, **{'Content-Encoding': 'gzip'}), gzip.compress(body)) for status, headers, body in responses]
+            for path, responses in routes.items()}
+
+
+class StubServer:
+    """
+    Serve {routes} on 127.0.0.1 from a background thread, {routes} is {path: [(status, headers, body), ...]}
+    Each request of a path consumes its next response, the last one is repeated. Unknown paths are answered by a 404
+    The (path, headers, client port) of every request is recorded in {requests}
+    """
+
+    def __init__(self, routes=None):
+        self.routes = {path: list(responses) for path, responses in (routes or {}).items()}
+        self.requests = []
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, headers, body = server.next_response(self.path, dict(self.headers), self.client_address[1])
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def next_response(self, path, headers, client_port):
+        with self._lock:
+            self.requests.append((path, headers, client_port))
+            responses = self.routes.get(path)
+
+            if not responses:
+                return 404, {}, b'{"message": "Not Found"}'
+
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    @property
+    def nb_connections(self):
+        return len({client_port for _, _, client_port in self.requests})
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,158 @@
+import os
+import datetime
+import unittest
+import tempfile
+
+from py_requirements_guesser.pypi import PypiClient
+from py_requirements_guesser.simple_index import SimpleIndexClient
+from py_requirements_guesser.backends import JsonApiBackend, SimpleIndexBackend, SnapshotBackend, MemoryCachedBackend
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.snapshot import write_snapshot, build_snapshot
+from py_requirements_guesser.resolver import DependencyResolver
+
+from stub_server import StubServer, json_api_routes, simple_index_routes, pypi_document
+from test_resolver import FIXTURE_INDEX, ENVIRONMENT
+
+
+def release_dates(releases):
+    return [(version, datetime.date.fromordinal(ordinal).isoformat()) for version, ordinal, _ in releases]
+
+
+def fixture_dates(package_name):
+    return [(version, day) for version, (day, _) in FIXTURE_INDEX[package_name].items()]
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def start_server(self, routes):
+        server = StubServer(routes).__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+
+        return server
+
+
+class SimpleIndexBackendTest(TempDirTestCase):
+    def create_backend(self, html=False, cache=None):
+        self.server = self.start_server(simple_index_routes(FIXTURE_INDEX, html=html))
+
+        return SimpleIndexBackend(SimpleIndexClient(f"{self.server.url}/simple", backoff_factor=0.01), cache)
+
+    def check_backend(self, backend):
+        self.assertEqual(release_dates(backend.get_releases('helper')), fixture_dates('helper'))
+        self.assertEqual(backend.get_requires_dist('helper', '1.0'), ['lib!=1.5'])
+        self.assertEqual(backend.get_requires_dist('lib', '1.0'), [])
+
+        self.assertIsNone(backend.get_releases('unknown'))
+        self.assertIsNone(backend.get_requires_dist('helper', '0.1'))
+
+    def test_json_pages(self):
+        backend = self.create_backend()
+        self.check_backend(backend)
+
+        accept = [headers.get('Accept') for path, headers, _ in self.server.requests if path == '/simple/helper/']
+        self.assertIn('application/vnd.pypi.simple.v1+json', accept[0])
+
+    def test_html_pages(self):
+        self.check_backend(self.create_backend(html=True))
+
+    def test_metadata_of_cached_releases(self):
+        cache = ReleaseCache(self.tmp_dir.name)
+        self.create_backend(cache=cache).get_releases('fast')
+
+        # A new backend only knows the releases from the cache, the project page is requested again for the metadata urls
+        backend = self.create_backend(cache=cache)
+        self.assertEqual(release_dates(backend.get_releases('fast')), fixture_dates('fast'))
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(backend.get_requires_dist('fast', '3.0'), ['lib[speed]>=1.5,<2'])
+
+    def test_resolver(self):
+        resolver = DependencyResolver(self.create_backend(), ENVIRONMENT)
+
+        self.assertEqual(dict(resolver.resolve({'app': ('1.0', '2020-06-01')})), {'lib': '1.5', 'helper': '1.9'})
+
+
+class SnapshotBackendTest(TempDirTestCase):
+    def test_write_snapshot(self):
+        server = self.start_server(json_api_routes(FIXTURE_INDEX))
+        json_backend = JsonApiBackend(PypiClient(f"{server.url}/pypi", backoff_factor=0.01))
+
+        filepath = os.path.join(self.tmp_dir.name, 'releases.snapshot')
+        lib_releases = json_backend.get_releases('lib')
+        histories = {'Helper': json_backend.get_releases('helper'), 'lib': lib_releases, 'unknown': None}
+        write_snapshot(filepath, histories, {('helper', '1.0'): ['lib!=1.5'], ('lib', '1.0'): []})
+
+        backend = SnapshotBackend(filepath)
+        nb_requests = len(server.requests)
+
+        self.assertEqual(release_dates(backend.get_releases('HELPER')), fixture_dates('helper'))
+        self.assertEqual(backend.get_releases('lib'), lib_releases)
+        self.assertIsNone(backend.get_releases('unknown'))
+        self.assertIsNone(backend.get_releases('fast'))
+
+        self.assertEqual(backend.get_requires_dist('helper', '1.0'), ['lib!=1.5'])
+        self.assertEqual(backend.get_requires_dist('lib', '1.0'), [])
+        self.assertIsNone(backend.get_requires_dist('helper', '1.9'))
+
+        self.assertEqual(len(server.requests), nb_requests)
+
+    def test_build_snapshot(self):
+        server = self.start_server(json_api_routes(FIXTURE_INDEX))
+        cache = ReleaseCache(self.tmp_dir.name)
+        json_backend = JsonApiBackend(PypiClient(f"{server.url}/pypi", backoff_factor=0.01), cache)
+        json_backend.get_releases('lib')
+        json_backend.get_requires_dist('lib', '1.5')
+
+        filepath = os.path.join(self.tmp_dir.name, 'releases.snapshot')
+        nb_packages = build_snapshot(filepath, ['lib', 'fast', 'unknown'], json_backend, cache)
+
+        # lib comes from the cache, fast from the backend, unknown doesn't exist
+        self.assertEqual(nb_packages, 2)
+        self.assertEqual([path for path, _, _ in server.requests].count('/pypi/lib/json'), 1)
+
+        backend = SnapshotBackend(filepath)
+        self.assertEqual(release_dates(backend.get_releases('lib')), fixture_dates('lib'))
+        self.assertEqual(release_dates(backend.get_releases('fast')), fixture_dates('fast'))
+        self.assertIsNone(backend.get_releases('unknown'))
+        self.assertEqual(backend.get_requires_dist('lib', '1.5'), ['speedup; extra == "speed"'])
+
+    def test_not_a_snapshot(self):
+        filepath = os.path.join(self.tmp_dir.name, 'releases.snapshot')
+        with open(filepath, 'wb') as f:
+            f.write(b'not a snapshot')
+
+        with self.assertRaises(ValueError):
+            SnapshotBackend(filepath)
+
+
+class JsonApiBackendTest(TempDirTestCase):
+    def test_stale_entries_are_revalidated(self):
+        server = self.start_server({'/pypi/lib/json': [(200, {'ETag': '"v1"'}, pypi_document({'1.0': '2019-01-10'})),
+                                                       (304, {}, b'')]})
+        backend = JsonApiBackend(PypiClient(f"{server.url}/pypi", backoff_factor=0.01), ReleaseCache(self.tmp_dir.name, ttl=0))
+
+        first = backend.get_releases('lib')
+        second = backend.get_releases('lib')
+
+        self.assertEqual(release_dates(second), [('1.0', '2019-01-10')])
+        self.assertEqual(release_dates(second), release_dates(first))
+        self.assertEqual(server.requests[1][1].get('If-None-Match'), '"v1"')
+
+
+class MemoryCachedBackendTest(TempDirTestCase):
+    def test_calls_through_once(self):
+        server = self.start_server(json_api_routes(FIXTURE_INDEX))
+        backend = MemoryCachedBackend(JsonApiBackend(PypiClient(f"{server.url}/pypi", backoff_factor=0.01)))
+
+        for _ in range(3):
+            self.assertEqual(release_dates(backend.get_releases('lib')), fixture_dates('lib'))
+            self.assertEqual(backend.get_requires_dist('lib', '1.5'), ['speedup; extra == "speed"'])
+            self.assertIsNone(backend.get_releases('unknown'))
+
+        self.assertEqual(sorted(path for path, _, _ in server.requests), ['/pypi/lib/1.5/json', '/pypi/lib/json', '/pypi/unknown/json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import unittest
+import tempfile
+
+from py_requirements_guesser.compatibility import Target, get_wheel_tag, summarize_release_files, get_compatible_platforms
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.pypi import PypiClient
+from py_requirements_guesser.utils import get_pypi_history
+
+from stub_server import StubServer
+
+
+LINUX_TARGET = Target('3.8', 'manylinux_2_31_x86_64')
+
+
+def release_file(filename, upload_time, requires_python=None, yanked=False):
+    return {'filename': filename, 'upload_time': f"{upload_time}T00:00:00", 'requires_python': requires_python, 'yanked': yanked}
+
+
+DOCUMENT = json.dumps({'info': {}, 'releases': {
+    '1.0': [release_file('pkg-1.0.tar.gz', '2020-01-01', '>=3.6')],
+    '1.1': [release_file('pkg-1.1.tar.gz', '2020-02-01'), release_file('pkg-1.1-cp38-cp38-manylinux2014_x86_64.whl', '2020-02-01')],
+    '1.2': [release_file('pkg-1.2-cp39-cp39-manylinux2014_x86_64.whl', '2020-03-01', '>=3.9')],
+    '1.3': [release_file('pkg-1.3-cp38-cp38-win_amd64.whl', '2020-04-01'),
+            release_file('pkg-1.3-cp38-cp38-manylinux_2_35_x86_64.whl', '2020-04-01')],
+    '1.4': [release_file('pkg-1.4-py3-none-any.whl', '2020-05-01', yanked=True), release_file('pkg-1.4.tar.gz', '2020-05-01')],
+}}).encode()
+
+
+class WheelTagsTest(unittest.TestCase):
+    def test_wheel_tag(self):
+        self.assertEqual(get_wheel_tag('six-1.16.0-py2.py3-none-any.whl'), 'py2.py3-none-any')
+        self.assertEqual(get_wheel_tag('numpy-1.24.0-1-cp38-cp38-win_amd64.whl'), 'cp38-cp38-win_amd64')
+        self.assertIsNone(get_wheel_tag('six-1.16.0.tar.gz'))
+        self.assertIsNone(get_wheel_tag('broken-any.whl'))
+
+    def test_summarize_release_files(self):
+        summary = summarize_release_files([('pkg-1.0.tar.gz', None), ('pkg-1.0-py3-none-any.whl', '>=3.7'),
+                                           ('pkg-1.0-cp38-cp38-win_amd64.whl', '>=3.7'), ('pkg-1.0.exe', None)])
+
+        self.assertEqual(summary, ('>=3.7', True, ['cp38-cp38-win_amd64', 'py3-none-any']))
+        self.assertEqual(summarize_release_files([('pkg-1.0.exe', None)]), (None, False, []))
+
+    def test_compatible_platforms(self):
+        manylinux = get_compatible_platforms('manylinux2014_x86_64')
+        self.assertTrue({'manylinux_2_17_x86_64', 'manylinux_2_5_x86_64', 'manylinux1_x86_64', 'manylinux2010_x86_64',
+                         'linux_x86_64', 'any'} <= manylinux)
+        self.assertNotIn('manylinux_2_18_x86_64', manylinux)
+        self.assertNotIn('manylinux_2_17_aarch64', manylinux)
+
+        self.assertIn('musllinux_1_1_x86_64', get_compatible_platforms('musllinux_1_2_x86_64'))
+        self.assertNotIn('manylinux_1_1_x86_64', get_compatible_platforms('musllinux_1_2_x86_64'))
+
+        macos = get_compatible_platforms('macosx_12_0_arm64')
+        self.assertTrue({'macosx_11_0_arm64', 'macosx_10_9_universal2', 'macosx_12_0_arm64'} <= macos)
+        self.assertNotIn('macosx_10_9_x86_64', macos)
+        self.assertNotIn('macosx_13_0_arm64', macos)
+
+
+class TargetTest(unittest.TestCase):
+    def test_invalid_python_version(self):
+        with self.assertRaises(ValueError):
+            Target('three', 'win_amd64')
+
+    def test_requires_python(self):
+        self.assertTrue(LINUX_TARGET.supports_requires_python(None))
+        self.assertTrue(LINUX_TARGET.supports_requires_python('>=3.6, !=3.7.*'))
+        self.assertFalse(LINUX_TARGET.supports_requires_python('>=3.9'))
+        # Invalid metadata is ignored like pip does
+        self.assertTrue(LINUX_TARGET.supports_requires_python('=>3.6'))
+
+    def test_wheels(self):
+        self.assertTrue(LINUX_TARGET.supports_wheel('cp38-cp38-manylinux_2_17_x86_64'))
+        self.assertTrue(LINUX_TARGET.supports_wheel('cp36-abi3-manylinux2014_x86_64'))
+        self.assertTrue(LINUX_TARGET.supports_wheel('py2.py3-none-any'))
+        self.assertTrue(LINUX_TARGET.supports_wheel('cp38-none-manylinux1_x86_64.manylinux_2_5_x86_64'))
+        self.assertFalse(LINUX_TARGET.supports_wheel('cp39-cp39-manylinux_2_17_x86_64'))
+        self.assertFalse(LINUX_TARGET.supports_wheel('cp38-cp38-manylinux_2_35_x86_64'))
+        self.assertFalse(LINUX_TARGET.supports_wheel('cp38-cp38-win_amd64'))
+        self.assertFalse(LINUX_TARGET.supports_wheel('cp39-abi3-manylinux2014_x86_64'))
+        self.assertFalse(LINUX_TARGET.supports_wheel('invalid'))
+
+        self.assertTrue(Target('3.7', 'manylinux2014_x86_64').supports_wheel('cp37-cp37m-manylinux2014_x86_64'))
+
+    def test_rank(self):
+        self.assertEqual(LINUX_TARGET.rank(None), 2)
+        self.assertEqual(LINUX_TARGET.rank((None, True, ['cp38-cp38-manylinux2014_x86_64'])), 2)
+        self.assertEqual(LINUX_TARGET.rank((None, True, ['cp38-cp38-win_amd64'])), 1)
+        self.assertEqual(LINUX_TARGET.rank((None, False, ['cp38-cp38-win_amd64'])), 0)
+        self.assertEqual(LINUX_TARGET.rank(('>=3.9', True, ['py3-none-any'])), 0)
+
+    def test_marker_environment(self):
+        environment = {'platform_machine': 'x86_64', 'implementation_name': 'cpython'}
+
+        self.assertEqual(Target('3.8.10', 'win_amd64').marker_environment(environment),
+                         {'platform_machine': 'AMD64', 'implementation_name': 'cpython', 'python_full_version': '3.8.10',
+                          'python_version': '3.8', 'platform_system': 'Windows', 'sys_platform': 'win32', 'os_name': 'nt'})
+        self.assertEqual(Target('3.11', 'macosx_12_0_arm64').marker_environment(environment)['platform_machine'], 'arm64')
+
+
+class TargetFilteringTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache = ReleaseCache(self.tmp_dir.name)
+
+    def history(self, target, offline=False):
+        with StubServer({'/pypi/pkg/json': [(200, {}, DOCUMENT)]}) as server:
+            history = get_pypi_history('pkg', client=PypiClient(f"{server.url}/pypi"), cache=self.cache, offline=offline,
+                                       target=target)
+
+        return [version for version, _ in history]
+
+    def test_releases_with_a_wheel_are_preferred(self):
+        self.assertEqual(self.history(LINUX_TARGET), ['1.1'])
+        self.assertEqual(self.history(Target('3.8', 'win_amd64')), ['1.3'])
+        self.assertEqual(self.history(Target('3.9', 'manylinux_2_35_x86_64')), ['1.2'])
+
+    def test_source_only_releases(self):
+        # Yanked wheels don't count, without any wheel for the target the source distributions are kept
+        self.assertEqual(self.history(Target('3.7', 'macosx_12_0_arm64')), ['1.0', '1.1', '1.4'])
+
+    def test_summaries_are_cached(self):
+        self.assertEqual(self.history(None), ['1.0', '1.1', '1.2', '1.3', '1.4'])
+
+        # The cached summaries are enough to filter the releases
+        self.assertEqual(self.history(Target('3.8', 'win_amd64'), offline=True), ['1.3'])
+        self.assertEqual(self.cache.get('pkg')['releases'][2][2], ('>=3.9', False, ['cp39-cp39-manylinux2014_x86_64']))
+
+
+if __name__ == '__main__':
+    unittest.main()
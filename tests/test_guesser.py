@@ -0,0 +1,127 @@
+import os
+import unittest
+import tempfile
+import threading
+import concurrent.futures
+from unittest import mock
+
+from py_requirements_guesser.guesser import Guesser
+from py_requirements_guesser.history import GitHistoryIndex
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.pypi import PypiClient
+
+from stub_server import StubServer, json_api_routes
+from git_fixture import create_repository, commit
+from test_resolver import FIXTURE_INDEX
+
+
+# 2020-06-01 and 2021-06-01
+FIRST_COMMIT_DATE = 1590969600
+SECOND_COMMIT_DATE = 1622505600
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.server = StubServer(json_api_routes(FIXTURE_INDEX)).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        # lib is added to the requirements a year after its first import, helper resolves to the same version either way
+        self.repo_path = create_repository(os.path.join(self.tmp_dir.name, 'repo'))
+        commit(self.repo_path, {'main.py': "import lib\nimport helper\n", 'requirements.txt': "helper\n"}, FIRST_COMMIT_DATE)
+        commit(self.repo_path, {'requirements.txt': "lib\nhelper\n"}, SECOND_COMMIT_DATE)
+
+    def create_guesser(self, max_workers=8, **kwargs):
+        guesser = Guesser(pypi_client=PypiClient(f"{self.server.url}/pypi", max_workers=max_workers), repo_path=self.repo_path,
+                          release_cache=ReleaseCache(os.path.join(self.tmp_dir.name, 'cache')), log=None, **kwargs)
+        self.addCleanup(guesser.close)
+
+        return guesser
+
+    def test_histories_are_fetched_while_indexing(self):
+        events = []
+        start_preparing = Guesser._start_preparing
+        build = GitHistoryIndex.build
+
+        def record_start_preparing(guesser, packages):
+            events.append('start_preparing')
+            return start_preparing(guesser, packages)
+
+        def record_build(index):
+            events.append('build')
+            return build(index)
+
+        with mock.patch.object(Guesser, '_start_preparing', record_start_preparing), \
+                mock.patch.object(GitHistoryIndex, 'build', record_build):
+            guesser = self.create_guesser(strategy='first_import')
+
+        self.assertEqual(events, ['start_preparing', 'build'])
+        self.assertEqual(set(guesser._prepared), {'lib', 'helper'})
+
+    def test_pinned_packages_are_not_fetched(self):
+        commit(self.repo_path, {'requirements.txt': "lib==1.0\nhelper\n"}, SECOND_COMMIT_DATE)
+        guesser = self.create_guesser(strategy='first_import')
+
+        self.assertEqual(set(guesser._prepared), {'helper'})
+        self.assertEqual(guesser.guess_package_versions(), [('lib', '1.0'), ('helper', '2.0')])
+        self.assertEqual([path for path, _, _ in self.server.requests], ['/pypi/helper/json'])
+
+    def test_prepared_candidates(self):
+        guesser = self.create_guesser()
+        available_versions, import_candidate, requirement_candidate = guesser._get_prepared('lib')
+
+        self.assertEqual([version for version, _ in available_versions], ['1.0', '1.5', '2.0'])
+        self.assertEqual((import_candidate.version, requirement_candidate.version), ('1.5', '2.0'))
+        self.assertTrue(guesser.needs_decision(guesser._get_prepared('lib')))
+        self.assertFalse(guesser.needs_decision(guesser._get_prepared('helper')))
+
+    def test_prompt_waits_for_ready_packages(self):
+        guesser = self.create_guesser()
+        concurrent.futures.wait(guesser._prepared.values())
+
+        handled_before_prompt = []
+
+        def user_response_multi_choices(message, choices):
+            handled_before_prompt.extend(guesser.results)
+            return 2
+
+        with mock.patch('py_requirements_guesser.guesser.user_response_multi_choices', side_effect=user_response_multi_choices):
+            versions = guesser.guess_package_versions()
+
+        # helper needs no decision, it is handled first but the results keep the order of the packages
+        self.assertEqual(handled_before_prompt, ['helper'])
+        self.assertEqual(versions, [('lib', '2.0'), ('helper', '2.0')])
+        self.assertEqual(list(guesser.results), ['lib', 'helper'])
+        self.assertEqual(guesser.results['lib'].reason, 'user_choice')
+
+    def test_force_guess(self):
+        # A local module shadows the imported lib package
+        commit(self.repo_path, {'lib.py': "\n", 'requirements.txt': "helper\n"}, SECOND_COMMIT_DATE)
+
+        self.assertEqual(set(self.create_guesser(strategy='first_import')._prepared), {'helper'})
+        self.assertEqual(set(self.create_guesser(strategy='first_import', force_guess=['lib'])._prepared), {'lib', 'helper'})
+
+    def test_close_cancels_queued_packages(self):
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def prepare_package(guesser, package_info):
+            started.set()
+            release.wait()
+
+        # A single worker : the first package blocks it, the second one is queued
+        with mock.patch.object(Guesser, '_prepare_package', prepare_package):
+            guesser = self.create_guesser(max_workers=1)
+            started.wait()
+            guesser.close()
+
+        running, queued = guesser._prepared.values()
+        self.assertFalse(running.cancelled())
+        self.assertTrue(queued.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import os
+import json
+import unittest
+import subprocess
+import tempfile
+from unittest import mock
+
+from py_requirements_guesser import manifests
+from py_requirements_guesser.errors import GitHistoryError
+from py_requirements_guesser.git_objects import GitRepository
+from py_requirements_guesser.history import GitHistoryIndex, HISTORY_BACKENDS, HISTORY_PATHSPECS, get_head_commit, \
+    is_ancestor_commit, get_subproject_pathspecs, get_include_pathspecs, parse_imported_modules, match_pathspecs, \
+    get_pathspecs_directory
+
+from git_fixture import git, create_repository, commit
+
+
+def notebook(*sources, outputs=()):
+    return json.dumps({'cells': [{'cell_type': 'code', 'source': source, 'outputs': list(outputs)} for source in sources],
+                       'nbformat': 4})
+
+
+class FixtureRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.repo_path = create_repository(os.path.join(self.tmp_dir.name, 'repo'))
+
+    def build(self, backend='subprocess', **options):
+        return GitHistoryIndex(repo_path=self.repo_path, backend=backend, **options).build()
+
+
+class GitHistoryIndexTest(FixtureRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+
+        commit(self.repo_path, {'main.py': "import os\nimport requests\n", 'requirements.txt': "requests\n"}, 1000)
+        commit(self.repo_path, {'main.py': "import os\nimport requests\nfrom yaml import load\n",
+                                'requirements.txt': "requests\nPyYAML>=5\n"}, 2000)
+
+        # Side branch merged back
+        git(self.repo_path, 'checkout', '-q', '-b', 'side')
+        commit(self.repo_path, {'lib/compute.py': "import numpy as np\n"}, 3000)
+        git(self.repo_path, 'checkout', '-q', 'master')
+        commit(self.repo_path, {'README': "readme\n"}, 3500)
+        git(self.repo_path, 'merge', '-q', '--no-ff', 'side', '-m', 'merge', timestamp=4000)
+
+        commit(self.repo_path, {'analysis.ipynb': notebook("%matplotlib inline\nimport pandas as pd\n", outputs=["import fake"]),
+                                'pyproject.toml': '[project]\ndependencies = ["pandas>=1.0"]\n'}, 5000)
+        # Moved and deleted lines don't change the first dates
+        commit(self.repo_path, {'main.py': "import requests\nimport os\n", 'requirements.txt': "PyYAML>=5\nrequests\n"}, 6000)
+
+    def expected_requirement_dates(self):
+        dates = {'requests': 1000, 'pyyaml': 2000}
+        if manifests.toml is not None:
+            dates['pandas'] = 5000
+
+        return dates
+
+    def test_backends_build_the_same_index(self):
+        for backend in HISTORY_BACKENDS:
+            index = self.build(backend)
+
+            self.assertEqual(index.import_dates, {'os': 1000, 'requests': 1000, 'yaml': 2000, 'numpy': 3000, 'pandas': 5000}, backend)
+            self.assertEqual(index.requirement_dates, self.expected_requirement_dates(), backend)
+            self.assertEqual(index.head, git(self.repo_path, 'rev-parse', 'HEAD'), backend)
+
+    def test_single_git_log_pass(self):
+        with mock.patch('py_requirements_guesser.history.subprocess.Popen', wraps=subprocess.Popen) as popen:
+            self.build()
+
+        commands = [call.args[0][:2] for call in popen.call_args_list]
+        # The notebook and pyproject.toml versions are read by a single git cat-file
+        self.assertEqual(commands, [['git', 'log'], ['git', 'cat-file']])
+
+    def test_subproject_pathspecs(self):
+        commit(self.repo_path, {'services/api/app.py': "import flask\n", 'services/api/requirements.txt': "flask\n",
+                                'services/api/worker/run.py': "import celery\n"}, 7000)
+
+        for backend in HISTORY_BACKENDS:
+            index = GitHistoryIndex(get_subproject_pathspecs('services/api', exclude=['services/api/worker']), self.repo_path,
+                                    backend=backend).build()
+
+            self.assertEqual(index.import_dates, {'flask': 7000}, backend)
+            self.assertEqual(index.requirement_dates, {'flask': 7000}, backend)
+
+    def test_included_requirements_files(self):
+        commit(self.repo_path, {'requirements.txt': "PyYAML>=5\nrequests\n-r deps/base.in\n", 'deps/base.in': "Flask_Login\n"}, 7000)
+        pathspecs = get_include_pathspecs(['requirements.txt', 'deps/base.in', 'deps/../../outside.txt'], HISTORY_PATHSPECS)
+
+        self.assertEqual(pathspecs, [':(literal)deps/base.in'])
+
+        for backend in HISTORY_BACKENDS:
+            index = GitHistoryIndex(HISTORY_PATHSPECS + pathspecs, self.repo_path, backend=backend).build()
+
+            self.assertEqual(index.requirement_dates['flask-login'], 7000, backend)
+            self.assertEqual(index.first_requirement_date('flask.login').timestamp(), 7000, backend)
+
+    def test_first_dates(self):
+        index = self.build()
+
+        self.assertEqual(index.first_import_date('YAML').timestamp(), 2000)
+        self.assertEqual(index.first_requirement_date('PyYAML').timestamp(), 2000)
+        self.assertIsNone(index.first_import_date('unknown'))
+
+    def test_update(self):
+        for backend in HISTORY_BACKENDS:
+            index = GitHistoryIndex.from_dict(self.build(backend).to_dict(), self.repo_path)
+            self.assertIs(index.update(), index)
+
+            commit(self.repo_path, {'main.py': "import requests\nimport os\nimport torch\n"}, 7000)
+            index.update()
+
+            self.assertEqual(index.import_dates['torch'], 7000)
+            self.assertEqual(index.to_dict(), self.build(backend).to_dict())
+
+            git(self.repo_path, 'reset', '-q', '--hard', 'HEAD~1')
+
+    def test_update_after_history_rewrite(self):
+        index = self.build()
+
+        git(self.repo_path, 'reset', '-q', '--hard', 'HEAD~2')
+        commit(self.repo_path, {'main.py': "import os\nimport requests\nimport scipy\n"}, 7000)
+        index.update()
+
+        self.assertNotIn('pandas', index.import_dates)
+        self.assertEqual(index.import_dates['scipy'], 7000)
+        self.assertEqual(index.to_dict(), self.build().to_dict())
+
+
+class HistoryHelpersTest(unittest.TestCase):
+    def test_parse_imported_modules(self):
+        self.assertEqual(parse_imported_modules("import a.b, c as d"), ['a', 'c'])
+        self.assertEqual(parse_imported_modules("    from x.y import z  # comment"), ['x'])
+        self.assertEqual(parse_imported_modules("from . import local"), [])
+        self.assertEqual(parse_imported_modules("print('import fake')"), [])
+
+    def test_match_pathspecs(self):
+        pathspecs = get_subproject_pathspecs('services/api', exclude=['services/api/worker']) + [':(literal)shared/base.in']
+
+        self.assertTrue(match_pathspecs('services/api/app/main.py', pathspecs))
+        self.assertTrue(match_pathspecs('services/api/requirements-dev.txt', pathspecs))
+        self.assertTrue(match_pathspecs('shared/base.in', pathspecs))
+        self.assertFalse(match_pathspecs('services/api/worker/run.py', pathspecs))
+        self.assertFalse(match_pathspecs('services/web/main.py', pathspecs))
+        self.assertFalse(match_pathspecs('services/api/README.md', pathspecs))
+
+    def test_pathspecs_directory(self):
+        self.assertEqual(get_pathspecs_directory(HISTORY_PATHSPECS), '')
+        self.assertEqual(get_pathspecs_directory(get_subproject_pathspecs('services/api', exclude=['services/api/worker'])),
+                         'services/api')
+        self.assertEqual(get_pathspecs_directory(get_subproject_pathspecs('services/api') + [':(literal)services/base.in']),
+                         'services')
+
+
+class PartialIndexTest(FixtureRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+
+        commit(self.repo_path, {'analysis.ipynb': notebook("import pandas as pd\n"), 'requirements.txt': "pandas\n"}, 1000)
+        commit(self.repo_path, {'main.py': "import pandas\nimport requests\n"}, 2000)
+        commit(self.repo_path, {'main.py': "import pandas\nimport requests\nimport numpy\n"}, 3000)
+
+    def test_partial_index(self):
+        index = self.build(modules=['Pandas', 'requests'], packages=['pandas'])
+
+        self.assertTrue(index.is_partial)
+        self.assertEqual(index.import_dates, {'pandas': 1000, 'requests': 2000})
+        self.assertEqual(index.requirement_dates, {'pandas': 1000})
+
+    def test_walk_stops_once_complete(self):
+        # Only imported by the notebook of the first commit, the commits after it are not indexed
+        with mock.patch.object(GitHistoryIndex, 'index_added_line', autospec=True,
+                               side_effect=GitHistoryIndex.index_added_line) as index_added_line:
+            index = self.build(modules=['pandas'])
+
+        self.assertEqual(index.import_dates, {'pandas': 1000})
+        self.assertEqual([call.args[3] for call in index_added_line.call_args_list], [1000])
+
+
+class HeadCommitTest(FixtureRepositoryTestCase):
+    def test_empty_repository(self):
+        self.assertIsNone(get_head_commit(self.repo_path))
+
+        for backend in HISTORY_BACKENDS:
+            index = self.build(backend)
+            self.assertIsNone(index.head)
+            self.assertEqual(index.import_dates, {})
+
+    def test_refs_that_cant_be_read_are_resolved_by_git(self):
+        sha = commit(self.repo_path, {'main.py': "import os\n"}, 1000)
+
+        with mock.patch.object(GitRepository, 'resolve_ref', return_value=None):
+            self.assertEqual(get_head_commit(self.repo_path), sha)
+
+            for backend in HISTORY_BACKENDS:
+                self.assertEqual(self.build(backend).import_dates, {'os': 1000}, backend)
+
+    def test_broken_head(self):
+        commit(self.repo_path, {'main.py': "import os\n"}, 1000)
+        with open(os.path.join(self.repo_path, '.git', 'refs', 'heads', 'master'), 'w') as f:
+            f.write("not a sha\n")
+
+        with self.assertRaises(GitHistoryError):
+            get_head_commit(self.repo_path)
+
+        for backend in HISTORY_BACKENDS:
+            with self.assertRaises(GitHistoryError):
+                self.build(backend)
+
+    def test_is_ancestor_commit(self):
+        first = commit(self.repo_path, {'main.py': "import os\n"}, 1000)
+        second = commit(self.repo_path, {'main.py': "import os\nimport sys\n"}, 2000)
+
+        self.assertTrue(is_ancestor_commit(first, repo_path=self.repo_path))
+        self.assertFalse(is_ancestor_commit(second, first, repo_path=self.repo_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest import mock
+
+from py_requirements_guesser import imports
+from py_requirements_guesser.imports import parse_import_lines, parse_source_imports, scan_imports, find_imported_modules
+
+
+class ParseImportsTest(unittest.TestCase):
+    def assertImports(self, source, modules):
+        self.assertEqual(parse_source_imports(source.encode()), set(modules))
+
+    def test_simple_statements(self):
+        source = "import os\nimport numpy as np, yaml\nfrom pandas.io import sql\nfrom . import sibling\n\ndef f():\n    import torch\n"
+
+        self.assertEqual(parse_import_lines(source.encode()), {'os', 'numpy', 'yaml', 'pandas', 'torch'})
+        self.assertImports(source, ['os', 'numpy', 'yaml', 'pandas', 'torch'])
+
+    def test_one_line_forms_fallback_on_ast(self):
+        sources = {
+            "try: import ujson as json\nexcept ImportError: import json\n": ['ujson', 'json'],
+            "import os; import sys\n": ['os', 'sys'],
+            "if True: from yaml import load\n": ['yaml'],
+            "with open('x'): import numpy\n": ['numpy'],
+            "def f(): import torch\n": ['torch'],
+            "class A: from six import moves\n": ['six'],
+            "x = 1; from pandas import DataFrame\n": ['pandas'],
+        }
+
+        for source, modules in sources.items():
+            self.assertIsNone(parse_import_lines(source.encode()), source)
+            self.assertImports(source, modules)
+
+    def test_continuation_lines(self):
+        self.assertImports("from numpy \\\n    import array\n", ['numpy'])
+        self.assertImports("import os, \\\n    sys\n", ['os', 'sys'])
+        self.assertImports("from yaml import (\n    load,\n    dump)\n", ['yaml'])
+
+    def test_import_in_docstring(self):
+        self.assertImports('"""\nimport this is not a statement\n"""\nimport os\n', ['os'])
+        self.assertImports('x = "see: import foo"\nimport os\n', ['os'])
+
+    def test_words_containing_import(self):
+        self.assertImports("import importlib\nmodule = importlib.import_module('x')\n# from the docs\n", ['importlib'])
+
+    def test_python2_source(self):
+        self.assertImports("import urllib2\nprint 'hello'\n", ['urllib2'])
+
+
+class ScanImportsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        files = {
+            'main.py': "import requests\ntry: import ujson\nexcept ImportError: ujson = None\n",
+            'pkg/util.py': "from yaml import load\n",
+            'venv/lib/site.py': "import vendored\n",
+            'node_modules/x.py': "import js_tool\n",
+            'sub/nested.py': "import nested_only\n",
+        }
+        for path, source in files.items():
+            path = os.path.join(self.tmp_dir.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(source)
+
+    def test_scan_imports(self):
+        self.assertEqual(scan_imports(self.tmp_dir.name), {'requests', 'ujson', 'yaml', 'nested_only'})
+        self.assertEqual(scan_imports(self.tmp_dir.name, exclude=['sub']), {'requests', 'ujson', 'yaml'})
+
+    def test_find_imported_modules(self):
+        self.assertEqual(find_imported_modules(['UJSON', 'yaml', 'vendored'], self.tmp_dir.name), {'ujson', 'yaml'})
+
+    def test_find_imported_modules_in_notebooks(self):
+        notebooks = {
+            'analysis.ipynb': {'cells': [{'cell_type': 'markdown', 'source': "We use scipy"},
+                                         {'cell_type': 'code', 'source': ["%matplotlib inline\n", "import pandas as pd\n"],
+                                          'outputs': [{'text': "import scipy"}]}], 'nbformat': 4},
+            'broken.ipynb': '{"cells": [{"cell_type": "code", "source": "import seaborn',
+        }
+        for path, content in notebooks.items():
+            with open(os.path.join(self.tmp_dir.name, path), 'w') as f:
+                f.write(content if isinstance(content, str) else json.dumps(content))
+
+        # Module names split across the blocks read
+        with mock.patch.object(imports, 'NOTEBOOK_READ_BYTES', 3):
+            self.assertEqual(find_imported_modules(['Pandas', 'scipy', 'seaborn', 'requests'], self.tmp_dir.name),
+                             {'pandas', 'requests'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from py_requirements_guesser.instrumentation import Tracer, tracer, process_tracer, get_tracer, use_tracer, bind_tracer
+
+
+def fake_run(nb_requests, barrier):
+    """
+    Phase counting the HTTP requests made by its worker threads, while another run does the same
+    """
+    with tracer.phase('pypi', shared=True) as phase:
+        barrier.wait()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(bind_tracer(lambda i: tracer.record_http_request(f"http://stub/{i}", 200, 0.01, 10)),
+                              range(nb_requests)))
+        barrier.wait()
+
+    return phase
+
+
+class TracerTest(unittest.TestCase):
+    def test_current_tracer(self):
+        self.assertIs(get_tracer(), process_tracer)
+
+        run_tracer = Tracer()
+        with use_tracer(run_tracer):
+            self.assertIs(get_tracer(), run_tracer)
+            self.assertIs(tracer.emit.__self__, run_tracer)
+
+        self.assertIs(get_tracer(), process_tracer)
+
+    def test_concurrent_runs_have_their_own_counters(self):
+        barrier = threading.Barrier(2)
+        tracers = [Tracer(), Tracer()]
+        phases = [None, None]
+
+        def run(i, nb_requests):
+            with use_tracer(tracers[i]):
+                phases[i] = fake_run(nb_requests, barrier)
+
+        threads = [threading.Thread(target=run, args=(0, 5)), threading.Thread(target=run, args=(1, 20))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(phases[0]['http_requests'], 5)
+        self.assertEqual(phases[1]['http_requests'], 20)
+        self.assertEqual(phases[1]['bytes_read'], 200)
+
+    def test_events_are_emitted_by_the_parent(self):
+        parent = Tracer()
+        events = []
+        parent.subscribe(events.append)
+
+        run_tracer = Tracer(parent=parent)
+        run_tracer.start_recording()
+        with use_tracer(run_tracer):
+            with tracer.phase('imports'):
+                tracer.record_subprocess('git log')
+
+        self.assertEqual([event['event'] for event in events], ['subprocess', 'phase'])
+        self.assertEqual(run_tracer.summary()['imports']['subprocesses'], 1)
+        self.assertEqual(parent.events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
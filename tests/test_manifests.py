@@ -0,0 +1,85 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest import mock
+
+from py_requirements_guesser import manifests
+from py_requirements_guesser.manifests import parse_manifest, read_project_requirements
+
+
+PYPROJECT = """
+[project]
+dependencies = ["requests>=2.0", "PyYAML"]
+
+[tool.poetry.dependencies]
+python = "^3.8"
+numpy = "^1.19"
+"""
+
+POETRY_LOCK = """
+[[package]]
+name = "ruamel.yaml"
+version = "0.17.21"
+
+[[package]]
+name = "Zope_Interface"
+version = "5.4.0"
+"""
+
+PIPFILE_LOCK = {'default': {'Flask_SQLAlchemy': {'version': '==2.5.1'}, 'six': {'version': '*'}}}
+
+
+@unittest.skipIf(manifests.toml is None, "Reading TOML requires tomllib (Python 3.11+) or tomli")
+class TomlManifestsTest(unittest.TestCase):
+    def test_pyproject_toml(self):
+        requirements = {r['name']: str(r['specifier']) for r in parse_manifest('pyproject.toml', PYPROJECT).requirements}
+
+        self.assertEqual(requirements, {'requests': '>=2.0', 'PyYAML': '', 'numpy': '>=1.19,<2.0'})
+
+    def test_invalid_toml(self):
+        self.assertEqual(parse_manifest('pyproject.toml', "[project\n").requirements, [])
+
+    def test_lockfile_names_are_normalized(self):
+        self.assertEqual(parse_manifest('poetry.lock', POETRY_LOCK).locked, {'ruamel-yaml': '0.17.21', 'zope-interface': '5.4.0'})
+
+
+class ReadProjectRequirementsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        files = {
+            'requirements.txt': "requests>=2.0\nruamel.yaml\n-c constraints.txt\n",
+            'constraints.txt': "Ruamel_Yaml==0.16.0\nrequests==2.25.1\n",
+            'pyproject.toml': PYPROJECT,
+            'poetry.lock': POETRY_LOCK,
+            'Pipfile.lock': json.dumps(PIPFILE_LOCK),
+        }
+        for path, content in files.items():
+            with open(os.path.join(self.tmp_dir.name, path), 'w') as f:
+                f.write(content)
+
+    def test_locked_versions(self):
+        declared, locked, _, _ = read_project_requirements(self.tmp_dir.name)
+
+        self.assertIn('ruamel-yaml', declared)
+        self.assertEqual(declared['ruamel-yaml']['package_name'], 'ruamel.yaml')
+        self.assertEqual(locked['flask-sqlalchemy'], ('2.5.1', 'Pipfile.lock'))
+        self.assertEqual(locked['requests'], ('2.25.1', 'constraints.txt'))
+        self.assertNotIn('six', locked)
+        self.assertTrue(all(name == name.lower().replace('_', '-').replace('.', '-') for name in locked))
+
+    def test_toml_manifests_are_skipped_without_parser(self):
+        with mock.patch.object(manifests, 'toml', None):
+            declared, locked, paths, skipped = read_project_requirements(self.tmp_dir.name)
+            self.assertEqual(parse_manifest('pyproject.toml', PYPROJECT).requirements, [])
+
+        self.assertEqual(skipped, ['poetry.lock', 'pyproject.toml'])
+        self.assertNotIn('poetry.lock', paths)
+        self.assertNotIn('numpy', declared)
+        self.assertEqual(locked['ruamel-yaml'], ('0.16.0', 'constraints.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
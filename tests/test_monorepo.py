@@ -0,0 +1,83 @@
+import os
+import io
+import unittest
+import tempfile
+from unittest import mock
+from contextlib import redirect_stdout
+
+from py_requirements_guesser.monorepo import Subproject, find_subprojects, run_monorepo
+from py_requirements_guesser.backends import JsonApiBackend
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.pypi import PypiClient
+
+from stub_server import StubServer, json_api_routes
+from git_fixture import create_repository, commit
+from test_resolver import FIXTURE_INDEX
+
+
+# 2020-06-01 and 2020-08-15
+FIRST_COMMIT_DATE = 1590969600
+SECOND_COMMIT_DATE = 1597449600
+
+
+class MonorepoTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        # States of the sub-projects
+        patcher = mock.patch('py_requirements_guesser.state.CACHE_ROOT', os.path.join(self.tmp_dir.name, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Root project with a nested sub-project, itself holding a nested sub-project
+        self.repo_path = create_repository(os.path.join(self.tmp_dir.name, 'repo'))
+        commit(self.repo_path, {
+            'main.py': "import lib\n",
+            'requirements/base.txt': "lib\n",
+            'services/api/app.py': "import helper\n",
+            'services/api/requirements.txt': "helper\n",
+            'services/api/docs/conf.py': "import os\n",
+        }, FIRST_COMMIT_DATE)
+        commit(self.repo_path, {
+            'services/api/worker/run.py': "import speedup\n",
+            'services/api/worker/setup.cfg': "[options]\ninstall_requires =\n    speedup\n",
+        }, SECOND_COMMIT_DATE)
+
+    def read(self, path):
+        with open(os.path.join(self.repo_path, path)) as f:
+            return f.read()
+
+    def test_find_subprojects(self):
+        self.assertEqual(find_subprojects(self.repo_path), [
+            Subproject('', ('services/api',)),
+            Subproject('services/api', ('services/api/worker',)),
+            Subproject('services/api/worker'),
+        ])
+        self.assertEqual(Subproject('services/api', ('services/api/worker',)).exclude, ['worker'])
+
+    def test_run_monorepo(self):
+        def user_response_yes_no(message):
+            # Keep the requirements file of services/api
+            return os.path.join('services', 'api', 'requirements.txt') not in message
+
+        with StubServer(json_api_routes(FIXTURE_INDEX)) as server, \
+                mock.patch('py_requirements_guesser.utils.user_response_yes_no', side_effect=user_response_yes_no) as prompt, \
+                redirect_stdout(io.StringIO()) as output:
+            backend = JsonApiBackend(PypiClient(f"{server.url}/pypi"), ReleaseCache(os.path.join(self.tmp_dir.name, 'releases')))
+            nb_errors = run_monorepo(self.repo_path, backend, 'first_import', write='requirements.txt', reset_state=True)
+
+        self.assertEqual(nb_errors, 0, output.getvalue())
+        # Nested sub-projects are left out of their parent
+        self.assertEqual(self.read('requirements.txt'), "lib==1.5\n")
+        self.assertEqual(self.read('services/api/worker/requirements.txt'), "speedup==0.2\n")
+
+        # Only the existing file is confirmed, the user kept it
+        prompt.assert_called_once()
+        self.assertEqual(self.read('services/api/requirements.txt'), "helper\n")
+        self.assertIn("Requirements not written (Existing file kept) for 1 sub-projects :\n    services/api\n", output.getvalue())
+        self.assertIn("Requirements.txt :\nhelper==2.0\n", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import os
+import json
+import unittest
+import tempfile
+from unittest import mock
+
+from py_requirements_guesser import imports
+from py_requirements_guesser.notebooks import iter_notebook_code_cells, strip_magics, get_notebook_code_lines
+from py_requirements_guesser.imports import parse_notebook_imports, scan_imports, chunk_notebooks
+
+
+NOTEBOOK = {
+    'cells': [
+        {'cell_type': 'markdown', 'source': ["import not_code\n"]},
+        {'cell_type': 'code', 'execution_count': 1, 'metadata': {'tags': ["import tagged"]},
+         'source': ["%matplotlib inline\n", "import numpy as np\n", "!pip install shell_only\n", "from pandas import DataFrame"],
+         'outputs': [{'output_type': 'display_data', 'data': {'image/png': "iVBORw0KGgo" * 5000, 'text/plain': ["import output"]}}]},
+        {'cell_type': 'code', 'source': "def f():\n    import scipy.stats\n", 'outputs': []},
+    ],
+    'metadata': {'kernelspec': {'name': 'python3'}},
+    'nbformat': 4,
+}
+
+NOTEBOOK_V3 = {
+    'worksheets': [{'cells': [{'cell_type': 'code', 'input': ["import sklearn\n"], 'outputs': []},
+                              {'cell_type': 'heading', 'source': "import heading"}]}],
+    'nbformat': 3,
+}
+
+
+class SlowStream(io.BytesIO):
+    """
+    Stream returning a few bytes per read, like a slow network response
+    """
+
+    def read(self, size=-1):
+        return super().read(7)
+
+
+class NotebookCellsTest(unittest.TestCase):
+    def test_code_cells(self):
+        sources = list(iter_notebook_code_cells(io.BytesIO(json.dumps(NOTEBOOK).encode())))
+
+        self.assertEqual(sources, ["%matplotlib inline\nimport numpy as np\n!pip install shell_only\nfrom pandas import DataFrame",
+                                   "def f():\n    import scipy.stats\n"])
+
+    def test_streamed_by_small_chunks(self):
+        self.assertEqual(list(iter_notebook_code_cells(SlowStream(json.dumps(NOTEBOOK).encode()))),
+                         list(iter_notebook_code_cells(io.BytesIO(json.dumps(NOTEBOOK).encode()))))
+
+    def test_nbformat_3(self):
+        self.assertEqual(list(iter_notebook_code_cells(io.BytesIO(json.dumps(NOTEBOOK_V3).encode()))), ["import sklearn\n"])
+
+    def test_strip_magics(self):
+        self.assertEqual(strip_magics("%time x = 1\n  !ls\n?obj\nimport os\n"), "\n\n\nimport os\n")
+
+    def test_notebook_code_lines(self):
+        self.assertEqual(get_notebook_code_lines(json.dumps(NOTEBOOK).encode()),
+                         {'', 'import numpy as np', 'from pandas import DataFrame', 'def f():', '    import scipy.stats'})
+        # Cells before the corruption are kept
+        content = json.dumps(NOTEBOOK).encode()
+        truncated = content[:content.index(b'def f()')]
+        self.assertEqual(get_notebook_code_lines(truncated), {'', 'import numpy as np', 'from pandas import DataFrame'})
+
+    def test_parse_notebook_imports(self):
+        self.assertEqual(parse_notebook_imports(io.BytesIO(json.dumps(NOTEBOOK).encode())), {'numpy', 'pandas', 'scipy'})
+
+        with self.assertRaises(ValueError):
+            parse_notebook_imports(io.BytesIO(b'{"cells": [{"cell_type": "code", "source": "import x'))
+
+
+class ScanNotebooksTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        files = {
+            'main.py': "import requests\n",
+            'notebooks/analysis.ipynb': json.dumps(NOTEBOOK),
+            'notebooks/old.ipynb': json.dumps(NOTEBOOK_V3),
+            'notebooks/broken.ipynb': '{"cells": [',
+            'notebooks/.ipynb_checkpoints/analysis-checkpoint.ipynb': json.dumps(NOTEBOOK_V3),
+        }
+        for path, content in files.items():
+            path = os.path.join(self.tmp_dir.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(content)
+
+    def test_scan_imports(self):
+        self.assertEqual(scan_imports(self.tmp_dir.name), {'requests', 'numpy', 'pandas', 'scipy', 'sklearn'})
+
+    def test_scan_imports_in_process_pool(self):
+        with mock.patch.object(imports, 'MIN_NOTEBOOK_BYTES_FOR_PROCESS_POOL', 0):
+            self.assertEqual(scan_imports(self.tmp_dir.name, max_workers=2), {'requests', 'numpy', 'pandas', 'scipy', 'sklearn'})
+
+    def test_chunk_notebooks(self):
+        with mock.patch.object(imports, 'NOTEBOOK_CHUNK_BYTES', 100):
+            chunks = chunk_notebooks([('big.ipynb', 500), ('a.ipynb', 60), ('b.ipynb', 30), ('c.ipynb', 30)])
+
+        self.assertEqual(chunks, [['big.ipynb'], ['a.ipynb', 'b.ipynb'], ['c.ipynb']])
+
+
+if __name__ == '__main__':
+    unittest.main()
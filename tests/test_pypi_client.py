@@ -0,0 +1,140 @@
+import io
+import gzip
+import unittest
+from unittest import mock
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+from py_requirements_guesser.pypi import PypiClient, PypiUnreachableError, GzipStream, fetch_package_releases, fetch_requires_dist
+from py_requirements_guesser.simple_index import SimpleIndexClient
+from py_requirements_guesser.utils import get_pypi_history
+
+from stub_server import StubServer, pypi_document, gzip_routes, json_api_routes, simple_index_routes
+from test_resolver import FIXTURE_INDEX
+
+
+SIX_RELEASES = {'1.14.0': '2020-01-15', '1.15.0': '2020-05-21', '1.16.0': '2021-05-05', '1.17.0rc1': '2021-06-01'}
+
+
+def ok(body):
+    return 200, {'Content-Type': 'application/json'}, body
+
+
+class PypiClientTest(unittest.TestCase):
+    def client(self, server, **kwargs):
+        kwargs.setdefault('backoff_factor', 0.01)
+        return PypiClient(f"{server.url}/pypi", **kwargs)
+
+    def test_fetch_releases(self):
+        with StubServer({'/pypi/six/json': [ok(pypi_document(SIX_RELEASES))]}) as server:
+            history = get_pypi_history('six', client=self.client(server))
+
+        self.assertEqual([version for version, _ in history], ['1.14.0', '1.15.0', '1.16.0'])
+        self.assertEqual(history.version_at(date(2020, 6, 1).toordinal()), '1.15.0')
+
+    def test_unknown_package(self):
+        with StubServer() as server:
+            self.assertIsNone(get_pypi_history('not-a-package', client=self.client(server)))
+
+    def test_keep_alive_connection_is_reused(self):
+        routes = {f"/pypi/pkg{i}/json": [ok(pypi_document(SIX_RELEASES))] for i in range(10)}
+
+        with StubServer(routes) as server:
+            client = self.client(server)
+            for i in range(10):
+                fetch_package_releases(f"pkg{i}", client)
+
+        self.assertEqual(len(server.requests), 10)
+        self.assertEqual(server.nb_connections, 1)
+
+    def test_concurrent_requests_use_one_connection_per_thread(self):
+        routes = {f"/pypi/pkg{i}/json": [ok(pypi_document(SIX_RELEASES))] for i in range(40)}
+
+        with StubServer(routes) as server:
+            client = self.client(server, max_workers=4)
+            with ThreadPoolExecutor(max_workers=client.max_workers) as executor:
+                histories = list(executor.map(lambda i: fetch_package_releases(f"pkg{i}", client), range(40)))
+
+        self.assertTrue(all(len(releases) == 4 for releases in histories))
+        self.assertLessEqual(server.nb_connections, 4)
+
+    def test_retry_with_backoff(self):
+        responses = [(503, {}, b''), (429, {}, b''), ok(pypi_document(SIX_RELEASES))]
+
+        with StubServer({'/pypi/six/json': responses}) as server, mock.patch('py_requirements_guesser.pypi.time.sleep') as sleep:
+            releases = fetch_package_releases('six', self.client(server, backoff_factor=0.5))
+
+        self.assertEqual(len(releases), 4)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+
+    def test_retry_after_header(self):
+        responses = [(429, {'Retry-After': '3'}, b''), ok(pypi_document(SIX_RELEASES))]
+
+        with StubServer({'/pypi/six/json': responses}) as server, mock.patch('py_requirements_guesser.pypi.time.sleep') as sleep:
+            fetch_package_releases('six', self.client(server))
+
+        sleep.assert_called_once_with(3)
+
+    def test_unreachable_after_max_retries(self):
+        with StubServer({'/pypi/six/json': [(500, {}, b'')]}) as server:
+            with self.assertRaises(PypiUnreachableError):
+                fetch_package_releases('six', self.client(server, max_retries=2))
+
+        self.assertEqual(len(server.requests), 3)
+
+    def test_unexpected_status(self):
+        with StubServer({'/pypi/six/json': [(403, {}, b'')]}) as server:
+            with self.assertRaises(PypiUnreachableError):
+                fetch_package_releases('six', self.client(server))
+
+        self.assertEqual(len(server.requests), 1)
+
+    def test_gzip_responses(self):
+        with StubServer(gzip_routes(json_api_routes(FIXTURE_INDEX))) as server:
+            client = self.client(server)
+            releases = fetch_package_releases('lib', client)
+            requires_dist = fetch_requires_dist('app', '1.0', client)
+            status, headers, body = client.request('unknown/json')
+
+        self.assertEqual([version for version, _, _ in releases], ['1.0', '1.5', '2.0'])
+        self.assertEqual(requires_dist, FIXTURE_INDEX['app']['1.0'][1])
+        # Error bodies are decompressed too
+        self.assertEqual((status, body), (404, b'{"message": "Not Found"}'))
+        self.assertTrue(all(headers['Accept-Encoding'] == 'gzip' for _, headers, _ in server.requests))
+        self.assertEqual(server.nb_connections, 1)
+
+    def test_gzip_simple_index_pages(self):
+        with StubServer(gzip_routes(simple_index_routes(FIXTURE_INDEX, html=True))) as server:
+            client = SimpleIndexClient(f"{server.url}/simple", backoff_factor=0.01)
+            status, _, (releases, metadata_urls) = client.get_project_page('lib')
+            requires_dist = client.get_requires_dist(metadata_urls['1.0'])
+
+        self.assertEqual(status, 200)
+        self.assertEqual([version for version, _, _ in releases], ['1.0', '1.5', '2.0'])
+        self.assertEqual(requires_dist, FIXTURE_INDEX['lib']['1.0'][1] or [])
+
+    def test_gzip_stream(self):
+        content = pypi_document(SIX_RELEASES) * 20
+        resp = io.BytesIO(gzip.compress(content))
+        resp.headers = {}
+        stream = GzipStream(resp, chunk_size=7)
+
+        chunks = [stream.read(100)]
+        while chunks[-1]:
+            chunks.append(stream.read(1000))
+
+        self.assertEqual(b''.join(chunks), content)
+        self.assertEqual(len(chunks[0]), 100)
+
+    def test_connection_refused(self):
+        with StubServer() as server:
+            url = server.url
+
+        with mock.patch('py_requirements_guesser.pypi.time.sleep'):
+            with self.assertRaises(PypiUnreachableError):
+                fetch_package_releases('six', PypiClient(f"{url}/pypi", max_retries=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
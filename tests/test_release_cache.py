@@ -0,0 +1,157 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest import mock
+
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.pypi import PypiClient, fetch_package_releases
+
+from stub_server import StubServer, pypi_document
+
+
+RELEASES = [('1.0.0', 737000, None), ('1.1.0', 737100, None)]
+
+
+class ReleaseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def cache_size(self, cache):
+        return sum(entry.stat().st_size for entry in os.scandir(cache.path) if entry.name.endswith('.json'))
+
+    def test_roundtrip(self):
+        cache = ReleaseCache(self.tmp_dir.name)
+        cache.put('Zope.Interface', RELEASES, etag='"abc"')
+        cache.put_requires_dist('six', '1.16.0', ['foo>=1'])
+
+        entry = cache.get('zope_interface')
+        self.assertEqual([release[:2] for release in entry['releases']], [release[:2] for release in RELEASES])
+        self.assertEqual(entry['etag'], '"abc"')
+        self.assertTrue(cache.is_fresh(entry))
+        self.assertEqual(cache.get_requires_dist('six', '1.16.0')['requires_dist'], ['foo>=1'])
+        self.assertIsNone(cache.get('unknown'))
+
+    def test_eviction_keeps_cache_under_max_size(self):
+        cache = ReleaseCache(self.tmp_dir.name, max_size=4096)
+        for i in range(200):
+            cache.put(f"package{i}", RELEASES)
+            self.assertLessEqual(self.cache_size(cache), 4096)
+
+        # Least recently used entries are evicted first
+        self.assertIsNotNone(cache.get('package199'))
+        self.assertIsNone(cache.get('package0'))
+
+    def test_writes_dont_scan_the_directory(self):
+        cache = ReleaseCache(self.tmp_dir.name, max_size=1024*1024)
+
+        with mock.patch('py_requirements_guesser.cache.os.scandir', wraps=os.scandir) as scandir:
+            for i in range(100):
+                cache.put(f"package{i}", RELEASES)
+                cache.put(f"package{i}", RELEASES)
+
+        # Initial size scan only
+        self.assertEqual(scandir.call_count, 1)
+        self.assertEqual(cache._size, self.cache_size(cache))
+
+    def test_eviction_scans_are_amortized(self):
+        cache = ReleaseCache(self.tmp_dir.name, max_size=16*1024)
+
+        with mock.patch('py_requirements_guesser.cache.os.scandir', wraps=os.scandir) as scandir:
+            for i in range(1000):
+                cache.put(f"package{i}", RELEASES)
+
+        self.assertLess(scandir.call_count, 100)
+
+
+SIX_DOCUMENT = pypi_document({'1.15.0': '2020-05-21', '1.16.0': '2021-05-05'})
+
+
+class RevalidationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache = ReleaseCache(self.tmp_dir.name, ttl=3600)
+
+    def age_entry(self, package_name, seconds):
+        entry_path = self.cache._entry_path(package_name)
+        with open(entry_path) as f:
+            entry = json.load(f)
+
+        entry['fetched_at'] -= seconds
+        with open(entry_path, 'w') as f:
+            json.dump(entry, f, separators=(',', ':'))
+
+    def read_entry_file(self, package_name):
+        with open(self.cache._entry_path(package_name), 'rb') as f:
+            return f.read()
+
+    def fetch(self, server, offline=False):
+        return fetch_package_releases('six', PypiClient(f"{server.url}/pypi", backoff_factor=0.01), self.cache, offline)
+
+    def test_ttl_expiry(self):
+        with StubServer({'/pypi/six/json': [(200, {}, SIX_DOCUMENT)]}) as server:
+            releases = self.fetch(server)
+            self.assertEqual(self.fetch(server), releases)
+            self.assertEqual(len(server.requests), 1)
+
+            self.age_entry('six', 3601)
+            self.assertFalse(self.cache.is_fresh(self.cache.get('six')))
+            self.assertEqual(self.fetch(server), releases)
+            self.assertEqual(len(server.requests), 2)
+
+        self.assertTrue(self.cache.is_fresh(self.cache.get('six')))
+
+    def test_etag_revalidation(self):
+        responses = [(200, {'ETag': '"v1"'}, SIX_DOCUMENT), (304, {'ETag': '"v1"'}, b'')]
+
+        with StubServer({'/pypi/six/json': responses}) as server:
+            releases = self.fetch(server)
+            self.age_entry('six', 7200)
+            stale = self.read_entry_file('six')
+
+            with mock.patch.object(self.cache, 'put', wraps=self.cache.put) as put:
+                self.assertEqual(self.fetch(server), releases)
+
+        self.assertEqual(server.requests[1][1]['If-None-Match'], '"v1"')
+        # Only the timestamp was rewritten
+        put.assert_not_called()
+        refreshed = self.read_entry_file('six')
+        self.assertEqual(len(refreshed), len(stale))
+        self.assertEqual(refreshed.split(b',', 1)[1], stale.split(b',', 1)[1])
+        self.assertGreater(json.loads(refreshed)['fetched_at'], json.loads(stale)['fetched_at'])
+        self.assertTrue(self.cache.is_fresh(self.cache.get('six')))
+
+    def test_new_etag_rewrites_the_entry(self):
+        responses = [(200, {'ETag': '"v1"'}, SIX_DOCUMENT), (304, {'ETag': '"v2"'}, b'')]
+
+        with StubServer({'/pypi/six/json': responses}) as server:
+            self.fetch(server)
+            self.age_entry('six', 7200)
+            self.fetch(server)
+
+        self.assertEqual(self.cache.get('six')['etag'], '"v2"')
+        self.assertTrue(self.cache.is_fresh(self.cache.get('six')))
+
+    def test_offline_mode_serves_stale_entries(self):
+        with StubServer({'/pypi/six/json': [(200, {}, SIX_DOCUMENT)]}) as server:
+            releases = self.fetch(server)
+            self.age_entry('six', 30 * 24 * 3600)
+
+            self.assertEqual(self.fetch(server, offline=True), releases)
+            self.assertIsNone(fetch_package_releases('unknown', PypiClient(f"{server.url}/pypi"), self.cache, offline=True))
+
+        self.assertEqual(len(server.requests), 1)
+
+    def test_refresh_of_missing_or_old_entries(self):
+        self.assertFalse(self.cache.refresh('six'))
+
+        with open(self.cache._entry_path('six'), 'w') as f:
+            json.dump({'format': 3, 'fetched_at': 1.5, 'etag': None, 'releases': []}, f)
+
+        self.assertFalse(self.cache.refresh('six'))
+
+
+if __name__ == '__main__':
+    unittest.main()
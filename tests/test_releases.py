@@ -0,0 +1,109 @@
+import unittest
+from datetime import date, datetime
+
+from py_requirements_guesser.releases import ReleaseIndex, to_ordinal, pack_compatibility, unpack_compatibility
+from py_requirements_guesser.compatibility import Target
+from py_requirements_guesser.results import PackageResult
+from py_requirements_guesser.batch import get_release_drift
+
+
+# Not sorted, 1.1.0 and 1.1.1 were released the same day
+RELEASES = [
+    ('1.1.0', '2020-03-01'),
+    ('1.0.0', '2020-01-01'),
+    ('1.1.1', '2020-03-01'),
+    ('2.0.0', datetime(2021, 6, 15, 12, 30)),
+    ('1.2.0', date(2020, 9, 1)),
+]
+
+
+class ReleaseIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = ReleaseIndex(RELEASES)
+
+    def test_sorted_by_date(self):
+        self.assertEqual([version for version, _ in self.index], ['1.0.0', '1.1.0', '1.1.1', '1.2.0', '2.0.0'])
+        self.assertEqual(self.index.latest(), '2.0.0')
+        self.assertEqual(len(self.index), 5)
+        self.assertIn('1.1.1', self.index)
+        self.assertEqual(self.index.release_date('2.0.0'), date(2021, 6, 15))
+        self.assertIsNone(self.index.release_date('3.0.0'))
+
+    def test_version_at(self):
+        self.assertEqual(self.index.version_at('2020-01-01'), '1.0.0')
+        self.assertEqual(self.index.version_at('2020-02-29'), '1.0.0')
+        # Same day releases : the last one of the day
+        self.assertEqual(self.index.version_at('2020-03-01'), '1.1.1')
+        self.assertEqual(self.index.version_at(datetime(2020, 8, 31, 23, 59)), '1.1.1')
+        self.assertEqual(self.index.version_at(date(2030, 1, 1)), '2.0.0')
+
+    def test_version_before_the_first_release(self):
+        # Fallback on the oldest release
+        self.assertEqual(self.index.version_at('2019-01-01'), '1.0.0')
+        self.assertIsNone(ReleaseIndex().version_at('2020-01-01'))
+
+    def test_versions_at(self):
+        days = ['2021-07-01', '2019-01-01', '2020-03-01', datetime(2020, 9, 1), '2020-02-01', '2020-03-01']
+
+        self.assertEqual(self.index.versions_at(days), [self.index.version_at(day) for day in days])
+        self.assertEqual(self.index.versions_at(days), ['2.0.0', '1.0.0', '1.1.1', '1.2.0', '1.0.0', '1.1.1'])
+        self.assertEqual(self.index.versions_at([]), [])
+        self.assertEqual(ReleaseIndex().versions_at(['2020-01-01']), [None])
+
+    def test_releases_between(self):
+        self.assertEqual(self.index.releases_between('2020-03-01', '2020-09-01'),
+                         [('1.1.0', date(2020, 3, 1)), ('1.1.1', date(2020, 3, 1)), ('1.2.0', date(2020, 9, 1))])
+        self.assertEqual([v for v, _ in self.index.releases_between(to_ordinal('2020-03-01') + 1, '2030-01-01')], ['1.2.0', '2.0.0'])
+        self.assertEqual(self.index.releases_between('2019-01-01', '2019-12-31'), [])
+        self.assertEqual(self.index.releases_between('2021-01-01', '2020-01-01'), [])
+
+    def test_filter_preserves_order(self):
+        index = self.index.filter(lambda version: version != '1.1.1')
+
+        self.assertEqual([version for version, _ in index], ['1.0.0', '1.1.0', '1.2.0', '2.0.0'])
+        self.assertEqual(index.version_at('2020-03-01'), '1.1.0')
+        self.assertEqual(len(self.index), 5)
+
+    def test_compatible_with(self):
+        wheel = (None, True, ['cp38-cp38-manylinux_2_17_x86_64'])
+        index = ReleaseIndex([
+            ('1.0', '2019-01-01', ('>=3.6', True, [])),
+            ('1.1', '2019-06-01', wheel),
+            ('1.2', '2019-09-01', ('>=3.9', True, ['cp39-cp39-manylinux_2_17_x86_64'])),
+            ('1.3', '2020-01-01', wheel),
+            ('1.4', '2020-06-01', (None, False, ['cp38-cp38-win_amd64'])),
+        ])
+
+        compatible = index.compatible_with(Target('3.8', 'manylinux_2_17_x86_64'))
+
+        # Releases with a wheel win over the source only ones
+        self.assertEqual([version for version, _ in compatible], ['1.1', '1.3'])
+        self.assertEqual(compatible.summaries, [wheel, wheel])
+
+    def test_packed_compatibility(self):
+        releases = [('1.0', 737000, ('>=3.6', True, ['py3-none-any'])), ('1.1', 737100, None),
+                    ('1.2', 737200, (None, False, ['py3-none-any', 'cp38-cp38-win_amd64']))]
+
+        packed = pack_compatibility(releases)
+
+        self.assertEqual(packed['tags'], ['py3-none-any', 'cp38-cp38-win_amd64'])
+        self.assertEqual(unpack_compatibility(releases, packed), releases)
+        self.assertIsNone(pack_compatibility([('1.0', 737000, None)]))
+
+
+class ReleaseDriftTest(unittest.TestCase):
+    def test_release_drift(self):
+        index = ReleaseIndex(RELEASES)
+        guessed = PackageResult('pkg', 'pkg', '1.0.0', 'single_candidate', 'first_import', '2020-01-01')
+        pinned = PackageResult('pkg', 'pkg', '1.1.0', 'requirements.txt')
+
+        self.assertEqual(get_release_drift(index, guessed, datetime(2020, 10, 1)),
+                         {'version_at_last_change': '1.2.0', 'releases_since': ['1.1.0', '1.1.1', '1.2.0']})
+        self.assertEqual(get_release_drift(index, pinned, datetime(2020, 10, 1)),
+                         {'version_at_last_change': '1.2.0', 'releases_since': []})
+        self.assertEqual(get_release_drift(None, guessed, datetime(2020, 10, 1)),
+                         {'version_at_last_change': None, 'releases_since': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
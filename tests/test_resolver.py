@@ -0,0 +1,147 @@
+import unittest
+from unittest import mock
+
+from py_requirements_guesser.pypi import PypiClient
+from py_requirements_guesser.backends import JsonApiBackend
+from py_requirements_guesser.resolver import DependencyResolver
+from py_requirements_guesser.versions import SpecifierSet, parse_requirement, evaluate_marker, default_marker_environment
+
+from stub_server import StubServer, json_api_routes
+
+
+ENVIRONMENT = dict(default_marker_environment(), python_version='3.8', python_full_version='3.8.10', sys_platform='linux',
+                   platform_system='Linux', os_name='posix')
+
+# {package_name: {version: (upload date, requires_dist)}}
+FIXTURE_INDEX = {
+    'app': {
+        '1.0': ('2020-06-01', ['lib>=1.0', 'helper (<2)', 'winonly; sys_platform == "win32"', 'oldpy; python_version < "3.7"',
+                               'testtool; extra == "test"']),
+    },
+    'lib': {
+        '1.0': ('2019-01-10', []),
+        '1.5': ('2020-03-01', ['speedup; extra == "speed"']),
+        '2.0': ('2021-01-01', []),
+    },
+    'helper': {
+        '1.0': ('2018-05-01', ['lib!=1.5']),
+        '1.9': ('2020-05-01', ['lib']),
+        '2.0': ('2020-05-20', ['lib']),
+    },
+    'fast': {
+        '3.0': ('2020-01-01', ['lib[speed]>=1.5,<2']),
+    },
+    'speedup': {
+        '0.1': ('2020-07-01', []),
+        '0.2': ('2020-08-01', []),
+    },
+    'newlib': {
+        '1.0': ('2019-01-01', ['lib>=3']),
+    },
+    'winonly': {'1.0': ('2010-01-01', [])},
+    'oldpy': {'1.0': ('2010-01-01', [])},
+    'testtool': {'1.0': ('2010-01-01', [])},
+}
+
+
+class VersionsTest(unittest.TestCase):
+    def test_specifiers(self):
+        self.assertTrue(SpecifierSet('>=1.0,<2').contains('1.5'))
+        self.assertFalse(SpecifierSet('>=1.0,<2').contains('2.0'))
+        self.assertTrue(SpecifierSet('~=1.4').contains('1.9'))
+        self.assertFalse(SpecifierSet('~=1.4.2').contains('1.5'))
+        self.assertTrue(SpecifierSet('==1.*').contains('1.2.3'))
+        self.assertFalse(SpecifierSet('!=1.5').contains('1.5.0'))
+        self.assertTrue(SpecifierSet('').contains('0.1'))
+
+    def test_parse_requirement(self):
+        requirement = parse_requirement('Requests[socks,Security] (>=2.0) ; python_version < "3.8"')
+
+        self.assertEqual(requirement['name'], 'Requests')
+        self.assertEqual(requirement['extras'], {'socks', 'security'})
+        self.assertEqual(str(requirement['specifier']), '>=2.0')
+        self.assertEqual(requirement['marker'], 'python_version < "3.8"')
+        self.assertEqual(str(parse_requirement('pkg @ https://example.com/pkg.zip')['specifier']), '')
+
+    def test_markers(self):
+        self.assertTrue(evaluate_marker('python_version >= "3.6" and sys_platform == "linux"', ENVIRONMENT))
+        self.assertFalse(evaluate_marker('python_version < "3.7" or os_name == "nt"', ENVIRONMENT))
+        self.assertTrue(evaluate_marker('python_version > "3.10"', dict(ENVIRONMENT, python_version='3.11')))
+        self.assertTrue(evaluate_marker('extra == "test"', ENVIRONMENT, extras={'test'}))
+        self.assertFalse(evaluate_marker('extra == "test"', ENVIRONMENT))
+
+
+class DependencyResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer(json_api_routes(FIXTURE_INDEX)).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        self.resolver = DependencyResolver(JsonApiBackend(PypiClient(f"{self.server.url}/pypi", backoff_factor=0.01)), ENVIRONMENT)
+
+    def requested_paths(self):
+        return [path for path, _, _ in self.server.requests]
+
+    def test_markers_and_specifiers(self):
+        dependencies = dict(self.resolver.resolve({'app': ('1.0', '2020-06-01')}))
+
+        # Newest releases available on 2020-06-01 matching 'lib>=1.0' and 'helper<2', helper 1.9 doesn't exclude lib 1.5
+        self.assertEqual(dependencies, {'lib': '1.5', 'helper': '1.9'})
+        self.assertEqual(self.resolver.unresolved, {})
+        self.assertEqual(self.resolver.conflicts, {})
+
+        # Packages excluded by their markers are never fetched
+        for package_name in ('winonly', 'oldpy', 'testtool', 'speedup'):
+            self.assertNotIn(f"/pypi/{package_name}/json", self.requested_paths())
+
+    def test_constraints_of_all_dependents(self):
+        dependencies = dict(self.resolver.resolve({'helper': ('1.0', '2020-06-01')}))
+
+        self.assertEqual(dependencies, {'lib': '1.0'})
+
+    def test_extras(self):
+        dependencies = dict(self.resolver.resolve({'fast': ('3.0', '2020-09-01')}))
+
+        self.assertEqual(dependencies, {'lib': '1.5', 'speedup': '0.2'})
+
+    def test_oldest_matching_release_when_none_was_available(self):
+        # speedup was first released after the date of fast
+        dependencies = dict(self.resolver.resolve({'fast': ('3.0', '2020-04-01')}))
+
+        self.assertEqual(dependencies, {'lib': '1.5', 'speedup': '0.1'})
+
+    def test_release_date_of_the_guessed_version(self):
+        # Without a date, the release date of helper 1.0 (2018-05-01) is used : lib 1.0 wasn't out yet, the oldest match is picked
+        dependencies = dict(self.resolver.resolve({'helper': ('1.0', None)}))
+
+        self.assertEqual(dependencies, {'lib': '1.0'})
+
+    def test_unresolved_and_conflicts(self):
+        dependencies = dict(self.resolver.resolve({'newlib': ('1.0', '2021-06-01'), 'helper': ('1.0', '2021-06-01'),
+                                                   'fast': ('3.0', '2021-06-01')}))
+
+        self.assertNotIn('lib', dependencies)
+        self.assertEqual(self.resolver.unresolved, {'lib': 'no_matching_version'})
+
+        resolver = DependencyResolver(self.resolver.backend, ENVIRONMENT)
+        resolver.resolve({'lib': ('2.0', '2021-06-01'), 'fast': ('3.0', '2021-06-01')})
+        self.assertEqual(resolver.conflicts, {'lib': ['fast requires lib>=1.5,<2']})
+
+    def test_shared_subgraphs_are_fetched_once(self):
+        packages = {'app': ('1.0', '2020-06-01'), 'helper': ('1.9', '2020-06-01'), 'fast': ('3.0', '2020-09-01')}
+        self.resolver.resolve(packages)
+
+        paths = self.requested_paths()
+        self.assertEqual(len(paths), len(set(paths)))
+        self.assertEqual(paths.count('/pypi/lib/json'), 1)
+
+    def test_fetches_are_batched_by_level(self):
+        with mock.patch.object(self.resolver, '_fetch_level', wraps=self.resolver._fetch_level) as fetch_level:
+            self.resolver.resolve({'app': ('1.0', '2020-06-01'), 'fast': ('3.0', '2020-09-01')})
+
+        # One round per level of the graph : requirements of the roots, lib and helper, then speedup (Extra of lib)
+        rounds = [len(call.args[0]) + len(call.args[1]) for call in fetch_level.call_args_list]
+        self.assertEqual([nb_fetches for nb_fetches in rounds if nb_fetches > 0], [2, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import json
+import socket
+import asyncio
+import unittest
+import tempfile
+import threading
+from unittest import mock
+
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.service import GuessService, remove_socket_file
+
+from stub_server import StubServer, json_api_routes
+from git_fixture import create_repository, commit
+from test_resolver import FIXTURE_INDEX
+
+
+# 2020-06-01 and 2021-06-01
+FIRST_COMMIT_DATE = 1590969600
+SECOND_COMMIT_DATE = 1622505600
+
+
+def request(socket_path, method, path, body=None):
+    """
+    Send an HTTP request over the unix socket of the service, return (status, JSON response)
+    """
+    body = json.dumps(body).encode() if body is not None else b''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(60)
+        client.connect(socket_path)
+        client.sendall(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+
+        response = b''
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+
+    head, _, body = response.partition(b'\r\n\r\n')
+
+    return int(head.split()[1]), json.loads(body)
+
+
+class GuessServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.pypi = StubServer(json_api_routes(FIXTURE_INDEX)).__enter__()
+        self.addCleanup(self.pypi.__exit__, None, None, None)
+
+        self.repo_path = create_repository(os.path.join(self.tmp_dir.name, 'repo'))
+        self.first_commit = commit(self.repo_path, {'main.py': "import lib\n", 'requirements.txt': "lib\n"}, FIRST_COMMIT_DATE)
+
+        self.socket_path = os.path.join(self.tmp_dir.name, 'guesser.sock')
+
+    def start_service(self):
+        service = GuessService(workers=2, index_url=f"{self.pypi.url}/pypi",
+                               release_cache=ReleaseCache(os.path.join(self.tmp_dir.name, 'cache')))
+
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(service.start(f"unix:{self.socket_path}"))
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.run_until_complete(service.stop())
+            loop.close()
+
+        self.addCleanup(stop)
+
+        return service
+
+    def test_guess(self):
+        self.start_service()
+
+        self.assertEqual(request(self.socket_path, 'GET', '/health'), (200, {'status': 'ok'}))
+
+        # The import scan runs in a process pool started from a worker thread of the service
+        with mock.patch('py_requirements_guesser.imports.MIN_FILES_FOR_PROCESS_POOL', 0):
+            status, result = request(self.socket_path, 'POST', '/guess', {'repo_path': self.repo_path})
+
+        self.assertEqual(status, 200, result)
+        self.assertEqual(result['repo_path'], os.path.realpath(self.repo_path))
+        self.assertEqual(result['commit'], self.first_commit)
+        self.assertEqual(result['requirements'], "lib==1.5\n")
+
+    def test_history_index_reuse_and_commit_jobs(self):
+        self.start_service()
+
+        request(self.socket_path, 'POST', '/guess', {'repo_path': self.repo_path})
+        commit(self.repo_path, {'main.py': "import lib\nimport helper\n"}, SECOND_COMMIT_DATE)
+
+        status, result = request(self.socket_path, 'POST', '/guess', {'repo_path': self.repo_path})
+        self.assertEqual(status, 200, result)
+        self.assertEqual(result['requirements'], "helper==2.0\nlib==1.5\n")
+
+        # Analysed in a temporary worktree of the first commit
+        status, result = request(self.socket_path, 'POST', '/guess', {'repo_path': self.repo_path, 'commit': self.first_commit})
+        self.assertEqual(status, 200, result)
+        self.assertEqual(result['requirements'], "lib==1.5\n")
+
+        status, stats = request(self.socket_path, 'GET', '/stats')
+        self.assertEqual(stats['completed'], 3)
+        self.assertEqual(stats['caches']['history_indexes']['hits'], 2)
+
+    def test_errors(self):
+        self.start_service()
+
+        self.assertEqual(request(self.socket_path, 'POST', '/guess', {'repo_path': self.tmp_dir.name})[0], 422)
+        self.assertEqual(request(self.socket_path, 'POST', '/guess', {'repo_path': self.repo_path, 'commit': '--output=x'})[0], 400)
+        self.assertEqual(request(self.socket_path, 'POST', '/guess', {'repo_path': self.repo_path, 'policy': 'unknown'})[0], 400)
+        self.assertEqual(request(self.socket_path, 'GET', '/guess')[0], 405)
+        self.assertEqual(request(self.socket_path, 'GET', '/unknown')[0], 404)
+
+        status, stats = request(self.socket_path, 'GET', '/stats')
+        self.assertEqual((stats['completed'], stats['failed']), (0, 1))
+
+
+class SocketPathTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.socket_path = os.path.join(self.tmp_dir.name, 'guesser.sock')
+
+    def test_stale_socket_is_replaced(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+
+        remove_socket_file(self.socket_path)
+
+        self.assertFalse(os.path.exists(self.socket_path))
+        # Nothing to remove
+        remove_socket_file(self.socket_path)
+
+    def test_other_files_are_kept(self):
+        with open(self.socket_path, 'w') as f:
+            f.write("important")
+
+        service = GuessService(workers=1, offline=True, release_cache=ReleaseCache(os.path.join(self.tmp_dir.name, 'cache')))
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        with self.assertRaises(ValueError):
+            loop.run_until_complete(service.start(f"unix:{self.socket_path}"))
+
+        with open(self.socket_path) as f:
+            self.assertEqual(f.read(), "important")
+
+        # A symlink to a socket isn't a socket
+        link_path = os.path.join(self.tmp_dir.name, 'link.sock')
+        os.symlink(self.socket_path, link_path)
+        with self.assertRaises(ValueError):
+            remove_socket_file(link_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
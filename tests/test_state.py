@@ -0,0 +1,129 @@
+import os
+import json
+import unittest
+import tempfile
+import subprocess
+from unittest import mock
+
+from py_requirements_guesser.guesser import Guesser
+from py_requirements_guesser.cache import ReleaseCache
+from py_requirements_guesser.pypi import PypiClient
+from py_requirements_guesser.state import load_state, save_state
+
+from stub_server import StubServer, json_api_routes
+from git_fixture import create_repository, commit
+from test_resolver import FIXTURE_INDEX
+
+
+# 2020-06-01 and 2021-06-01
+FIRST_COMMIT_DATE = 1590969600
+SECOND_COMMIT_DATE = 1622505600
+
+
+class IncrementalStateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.server = StubServer(json_api_routes(FIXTURE_INDEX)).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        self.repo_path = create_repository(os.path.join(self.tmp_dir.name, 'repo'))
+        commit(self.repo_path, {'main.py': "import lib\nimport helper\n", 'requirements.txt': "lib\nhelper\n"}, FIRST_COMMIT_DATE)
+        self.nb_runs = 0
+
+    def run_guesser(self, state=None):
+        """
+        Return (guesser, guessed versions, Pypi packages fetched), the release cache is empty on every run
+        """
+        self.nb_runs += 1
+        nb_requests = len(self.server.requests)
+        guesser = Guesser(pypi_client=PypiClient(f"{self.server.url}/pypi"), repo_path=self.repo_path, state=state,
+                          release_cache=ReleaseCache(os.path.join(self.tmp_dir.name, f"cache{self.nb_runs}")), log=None,
+                          strategy='first_import')
+        versions = guesser.guess_package_versions()
+
+        fetched = sorted(path.split('/')[2] for path, _, _ in self.server.requests[nb_requests:])
+
+        return guesser, dict(versions), fetched
+
+    def saved_state(self, guesser):
+        filepath = os.path.join(self.tmp_dir.name, 'state.json')
+        save_state(filepath, guesser.get_state())
+
+        return load_state(filepath)
+
+    def test_unchanged_packages_are_reused(self):
+        guesser, versions, fetched = self.run_guesser()
+        self.assertEqual(versions, {'lib': '1.5', 'helper': '2.0'})
+        self.assertEqual(fetched, ['helper', 'lib'])
+
+        # No new commit : nothing is fetched nor walked
+        with mock.patch('py_requirements_guesser.history.subprocess.Popen', wraps=subprocess.Popen) as popen:
+            guesser, versions, fetched = self.run_guesser(self.saved_state(guesser))
+
+        self.assertEqual(versions, {'lib': '1.5', 'helper': '2.0'})
+        self.assertEqual(fetched, [])
+        self.assertEqual(popen.call_count, 0)
+        self.assertEqual(set(result.reason for result in guesser.results.values()), {'previous_run'})
+
+    def test_new_commits_invalidate_the_affected_packages(self):
+        guesser, _, _ = self.run_guesser()
+
+        # The version range of helper changes and speedup is imported
+        commit(self.repo_path, {'main.py': "import lib\nimport helper\nimport speedup\n", 'requirements.txt': "lib\nhelper>=1.9,<2\n"},
+               SECOND_COMMIT_DATE)
+        guesser, versions, fetched = self.run_guesser(self.saved_state(guesser))
+
+        self.assertEqual(versions, {'lib': '1.5', 'helper': '1.9', 'speedup': '0.2'})
+        self.assertEqual(fetched, ['helper', 'speedup'])
+        self.assertEqual(guesser.results['lib'].reason, 'previous_run')
+        self.assertEqual(guesser.history.import_dates['speedup'], SECOND_COMMIT_DATE)
+
+    def test_rewritten_history_is_indexed_again(self):
+        guesser, _, _ = self.run_guesser()
+        state = self.saved_state(guesser)
+
+        subprocess.check_call(['git', 'commit', '-q', '--amend', '--allow-empty', '-m', 'amended'], cwd=self.repo_path,
+                              env=dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com',
+                                       GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@example.com'))
+        guesser, versions, fetched = self.run_guesser(state)
+
+        self.assertEqual(versions, {'lib': '1.5', 'helper': '2.0'})
+        self.assertNotEqual(guesser.history.head, state['history']['head'])
+        self.assertEqual(guesser.history.import_dates, state['history']['import_dates'])
+
+    def test_state_of_other_pathspecs_is_ignored(self):
+        guesser, _, _ = self.run_guesser()
+        state = self.saved_state(guesser)
+
+        # The state of another sub-project (Or before a requirements file was included)
+        state['history']['pathspecs'] = state['history']['pathspecs'] + [':(literal)deps/base.in']
+        guesser, versions, fetched = self.run_guesser(state)
+
+        self.assertEqual(versions, {'lib': '1.5', 'helper': '2.0'})
+        self.assertEqual(fetched, ['helper', 'lib'])
+        self.assertNotIn(':(literal)deps/base.in', guesser.history.pathspecs)
+
+        # Including a requirements file changes the pathspecs
+        commit(self.repo_path, {'requirements.txt': "-r deps/base.in\n", 'deps/base.in': "lib\nhelper\n"}, SECOND_COMMIT_DATE)
+        guesser, _, fetched = self.run_guesser(self.saved_state(guesser))
+
+        self.assertEqual(fetched, ['helper', 'lib'])
+        self.assertIn(':(literal)deps/base.in', guesser.history.pathspecs)
+
+    def test_invalid_state_files(self):
+        filepath = os.path.join(self.tmp_dir.name, 'state.json')
+        self.assertIsNone(load_state(filepath))
+
+        with open(filepath, 'w') as f:
+            json.dump({'format': 1, 'history': {}, 'packages': {}}, f)
+        self.assertIsNone(load_state(filepath))
+
+        with open(filepath, 'w') as f:
+            f.write("{")
+        self.assertIsNone(load_state(filepath))
+
+
+if __name__ == '__main__':
+    unittest.main()